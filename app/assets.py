@@ -0,0 +1,246 @@
+# app/assets.py
+"""Static assets preprocessed once per process.
+
+Every file in ``app/static`` is read at startup, text assets are minified,
+and gzip (plus brotli, when the optional ``brotli`` package is installed)
+variants are precomputed next to a content-hash ETag. Non-HTML assets are
+also published under a fingerprinted name (``avatar-default.1a2b3c4d.svg``)
+that the HTML pages are rewritten to reference, so those can be cached
+forever while the pages themselves are revalidated with ``If-None-Match``.
+"""
+import gzip
+import hashlib
+import mimetypes
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+JS_TYPES = {"text/javascript", "application/javascript"}
+TEXT_TYPES = {"text/html", "text/css", "text/javascript", "application/javascript", "image/svg+xml"}
+MIN_COMPRESS_SIZE = 512
+REVALIDATE = "no-cache"
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+_HTML_COMMENT = re.compile(r"<!--(?!\[if).*?-->", re.S)
+_SCRIPT_OR_STYLE = re.compile(r"(<(script|style)\b.*?</\2>)", re.S | re.I)
+_VERBATIM_HTML = re.compile(r"<(pre|textarea)\b.*?</\1\s*>", re.S | re.I)
+_LINE_BREAK = re.compile(r"\s*\n\s*")
+
+
+def _literal_end(js: str, i: int) -> int:
+    """Return the index just past the string or template literal opening at ``i``."""
+    quote = js[i]
+    i += 1
+    while i < len(js):
+        c = js[i]
+        if c == "\\":
+            i += 2
+        elif c == quote:
+            return i + 1
+        elif c == "\n" and quote != "`":
+            return i  # unterminated string; resync on the next line
+        elif quote == "`" and js.startswith("${", i):
+            i = _expression_end(js, i + 2)
+        else:
+            i += 1
+    return len(js)
+
+
+def _expression_end(js: str, i: int) -> int:
+    """Return the index just past the ``}`` closing the ``${`` expression before ``i``."""
+    depth = 0
+    while i < len(js):
+        c = js[i]
+        if c in "'\"`":
+            i = _literal_end(js, i)
+            continue
+        if c == "{":
+            depth += 1
+        elif c == "}":
+            if depth == 0:
+                return i + 1
+            depth -= 1
+        i += 1
+    return len(js)
+
+
+def _template_literals(js: str):
+    """Yield the ``(start, end)`` span of every top-level template literal in ``js``."""
+    i = 0
+    while i < len(js):
+        c = js[i]
+        if js.startswith("//", i) or js.startswith("/*", i):
+            close = "\n" if js[i + 1] == "/" else "*/"
+            end = js.find(close, i + 2)
+            i = len(js) if end < 0 else end + len(close)
+        elif c in "'\"":
+            i = _literal_end(js, i)
+        elif c == "`":
+            end = _literal_end(js, i)
+            yield i, end
+            i = end
+        else:
+            i += 1
+
+
+def _segments(text: str, spans) -> list[tuple[str, bool]]:
+    """Split ``text`` into ``(chunk, verbatim)`` pairs, ``spans`` being the verbatim ones."""
+    chunks, pos = [], 0
+    for start, end in spans:
+        chunks += [(text[pos:start], False), (text[start:end], True)]
+        pos = end
+    chunks.append((text[pos:], False))
+    return chunks
+
+
+def minify(text: str, content_type: str) -> str:
+    """Conservative minification: drop indentation, blank lines and HTML comments.
+
+    Line breaks are kept, so inline scripts relying on ``//`` comments or
+    automatic semicolon insertion behave exactly as before. ``<pre>`` and
+    ``<textarea>`` elements and JS template literals, where whitespace is
+    content, are copied verbatim.
+    """
+    if content_type == "text/html":
+        # strip comments outside <script>/<style> only
+        chunks = []
+        for i, part in enumerate(_SCRIPT_OR_STYLE.split(text)):
+            if i % 3 == 0:
+                part = _HTML_COMMENT.sub("", part)
+                chunks += _segments(part, (m.span() for m in _VERBATIM_HTML.finditer(part)))
+            elif i % 3 == 1:
+                script = part[:7].lower() == "<script"
+                chunks += _segments(part, _template_literals(part) if script else ())
+    elif content_type in JS_TYPES:
+        chunks = _segments(text, _template_literals(text))
+    else:
+        chunks = [(text, False)]
+    text = "".join(chunk if verbatim else _LINE_BREAK.sub("\n", chunk) for chunk, verbatim in chunks)
+    return text.strip() + "\n"
+
+
+@dataclass
+class Asset:
+    name: str
+    content_type: str
+    body: bytes
+    etag: str
+    fingerprinted: str
+    encodings: dict = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, name: str, body: bytes, content_type: str) -> "Asset":
+        digest = hashlib.sha256(body).hexdigest()
+        stem, dot, suffix = name.rpartition(".")
+        fingerprinted = f"{stem}.{digest[:8]}.{suffix}" if dot else f"{name}.{digest[:8]}"
+        asset = cls(name, content_type, body, f'"{digest[:16]}"', fingerprinted)
+        if content_type in TEXT_TYPES and len(body) >= MIN_COMPRESS_SIZE:
+            asset.encodings["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                asset.encodings["br"] = brotli.compress(body, quality=11)
+        return asset
+
+    def etag_for(self, encoding: str | None) -> str:
+        # each representation needs its own strong validator
+        return self.etag if encoding is None else f'{self.etag[:-1]}-{encoding}"'
+
+
+def _accepted_encodings(header: str) -> dict[str, float]:
+    accepted = {}
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if coding:
+            accepted[coding.strip().lower()] = q
+    return accepted
+
+
+def _matches(if_none_match: str, asset: Asset) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    base = asset.etag.strip('"')
+    for tag in if_none_match.split(","):
+        tag = tag.strip().removeprefix("W/").strip('"')
+        if tag == base or tag.startswith(base + "-"):
+            return True
+    return False
+
+
+class AssetStore:
+    def __init__(self):
+        self._assets: dict[str, tuple[Asset, str]] = {}
+
+    @classmethod
+    def load(cls, directory: Path) -> "AssetStore":
+        store = cls()
+        files = sorted(path for path in Path(directory).iterdir() if path.is_file())
+        pages = []
+        for path in files:
+            content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+            if content_type == "text/html":
+                pages.append(path)
+            else:
+                store._add(cls._read(path, content_type), fingerprint=True)
+        # pages are built last so they can point at the fingerprinted names
+        for path in pages:
+            html = minify(path.read_text(encoding="utf-8"), "text/html")
+            for asset in store.assets():
+                html = html.replace(f"/static/{asset.name}", f"/static/{asset.fingerprinted}")
+            store._add(Asset.build(path.name, html.encode(), "text/html"), fingerprint=False)
+        return store
+
+    @staticmethod
+    def _read(path: Path, content_type: str) -> Asset:
+        body = path.read_bytes()
+        if content_type in TEXT_TYPES:
+            body = minify(body.decode("utf-8"), content_type).encode()
+        return Asset.build(path.name, body, content_type)
+
+    def _add(self, asset: Asset, fingerprint: bool):
+        self._assets[asset.name] = (asset, REVALIDATE)
+        if fingerprint:
+            self._assets[asset.fingerprinted] = (asset, IMMUTABLE)
+
+    def assets(self) -> list[Asset]:
+        return list({id(asset): asset for asset, _ in self._assets.values()}.values())
+
+    def url(self, name: str) -> str:
+        """Return the cache-busting URL of asset ``name``."""
+        return f"/static/{self._assets[name][0].fingerprinted}"
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._assets
+
+    def response(self, name: str, request: Request) -> Response:
+        """Serve ``name``, negotiating the encoding and answering ``If-None-Match``."""
+        asset, cache_control = self._assets[name]
+        encoding = None
+        if asset.encodings:
+            accepted = _accepted_encodings(request.headers.get("accept-encoding", ""))
+            for candidate in ("br", "gzip"):
+                if candidate in asset.encodings and accepted.get(candidate, 0) > 0:
+                    encoding = candidate
+                    break
+        headers = {"ETag": asset.etag_for(encoding), "Cache-Control": cache_control}
+        if asset.encodings:
+            headers["Vary"] = "Accept-Encoding"
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _matches(if_none_match, asset):
+            return Response(status_code=304, headers=headers)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        body = asset.encodings[encoding] if encoding else asset.body
+        return Response(body, media_type=asset.content_type, headers=headers)
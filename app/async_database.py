@@ -0,0 +1,60 @@
+# app/async_database.py
+"""Optional asyncio database mode.
+
+With ``DATABASE_ASYNC=1`` the calculation and report routes get an
+``AsyncSession`` (asyncpg for PostgreSQL, aiosqlite for SQLite) and run
+their queries on the event loop instead of Starlette's threadpool. The
+``crud`` functions stay the single implementation: :func:`run_db` runs
+them through ``AsyncSession.run_sync`` in async mode, or in the threadpool
+when handed a regular ``Session``.
+"""
+import os
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from starlette.concurrency import run_in_threadpool
+
+from .database import DATABASE_URL, configure_engine, engine_options
+
+DATABASE_ASYNC = os.getenv("DATABASE_ASYNC", "").lower() in ("1", "true", "yes")
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+async_engine = None
+AsyncSessionLocal = None
+
+
+def to_async_url(url: str) -> str:
+    """Return ``url`` with its driver replaced by the asyncio driver for its backend."""
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver configured for {parsed.get_backend_name()}")
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+def init_async_engine(url: str = DATABASE_URL):
+    """Create the async engine and session factory (requires aiosqlite/asyncpg)."""
+    global async_engine, AsyncSessionLocal
+    async_url = to_async_url(url)
+    async_engine = create_async_engine(async_url, **engine_options(async_url, is_async=True))
+    configure_engine(async_engine.sync_engine, label="async")
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    return AsyncSessionLocal
+
+
+async def get_async_db():
+    if AsyncSessionLocal is None:
+        init_async_engine()
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def run_db(db, fn, *args, **kwargs):
+    """Call the sync ``fn(session, *args, **kwargs)`` without blocking the event loop."""
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
@@ -1,53 +1,199 @@
 # app/calculations.py
 from __future__ import annotations
-from typing import Protocol
+import math
+import os
+import struct
+from array import array
+from typing import Protocol, Sequence
+
+from . import metrics
+from .cache import TTLCache
+from .registry import registry
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+
 
 class Operation(Protocol):
     def compute(self, a: float, b: float) -> float: ...
 
 
+# Operations may also define ``compute_array(a, b)`` taking two float64
+# NumPy arrays and returning ``(results, errors)``, where ``errors`` maps
+# positions in the slice to the exception ``compute`` would have raised.
+# Without it (or without NumPy) batches fall back to calling ``compute``.
+#
+# Setting ``cacheable = True`` on an operation memoizes its scalar results
+# in ``result_cache`` (see ``set_result_caching``).
+
+
+@registry.register("Add")
 class Add:
     def compute(self, a: float, b: float) -> float:
         return a + b
 
+    def compute_array(self, a, b):
+        return a + b, {}
+
 
+@registry.register("Sub")
 class Sub:
     def compute(self, a: float, b: float) -> float:
         return a - b
 
+    def compute_array(self, a, b):
+        return a - b, {}
 
+
+@registry.register("Multiply")
 class Multiply:
     def compute(self, a: float, b: float) -> float:
         return a * b
 
+    def compute_array(self, a, b):
+        return a * b, {}
+
 
+@registry.register("Divide")
 class Divide:
     def compute(self, a: float, b: float) -> float:
         if b == 0:
             raise ZeroDivisionError("Division by zero")
         return a / b
 
+    def compute_array(self, a, b):
+        zero = b == 0
+        results = a / np.where(zero, 1.0, b)
+        return results, {int(i): ZeroDivisionError("Division by zero") for i in np.flatnonzero(zero)}
+
 
+@registry.register("Power")
 class Power:
+    cacheable = True
+
     def compute(self, a: float, b: float) -> float:
-        # exponentiation (a ** b). allow negative/float exponents.
-        return a ** b
+        # exponentiation (a ** b). allow negative/float exponents as long as
+        # the result is a finite real number.
+        if a == 0 and b < 0 and math.isfinite(b):
+            raise ZeroDivisionError("Zero cannot be raised to a negative power")
+        if a < 0 and math.isfinite(a) and math.isfinite(b) and not float(b).is_integer():
+            raise ValueError("Negative base with a fractional exponent has no real result")
+        try:
+            return a ** b
+        except OverflowError:
+            raise OverflowError("Power result out of range")
+
+    def compute_array(self, a, b):
+        results = np.power(a, b)
+        finite = np.isfinite(a) & np.isfinite(b)
+        zero = (a == 0) & (b < 0) & np.isfinite(b)
+        fractional = (a < 0) & finite & (b != np.floor(b))
+        overflow = finite & np.isinf(results) & ~zero
+        errors = {int(i): OverflowError("Power result out of range") for i in np.flatnonzero(overflow)}
+        errors.update(
+            {int(i): ValueError("Negative base with a fractional exponent has no real result") for i in np.flatnonzero(fractional)}
+        )
+        errors.update({int(i): ZeroDivisionError("Zero cannot be raised to a negative power") for i in np.flatnonzero(zero)})
+        return results, errors
+
+
+# operations contributed by installed packages (see app.registry)
+registry.load_plugins()
+
+
+def operation_types() -> tuple[str, ...]:
+    """Return the names of all registered operation types."""
+    return registry.names()
 
 
 def get_operation(op_type: str) -> Operation:
-    mapping = {
-        "Add": Add,
-        "Sub": Sub,
-        "Multiply": Multiply,
-        "Divide": Divide,
-        "Power": Power,
-    }
-    cls = mapping.get(op_type)
-    if cls is None:
-        raise ValueError(f"Unknown operation type: {op_type}")
-    return cls()
+    return registry.get(op_type)
+
+
+# Memoized results keyed by (type, bit pattern of a and b), so -0.0/0.0 and
+# distinct NaN payloads never share an entry.
+result_cache = TTLCache(
+    maxsize=int(os.getenv("CALC_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("CALC_CACHE_TTL", "300")),
+)
+metrics.cache_metrics("calculation_result_cache", "Calculation result cache", result_cache.stats)
+_cache_overrides: dict[str, bool] = {
+    name.strip(): True for name in os.getenv("CALC_CACHE_OPERATIONS", "").split(",") if name.strip()
+}
+_operand_bits = struct.Struct("<dd").pack
+_MISSING = object()
+
+
+def set_result_caching(op_type: str, enabled: bool | None):
+    """Force result caching on or off for ``op_type``; ``None`` restores the operation default."""
+    if enabled is None:
+        _cache_overrides.pop(op_type, None)
+    else:
+        _cache_overrides[op_type] = enabled
 
 
 def perform_calculation(op_type: str, a: float, b: float) -> float:
-    op = get_operation(op_type)
-    return op.compute(a, b)
+    op = registry.get(op_type)
+    enabled = _cache_overrides.get(op_type)
+    if enabled is None:
+        enabled = getattr(op, "cacheable", False)
+    if not enabled or type(a) is not float or type(b) is not float:
+        return op.compute(a, b)
+    key = (op_type, _operand_bits(a, b))
+    result = result_cache.get(key, _MISSING)
+    if result is _MISSING:
+        # errors propagate and are never cached
+        result = op.compute(a, b)
+        result_cache.set(key, result)
+    return result
+
+
+def perform_calculations(
+    types: Sequence[str], a: Sequence[float], b: Sequence[float]
+) -> tuple[list[float | None], dict[int, Exception]]:
+    """Evaluate column arrays of operations element-wise.
+
+    Rows are grouped by type and each operation runs once over its slice,
+    vectorized with NumPy when available. Returns ``(results, errors)``:
+    ``results[i]`` is ``None`` for every position in ``errors``, which maps
+    it to the same exception :func:`perform_calculation` raises for that row.
+    """
+    if not len(types) == len(a) == len(b):
+        raise ValueError("types, a and b must have the same length")
+    a = array("d", a)
+    b = array("d", b)
+    positions: dict[str, list[int]] = {}
+    for i, op_type in enumerate(types):
+        positions.setdefault(op_type, []).append(i)
+
+    results: list[float | None] = [None] * len(types)
+    errors: dict[int, Exception] = {}
+    if np is not None and len(a):
+        # array('d') exposes the buffer protocol, so these are zero-copy views
+        a_all, b_all = np.frombuffer(a), np.frombuffer(b)
+    for op_type, idx in positions.items():
+        try:
+            op = get_operation(op_type)
+        except ValueError as e:
+            errors.update(dict.fromkeys(idx, e))
+            continue
+        if np is not None and hasattr(op, "compute_array"):
+            take = np.asarray(idx)
+            # inf/nan follow IEEE semantics like the scalar path; errors are
+            # reported by compute_array, not through floating-point warnings
+            with np.errstate(all="ignore"):
+                values, slice_errors = op.compute_array(a_all[take], b_all[take])
+            for i, value in zip(idx, values.tolist()):
+                results[i] = value
+            for j, e in slice_errors.items():
+                results[idx[j]] = None
+                errors[idx[j]] = e
+        else:
+            for i in idx:
+                try:
+                    results[i] = op.compute(a[i], b[i])
+                except (ArithmeticError, ValueError) as e:
+                    errors[i] = e
+    return results, errors
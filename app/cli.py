@@ -0,0 +1,154 @@
+"""Maintenance commands.
+
+Usage::
+
+    python -m app.cli db upgrade      # apply schema migrations (adopts pre-migration databases)
+    python -m app.cli stats verify    # report drift between the rollup and the raw table
+    python -m app.cli stats rebuild   # recompute the rollup from the raw table
+    python -m app.cli calculations backfill --user X  # assign anonymous calculations to user X
+    python -m app.cli calculations retention          # create upcoming partitions, archive expired months
+    python -m app.cli reports rebuild-hourly          # recompute the hourly time-series aggregates
+    python -m app.cli security calibrate --target-ms 250  # password hash rounds to pin for every worker
+"""
+import argparse
+import sys
+from datetime import datetime, timezone
+
+from . import crud, migrate, partitions, security, timeseries
+from .database import SessionLocal, engine
+
+
+def stats_verify(args) -> int:
+    db = SessionLocal()
+    try:
+        drift = crud.verify_calculation_stats(db)
+    finally:
+        db.close()
+    if not drift:
+        print("calculation_stats: OK")
+        return 0
+    for item in drift:
+        print(f"calculation_stats: drift for {item['type']} (owner {item['owner']}): expected {item['expected']}, found {item['actual']}")
+    return 1
+
+
+def stats_rebuild(args) -> int:
+    db = SessionLocal()
+    try:
+        raw = crud.rebuild_calculation_stats(db)
+    finally:
+        db.close()
+    print(f"calculation_stats: rebuilt {len(raw)} owner/type row(s)")
+    return 0
+
+
+def db_upgrade(args) -> int:
+    migrate.upgrade_database(engine, args.revision)
+    print(f"database: upgraded to {args.revision}")
+    return 0
+
+
+def calculations_backfill(args) -> int:
+    db = SessionLocal()
+    try:
+        user = crud.get_user_by_username(db, args.user)
+        if user is None:
+            print(f"calculations: unknown user {args.user!r}", file=sys.stderr)
+            return 1
+        moved = 0
+        while batch := crud.assign_calculation_owner(db, user.id, batch_size=args.batch_size):
+            moved += batch
+    finally:
+        db.close()
+    print(f"calculations: assigned {moved} anonymous calculation(s) to {args.user}")
+    return 0
+
+
+def calculations_retention(args) -> int:
+    db = SessionLocal()
+    try:
+        created = partitions.ensure_partitions(db, ahead=args.ahead)
+        moved = 0
+        if args.months:
+            today = partitions.month_start(datetime.now(timezone.utc).date())
+            cutoff = partitions.add_months(today, -args.months)
+            moved = crud.archive_calculations(db, cutoff, batch_size=args.batch_size)
+    finally:
+        db.close()
+    for name in created:
+        print(f"calculations: created partition {name}")
+    if args.months:
+        print(f"calculations: archived {moved} calculation(s) created before {cutoff.isoformat()}")
+    return 0
+
+
+def reports_rebuild_hourly(args) -> int:
+    db = SessionLocal()
+    try:
+        rows = timeseries.rebuild_hourly(db)
+    finally:
+        db.close()
+    print(f"calculation_hourly: rebuilt {rows} owner/type/hour row(s)")
+    return 0
+
+
+def security_calibrate(args) -> int:
+    rounds = security.calibrate_rounds(args.scheme, args.profile, args.target_ms)
+    print(f"PASSWORD_HASH_ROUNDS={rounds}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    db = commands.add_parser("db", help="schema migrations")
+    db_commands = db.add_subparsers(dest="action", required=True)
+    upgrade = db_commands.add_parser("upgrade", help="upgrade the schema (to the latest revision by default)")
+    upgrade.add_argument("revision", nargs="?", default="head")
+    upgrade.set_defaults(func=db_upgrade)
+
+    stats = commands.add_parser("stats", help="calculation stats rollup maintenance")
+    stats_commands = stats.add_subparsers(dest="action", required=True)
+    stats_commands.add_parser("verify", help="report drift against the raw table").set_defaults(func=stats_verify)
+    stats_commands.add_parser("rebuild", help="recompute from the raw table").set_defaults(func=stats_rebuild)
+
+    calcs = commands.add_parser("calculations", help="calculation ownership maintenance")
+    calc_commands = calcs.add_subparsers(dest="action", required=True)
+    backfill = calc_commands.add_parser("backfill", help="assign anonymous calculations to a user")
+    backfill.add_argument("--user", required=True, help="username to own the calculations")
+    backfill.add_argument("--batch-size", type=int, default=1000, help="rows per transaction")
+    backfill.set_defaults(func=calculations_backfill)
+    retention = calc_commands.add_parser("retention", help="create upcoming partitions and archive old months")
+    retention.add_argument(
+        "--months", type=int, default=partitions.RETENTION_MONTHS,
+        help="keep this many whole months before the current one (0 keeps everything)",
+    )
+    retention.add_argument("--ahead", type=int, default=partitions.PARTITIONS_AHEAD, help="months to create ahead")
+    retention.add_argument("--batch-size", type=int, default=5000, help="rows per transaction outside partitions")
+    retention.set_defaults(func=calculations_retention)
+
+    reports = commands.add_parser("reports", help="report pre-aggregate maintenance")
+    report_commands = reports.add_subparsers(dest="action", required=True)
+    report_commands.add_parser(
+        "rebuild-hourly", help="recompute calculation_hourly from the raw table"
+    ).set_defaults(func=reports_rebuild_hourly)
+
+    sec = commands.add_parser("security", help="password hashing settings")
+    sec_commands = sec.add_subparsers(dest="action", required=True)
+    calibrate = sec_commands.add_parser("calibrate", help="time password hashing on this host and print the rounds")
+    calibrate.add_argument("--target-ms", type=float, default=security.PASSWORD_HASH_TARGET_MS or 250,
+                           help="hash/verify time to aim for")
+    calibrate.add_argument("--scheme", default=security.PASSWORD_HASH_SCHEME)
+    calibrate.add_argument("--profile", default=security.PASSWORD_HASH_PROFILE)
+    calibrate.set_defaults(func=security_calibrate)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
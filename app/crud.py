@@ -1,21 +1,80 @@
 # app/crud.py
+import base64
+import json
+import math
+import re
+import secrets
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import delete, exists, func, insert, select, text, tuple_, update
 from . import models, schemas
-from .security import hash_password
-from . import calculations
-from .models import Calculation
+from .security import REFRESH_TOKEN_EXPIRE_DAYS, STREAM_TICKET_TTL, generate_refresh_token, hash_password, hash_refresh_token, session_cache
+from .user_cache import user_cache
+from . import calculations, partitions, sketches, timeseries, upsert
+from .events import broker
+from .response_cache import data_version
+from .models import ANONYMOUS_OWNER, Calculation, CalculationArchive, CalculationStat, RefreshToken, utcnow
 from .schemas import CalculationCreate
 
-def create_user(db: Session, user_in: schemas.UserCreate):
-    user = models.User(
+class DuplicateUserError(ValueError):
+    """A username or email collided with the unique constraints on ``users``."""
+
+    def __init__(self, field: str):
+        super().__init__(f"{field.capitalize()} already exists")
+        self.field = field
+
+
+# the unique constraints and indexes on ``users`` (see migration 0001), by column
+_USER_UNIQUE_NAMES = {
+    "users_username_key": "username",
+    "ix_users_username": "username",
+    "users_email_key": "email",
+    "ix_users_email": "email",
+}
+_SQLITE_UNIQUE = re.compile(r"UNIQUE constraint failed: users\.(username|email)\b")
+
+
+def _duplicate_user_error(exc: IntegrityError) -> DuplicateUserError | None:
+    """The collision ``exc`` reports, or ``None`` if it isn't a username/email one.
+
+    PostgreSQL drivers name the violated constraint (psycopg in ``diag``,
+    asyncpg on the error the adapter wraps); SQLite names the column in
+    its message. The message text is never matched on PostgreSQL, where it
+    quotes the colliding value.
+    """
+    orig = exc.orig
+    constraint = getattr(getattr(orig, "diag", None), "constraint_name", None) or getattr(
+        orig.__cause__, "constraint_name", None
+    )
+    if constraint is not None:
+        field = _USER_UNIQUE_NAMES.get(constraint)
+    else:
+        match = _SQLITE_UNIQUE.search(str(orig))
+        field = match and match[1]
+    return DuplicateUserError(field) if field else None
+
+
+def create_user(db: Session, user_in: schemas.UserCreate, password_hash: str | None = None):
+    """Insert a user in one statement, raising :class:`DuplicateUserError` on collisions."""
+    # routes pass a hash computed on the hashing executor
+    stmt = insert(models.User).values(
         username=user_in.username,
         email=user_in.email,
-        password_hash=hash_password(user_in.password),
-    )
-    db.add(user)
+        password_hash=password_hash or hash_password(user_in.password),
+    ).returning(models.User)
+    try:
+        user = db.scalars(stmt).one()
+    except IntegrityError as exc:
+        db.rollback()
+        error = _duplicate_user_error(exc)
+        if error is None:
+            raise
+        raise error from exc
+    # RETURNING already loaded every column; detach so the commit doesn't expire them
+    db.expunge(user)
     db.commit()
-    db.refresh(user)
     return user
 
 def get_user_by_username(db: Session, username: str):
@@ -25,6 +84,10 @@ def get_user_by_username(db: Session, username: str):
 def get_user_by_id(db: Session, user_id: int):
     return db.query(models.User).filter(models.User.id == user_id).first()
 
+def get_password_hash(db: Session, user_id: int) -> str | None:
+    """Read only the stored hash; cached users are loaded without it."""
+    return db.scalar(select(models.User.password_hash).where(models.User.id == user_id))
+
 def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
@@ -34,65 +97,734 @@ def update_user(db: Session, user: models.User, username: str | None = None, ema
         user.username = username
     if email:
         user.email = email
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError as exc:
+        db.rollback()
+        error = _duplicate_user_error(exc)
+        if error is None:
+            raise
+        raise error from exc
+    user_cache.invalidate(user.id)
     db.refresh(user)
     return user
 
 
-def change_user_password(db: Session, user: models.User, new_password: str):
+def change_user_password(db: Session, user: models.User, new_password: str, password_hash: str | None = None,
+                         keep_session: str | None = None):
     # hash password and update
-    user.password_hash = hash_password(new_password)
+    user.password_hash = password_hash or hash_password(new_password)
+    # sign out every other session, including refresh tokens issued before the change
+    families = _revoke_refresh_tokens(db, (RefreshToken.user_id == user.id) & (RefreshToken.family_id != keep_session))
     db.commit()
+    for family_id in families:
+        session_cache.delete(family_id)
+    user_cache.invalidate(user.id)
     db.refresh(user)
     return user
 
 
-def create_calculation(db: Session, calc_in: CalculationCreate):
+def upgrade_password_hash(db: Session, user_id: int, old_hash: str, new_hash: str) -> bool:
+    """Replace ``old_hash`` with ``new_hash`` unless the password changed meanwhile."""
+    result = db.execute(
+        update(models.User)
+        .where(models.User.id == user_id, models.User.password_hash == old_hash)
+        .values(password_hash=new_hash)
+    )
+    db.commit()
+    if result.rowcount:
+        user_cache.invalidate(user_id)
+    return bool(result.rowcount)
+
+
+class InvalidRefreshToken(ValueError):
+    """The refresh token is unknown, expired or revoked."""
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands timestamps back naive
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _revoke_refresh_tokens(db: Session, condition) -> list[str]:
+    """Revoke the active tokens matching ``condition``; returns their families."""
+    families = db.scalars(
+        select(RefreshToken.family_id).where(condition, RefreshToken.revoked_at.is_(None)).distinct()
+    ).all()
+    db.execute(update(RefreshToken).where(condition, RefreshToken.revoked_at.is_(None)).values(revoked_at=utcnow()))
+    return families
+
+
+def _add_refresh_token(db: Session, user_id: int, family_id: str) -> str:
+    token = generate_refresh_token()
+    db.add(RefreshToken(
+        user_id=user_id,
+        token_hash=hash_refresh_token(token),
+        family_id=family_id,
+        expires_at=utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    ))
+    return token
+
+
+def create_refresh_token(db: Session, user_id: int) -> tuple[str, str]:
+    """Start a refresh session for a login; returns ``(token, family_id)``."""
+    family_id = secrets.token_hex(16)
+    token = _add_refresh_token(db, user_id, family_id)
+    db.commit()
+    session_cache.set(family_id, True)
+    return token, family_id
+
+
+def revoke_refresh_session(db: Session, family_id: str):
+    _revoke_refresh_tokens(db, RefreshToken.family_id == family_id)
+    db.commit()
+    session_cache.delete(family_id)
+
+
+def rotate_refresh_token(db: Session, token: str) -> tuple[models.User, str, str]:
+    """Exchange a refresh token for its successor; returns ``(user, token, family_id)``.
+
+    Presenting a token that was already rotated out revokes its whole
+    family, since either the client or an attacker holds a stolen copy.
+    """
+    row = db.scalars(
+        select(RefreshToken).where(RefreshToken.token_hash == hash_refresh_token(token)).with_for_update()
+    ).first()
+    if row is None or _as_utc(row.expires_at) <= utcnow():
+        raise InvalidRefreshToken("Invalid refresh token")
+    claimed = db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.id == row.id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=utcnow())
+    ).rowcount
+    if not claimed:
+        db.rollback()
+        revoke_refresh_session(db, row.family_id)
+        raise InvalidRefreshToken("Refresh token reuse detected")
+    new_token = _add_refresh_token(db, row.user_id, row.family_id)
+    db.commit()
+    return db.get(models.User, row.user_id), new_token, row.family_id
+
+
+def logout_refresh_token(db: Session, token: str):
+    """Revoke the session a refresh token belongs to; unknown tokens are ignored."""
+    family_id = db.scalar(select(RefreshToken.family_id).where(RefreshToken.token_hash == hash_refresh_token(token)))
+    if family_id is not None:
+        revoke_refresh_session(db, family_id)
+
+
+def issue_stream_ticket(db: Session, user_id: int) -> str:
+    """Store and return a single-use ticket for opening ``/events`` as ``user_id``.
+
+    Expired tickets are swept on the way, so the table stays small.
+    """
+    ticket = generate_refresh_token()
+    now = utcnow()
+    db.execute(delete(models.StreamTicket).where(models.StreamTicket.expires_at <= now))
+    db.add(models.StreamTicket(
+        token_hash=hash_refresh_token(ticket), user_id=user_id,
+        expires_at=now + timedelta(seconds=STREAM_TICKET_TTL),
+    ))
+    db.commit()
+    return ticket
+
+
+def redeem_stream_ticket(db: Session, ticket: str) -> int | None:
+    """Consume ``ticket`` and return its user id, or ``None`` if it is unknown, used or expired.
+
+    The delete is the redemption, so two requests racing with one ticket
+    can't both win, whichever workers serve them.
+    """
+    user_id = db.scalar(
+        delete(models.StreamTicket)
+        .where(models.StreamTicket.token_hash == hash_refresh_token(ticket), models.StreamTicket.expires_at > utcnow())
+        .returning(models.StreamTicket.user_id)
+    )
+    db.commit()
+    return user_id
+
+
+def refresh_session_active(db: Session, family_id: str) -> bool:
+    """Whether the refresh session ``family_id`` is still active (cached)."""
+    active = session_cache.get(family_id)
+    if active is None:
+        active = db.scalar(select(exists().where(
+            RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None)
+        )))
+        session_cache.set(family_id, active)
+    return active
+
+
+def _stats_delta(calc: Calculation, sign: int = 1) -> dict:
+    """Return the rollup contribution of one calculation row."""
+    has_result = calc.result is not None
+    return {
+        "count": sign,
+        "sum_a": sign * calc.a,
+        "sum_b": sign * calc.b,
+        "sum_result": sign * calc.result if has_result else 0.0,
+        "result_count": sign if has_result else 0,
+    }
+
+
+def owner_key(user_id: int | None) -> int:
+    """Rollup/event owner of a calculation: its ``user_id`` or ``ANONYMOUS_OWNER``."""
+    return ANONYMOUS_OWNER if user_id is None else user_id
+
+
+def _owned_by(stmt, user_id: int | None):
+    """Restrict a query or select to ``user_id``'s calculations (anonymous ones for ``None``)."""
+    if user_id is None:
+        return stmt.filter(Calculation.user_id.is_(None))
+    return stmt.filter(Calculation.user_id == user_id)
+
+
+def _publish(event: str, owner: int, calcs=(), deltas=(), ids=None):
+    """Broadcast a committed calculation change and its rollup deltas to ``/events``."""
+    data = {"stats": [{"type": op_type, **delta} for op_type, delta in deltas]}
+    if ids is not None:
+        data["ids"] = ids
+    else:
+        data["calculations"] = [schemas.CalculationRead.model_validate(c).model_dump(mode="json") for c in calcs]
+    broker.publish(event, data, owner=owner)
+
+
+def _increment(db: Session, model, key: dict, delta: dict):
+    """Add ``delta`` to the ``model`` row identified by ``key`` inside the current transaction."""
+    upsert.increment(db, model, list(key), [{**key, **delta}])
+
+
+def _apply_stats_delta(db: Session, owner: int, op_type: str, delta: dict):
+    """Add ``delta`` to the rollup row for ``(owner, op_type)``."""
+    _increment(db, CalculationStat, {"owner_id": owner, "type": op_type}, delta)
+
+
+def create_calculation(db: Session, calc_in: CalculationCreate, user_id: int | None = None):
     # compute result using the calculation factory
     result = calculations.perform_calculation(calc_in.type, calc_in.a, calc_in.b)
     calc = Calculation(
+        user_id=user_id,
         a=calc_in.a,
         b=calc_in.b,
         type=calc_in.type,
         result=result,
     )
     db.add(calc)
+    owner = owner_key(user_id)
+    delta = _stats_delta(calc)
+    _apply_stats_delta(db, owner, calc.type, delta)
+    sketches.record(db, owner, calc.type, [calc])
+    if timeseries.TIMESERIES_HOURLY:
+        db.flush()
+        timeseries.record_inserts(db, owner, [calc])
+    data_version.bump(db)
     db.commit()
     db.refresh(calc)
+    _publish("created", owner, [calc], [(calc.type, delta)])
     return calc
 
 
-def get_calculation(db: Session, calc_id: int):
-    return db.query(Calculation).filter(Calculation.id == calc_id).first()
+def create_calculations(db: Session, calcs_in: list[CalculationCreate], user_id: int | None = None):
+    """Compute and insert many calculations in one multi-row INSERT ... RETURNING.
 
+    Returns ``(created, errors)`` where ``created`` lists the inserted rows
+    in input order and ``errors`` maps input positions to the exception
+    that prevented them from being computed. Failed items are skipped; the
+    rest are committed together with one rollup delta per type.
+    """
+    results, errors = calculations.perform_calculations(
+        [c.type for c in calcs_in], [c.a for c in calcs_in], [c.b for c in calcs_in]
+    )
+    rows = [
+        {"user_id": user_id, "a": calc_in.a, "b": calc_in.b, "type": calc_in.type, "result": result}
+        for index, (calc_in, result) in enumerate(zip(calcs_in, results))
+        if index not in errors
+    ]
+    if not rows:
+        return [], errors
+
+    # sort_by_parameter_order would fall back to one INSERT per row on
+    # SQLite; ids are assigned in VALUES order, so sorting by id restores
+    # input order instead.
+    created = sorted(db.scalars(insert(Calculation).returning(Calculation), rows), key=lambda calc: calc.id)
+    deltas = {}
+    for calc in created:
+        delta = deltas.setdefault(calc.type, dict.fromkeys(_stats_delta(calc), 0))
+        for k, v in _stats_delta(calc).items():
+            delta[k] += v
+    owner = owner_key(user_id)
+    for op_type, delta in deltas.items():
+        _apply_stats_delta(db, owner, op_type, delta)
+        sketches.record(db, owner, op_type, [calc for calc in created if calc.type == op_type])
+    if timeseries.TIMESERIES_HOURLY:
+        timeseries.record_inserts(db, owner, created)
+    # RETURNING loaded every column; detached rows aren't expired (and
+    # reloaded one by one) by the commit
+    for calc in created:
+        db.expunge(calc)
+    data_version.bump(db)
+    db.commit()
+    _publish("created", owner, created, deltas.items())
+    return created, errors
+
+
+def get_calculation(db: Session, calc_id: int, user_id: int | None = None):
+    """Return calculation ``calc_id`` if it belongs to ``user_id``, else ``None``."""
+    return _owned_by(db.query(Calculation).filter(Calculation.id == calc_id), user_id).first()
 
-def get_calculation_stats(db: Session):
-    """Return simple aggregate statistics about calculations."""
-    total, avg_a, avg_b, avg_result = db.query(
-        func.count(Calculation.id),
-        func.avg(Calculation.a),
-        func.avg(Calculation.b),
-        func.avg(Calculation.result),
-    ).one()
-
-    # counts by type
-    types = ["Add", "Sub", "Multiply", "Divide"]
-    types = ["Add", "Sub", "Multiply", "Divide", "Power"]
-    counts = {}
-    for t in types:
-        counts[t] = db.query(func.count(Calculation.id)).filter(Calculation.type == t).scalar() or 0
+
+def update_calculation(db: Session, calc: Calculation, calc_in: CalculationCreate):
+    """Recompute and update ``calc``, moving its rollup contribution in the same transaction."""
+    result = calculations.perform_calculation(calc_in.type, calc_in.a, calc_in.b)
+    owner = owner_key(calc.user_id)
+    removed = (calc.type, _stats_delta(calc, -1))
+    _apply_stats_delta(db, owner, *removed)
+    sketches.record(db, owner, calc.type, [calc], sign=-1)
+    calc.a = calc_in.a
+    calc.b = calc_in.b
+    calc.type = calc_in.type
+    calc.result = result
+    added = (calc.type, _stats_delta(calc))
+    _apply_stats_delta(db, owner, *added)
+    sketches.record(db, owner, calc.type, [calc])
+    if timeseries.TIMESERIES_HOURLY:
+        db.flush()
+        for op_type in {removed[0], added[0]}:
+            timeseries.recompute_hour(db, owner, op_type, timeseries.hour_of(calc))
+    data_version.bump(db)
+    db.commit()
+    db.refresh(calc)
+    _publish("updated", owner, [calc], [removed, added])
+    return calc
+
+
+def delete_calculation(db: Session, calc: Calculation):
+    """Delete ``calc`` and remove it from the rollup in the same transaction."""
+    owner = owner_key(calc.user_id)
+    removed = (calc.type, _stats_delta(calc, -1))
+    _apply_stats_delta(db, owner, *removed)
+    sketches.record(db, owner, calc.type, [calc], sign=-1)
+    calc_id = calc.id
+    db.delete(calc)
+    if timeseries.TIMESERIES_HOURLY:
+        db.flush()
+        timeseries.recompute_hour(db, owner, calc.type, timeseries.hour_of(calc))
+    data_version.bump(db)
+    db.commit()
+    _publish("deleted", owner, deltas=[removed], ids=[calc_id])
+
+
+def assign_calculation_owner(db: Session, user_id: int, batch_size: int = 1000) -> int:
+    """Move up to ``batch_size`` anonymous calculations to ``user_id``.
+
+    One short transaction per call, moving the rollup contribution along
+    with the rows; call repeatedly until it returns 0 to backfill a table.
+    """
+    rows = db.execute(
+        select(Calculation.id, Calculation.type, Calculation.a, Calculation.b, Calculation.result, Calculation.created_at)
+        .where(Calculation.user_id.is_(None))
+        .order_by(Calculation.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not rows:
+        return 0
+    db.execute(
+        update(Calculation)
+        .where(Calculation.id.in_([row.id for row in rows]), Calculation.user_id.is_(None))
+        .values(user_id=user_id)
+    )
+    deltas = {}
+    for row in rows:
+        delta = deltas.setdefault(row.type, dict.fromkeys(("count", "sum_a", "sum_b", "sum_result", "result_count"), 0))
+        for k, v in _stats_delta(row).items():
+            delta[k] += v
+    for op_type, delta in deltas.items():
+        _apply_stats_delta(db, ANONYMOUS_OWNER, op_type, {k: -v for k, v in delta.items()})
+        _apply_stats_delta(db, user_id, op_type, delta)
+        moved = [row for row in rows if row.type == op_type]
+        sketches.record(db, ANONYMOUS_OWNER, op_type, moved, sign=-1)
+        sketches.record(db, user_id, op_type, moved)
+    if timeseries.TIMESERIES_HOURLY:
+        for op_type, hour in {(row.type, timeseries.hour_of(row)) for row in rows}:
+            for owner in (ANONYMOUS_OWNER, user_id):
+                timeseries.recompute_hour(db, owner, op_type, hour)
+    data_version.bump(db)
+    db.commit()
+    return len(rows)
+
+
+def get_calculation_stats(db: Session, user_id: int | None = None, since: date | None = None):
+    """Return aggregate statistics about ``user_id``'s calculations.
+
+    Reads the caller's rows of the per-type rollup table, so the cost
+    depends on the number of operation types rather than on the number of
+    stored calculations. The approximate quantiles and distinct counts in
+    ``sketches`` come from the pre-merged all-time sketch buckets, or with
+    ``since`` from the day and month buckets of that UTC day onwards.
+    """
+    # every registered operation is reported, even with zero rows
+    counts = {t: 0 for t in calculations.operation_types()}
+    total = result_count = 0
+    sum_a = sum_b = sum_result = 0.0
+    for row in db.query(CalculationStat).filter(CalculationStat.owner_id == owner_key(user_id)).all():
+        if row.count <= 0:
+            continue
+        counts[row.type] = row.count
+        total += row.count
+        sum_a += row.sum_a
+        sum_b += row.sum_b
+        sum_result += row.sum_result
+        result_count += row.result_count
 
     return {
-        "total_count": int(total or 0),
-        "avg_a": float(avg_a) if avg_a is not None else None,
-        "avg_b": float(avg_b) if avg_b is not None else None,
-        "avg_result": float(avg_result) if avg_result is not None else None,
+        "total_count": int(total),
+        "avg_a": sum_a / total if total else None,
+        "avg_b": sum_b / total if total else None,
+        "avg_result": sum_result / result_count if result_count else None,
         "counts_by_type": counts,
+        # raw sums let clients apply the stats deltas streamed by /events
+        "sum_a": sum_a,
+        "sum_b": sum_b,
+        "sum_result": sum_result,
+        "result_count": int(result_count),
+        "sketches": sketches.summarize(db, owner_key(user_id), since),
+        "sketches_since": since,
+    }
+
+
+def _raw_calculation_stats(db: Session) -> dict[tuple[int, str], dict]:
+    """Aggregate the raw ``calculations`` table plus the retention archive per (owner, type)."""
+    owner = func.coalesce(Calculation.user_id, ANONYMOUS_OWNER)
+    raw = db.query(
+        owner,
+        Calculation.type,
+        func.count(Calculation.id),
+        func.coalesce(func.sum(Calculation.a), 0.0),
+        func.coalesce(func.sum(Calculation.b), 0.0),
+        func.coalesce(func.sum(Calculation.result), 0.0),
+        func.count(Calculation.result),
+    ).group_by(owner, Calculation.type)
+    archived = db.query(
+        CalculationArchive.owner_id,
+        CalculationArchive.type,
+        func.sum(CalculationArchive.count),
+        func.sum(CalculationArchive.sum_a),
+        func.sum(CalculationArchive.sum_b),
+        func.sum(CalculationArchive.sum_result),
+        func.sum(CalculationArchive.result_count),
+    ).group_by(CalculationArchive.owner_id, CalculationArchive.type)
+    totals = {}
+    for owner_id, op_type, count, sum_a, sum_b, sum_result, result_count in [*raw, *archived]:
+        total = totals.setdefault(
+            (owner_id, op_type), {"count": 0, "sum_a": 0.0, "sum_b": 0.0, "sum_result": 0.0, "result_count": 0}
+        )
+        total["count"] += int(count)
+        total["sum_a"] += float(sum_a)
+        total["sum_b"] += float(sum_b)
+        total["sum_result"] += float(sum_result)
+        total["result_count"] += int(result_count)
+    return totals
+
+
+def rebuild_calculation_stats(db: Session):
+    """Recompute the rollup table and its sketches from the raw ``calculations`` table and the archive."""
+    raw = _raw_calculation_stats(db)
+    db.query(CalculationStat).delete()
+    db.add_all(
+        CalculationStat(owner_id=owner_id, type=op_type, **values) for (owner_id, op_type), values in raw.items()
+    )
+    sketches.rebuild(db)
+    data_version.bump(db)
+    db.commit()
+    return raw
+
+
+def verify_calculation_stats(db: Session) -> list[dict]:
+    """Compare the rollup with raw + archived totals and return any drifted (owner, type) rows.
+
+    Sums are compared with a small tolerance because incremental float
+    additions and a fresh ``SUM`` can round differently.
+    """
+    raw = _raw_calculation_stats(db)
+    rollup = {
+        (row.owner_id, row.type): {k: getattr(row, k) for k in ("count", "sum_a", "sum_b", "sum_result", "result_count")}
+        for row in db.query(CalculationStat).all()
+    }
+    empty = {"count": 0, "sum_a": 0.0, "sum_b": 0.0, "sum_result": 0.0, "result_count": 0}
+    drift = []
+    for key in sorted(set(raw) | set(rollup)):
+        expected = raw.get(key, empty)
+        actual = rollup.get(key, empty)
+        if any(not math.isclose(expected[k], actual[k], rel_tol=1e-9, abs_tol=1e-6) for k in empty):
+            drift.append({"owner": key[0], "type": key[1], "expected": expected, "actual": actual})
+    return drift
+
+
+_ARCHIVE_PARTITION = """
+INSERT INTO calculation_archive (owner_id, type, period, count, sum_a, sum_b, sum_result, result_count)
+SELECT COALESCE(user_id, 0), type, :period, COUNT(id), COALESCE(SUM(a), 0), COALESCE(SUM(b), 0),
+       COALESCE(SUM(result), 0), COUNT(result)
+FROM {table} GROUP BY COALESCE(user_id, 0), type
+ON CONFLICT (owner_id, type, period) DO UPDATE SET
+    count = calculation_archive.count + excluded.count,
+    sum_a = calculation_archive.sum_a + excluded.sum_a,
+    sum_b = calculation_archive.sum_b + excluded.sum_b,
+    sum_result = calculation_archive.sum_result + excluded.sum_result,
+    result_count = calculation_archive.result_count + excluded.result_count
+"""
+
+
+def _archive_partition(db: Session, month: date) -> int:
+    """Detach one monthly partition, then compact it into the archive and drop it.
+
+    The detach runs concurrently, so ``calculations`` stays readable and
+    writable throughout; dropping the detached table then only locks
+    itself. Compacting and dropping are one transaction, and a table left
+    detached by an interrupted run is archived by the next one.
+    """
+    db.commit()  # a concurrent detach waits for every open transaction, ours included
+    partitions.detach_partition(db, month)
+    return _archive_detached(db, month)
+
+
+def _archive_detached(db: Session, month: date) -> int:
+    table = partitions.partition_name(month)
+    moved = db.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+    db.execute(text(_ARCHIVE_PARTITION.format(table=table)), {"period": month})
+    db.execute(text(f"DROP TABLE {table}"))
+    db.commit()
+    return moved
+
+
+def _archive_in_batches(db: Session, before: datetime, batch_size: int) -> int:
+    moved = 0
+    while True:
+        rows = db.execute(
+            select(Calculation.id, Calculation.user_id, Calculation.type, Calculation.a, Calculation.b,
+                   Calculation.result, Calculation.created_at)
+            .where(Calculation.created_at < before)
+            .order_by(Calculation.created_at, Calculation.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return moved
+        deltas = {}
+        for row in rows:
+            key = (owner_key(row.user_id), row.type, partitions.month_start(row.created_at))
+            delta = deltas.setdefault(key, dict.fromkeys(("count", "sum_a", "sum_b", "sum_result", "result_count"), 0))
+            for k, v in _stats_delta(row).items():
+                delta[k] += v
+        for (owner, op_type, period), delta in deltas.items():
+            _increment(db, CalculationArchive, {"owner_id": owner, "type": op_type, "period": period}, delta)
+        # the created_at bound lets a partitioned table prune the delete too
+        db.execute(delete(Calculation).where(Calculation.id.in_([row.id for row in rows]), Calculation.created_at < before))
+        db.commit()
+        moved += len(rows)
+
+
+def archive_calculations(db: Session, before: date, batch_size: int = 5000) -> int:
+    """Move calculations created before the month ``before`` into ``calculation_archive``.
+
+    Rows are compacted into per-owner, per-type, per-month totals and
+    deleted; the stats rollup is untouched, so totals don't change. On a
+    partitioned PostgreSQL table whole monthly partitions are detached,
+    archived and dropped; anything older still left in the legacy
+    partition, and every row on SQLite, goes in batches of ``batch_size``,
+    one transaction each. Returns the number of calculations archived.
+    """
+    moved = 0
+    if partitions.is_partitioned(db):
+        for month in partitions.detached_partitions(db):
+            moved += _archive_detached(db, month)
+        for month in partitions.list_partitions(db):
+            if partitions.add_months(month, 1) <= before:
+                moved += _archive_partition(db, month)
+    moved += _archive_in_batches(db, partitions.month_bound(before), batch_size)
+    if moved:
+        data_version.bump(db)
+        db.commit()
+    return moved
+
+
+def encode_cursor(calc: Calculation) -> str:
+    """Return an opaque keyset cursor pointing just after ``calc``."""
+    raw = json.dumps([calc.created_at.isoformat(), calc.id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Decode a cursor produced by :func:`encode_cursor`; raise ``ValueError`` if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, calc_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(calc_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def _count_calculations(db: Session, mode: str, user_id: int | None = None) -> int | None:
+    """Count ``user_id``'s calculations according to ``mode``: exact, estimate, cached or none."""
+    if mode == "none":
+        return None
+    if mode == "exact":
+        return int(_owned_by(db.query(func.count(Calculation.id)), user_id).scalar() or 0)
+    # "cached" and "estimate": planner statistics only cover the whole
+    # table, while the per-owner rollup holds an exact total
+    return int(
+        db.query(func.coalesce(func.sum(CalculationStat.count), 0))
+        .filter(CalculationStat.owner_id == owner_key(user_id))
+        .scalar()
+    )
+
+
+def _keyset_page(query, limit: int, cursor: str | None = None, offset: int = 0):
+    """Return ``(items, next_cursor)`` for a page ordered by ``created_at DESC, id DESC``."""
+    query = query.order_by(Calculation.created_at.desc(), Calculation.id.desc())
+    if cursor:
+        created_at, calc_id = decode_cursor(cursor)
+        query = query.filter(tuple_(Calculation.created_at, Calculation.id) < (created_at, calc_id))
+    elif offset:
+        query = query.offset(offset)
+    items = query.limit(limit + 1).all()
+    if len(items) > limit:
+        items = items[:limit]
+        return items, encode_cursor(items[-1])
+    return items, None
+
+
+def get_calculation_history(
+    db: Session,
+    limit: int = 20,
+    offset: int = 0,
+    cursor: str | None = None,
+    total: str = "exact",
+    user_id: int | None = None,
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+):
+    """Return ``user_id``'s recent calculations (most recent first) with an optional total.
+
+    With ``cursor`` the page is fetched by seeking on ``(created_at, id)``
+    through the composite index, so every page costs the same regardless
+    of depth; ``offset`` is ignored in that case. ``total`` selects how the
+    total is computed: ``exact`` (COUNT), ``cached`` or ``estimate`` (stats
+    rollup) or ``none``.
+
+    ``created_after``/``created_before`` bound the window; on a partitioned
+    table only the overlapping monthly partitions are scanned. A bounded
+    window is always counted exactly, as the rollup covers all time.
+    """
+    window = {"created_after": created_after, "created_before": created_before}
+    query = _filter_calculations(_owned_by(db.query(Calculation), user_id), **window)
+    items, next_cursor = _keyset_page(query, limit, cursor=cursor, offset=offset)
+    if total != "none" and (created_after or created_before):
+        count = int(_filter_calculations(_owned_by(db.query(func.count(Calculation.id)), user_id), **window).scalar())
+    else:
+        count = _count_calculations(db, total, user_id)
+    return {"total": count, "items": items, "next_cursor": next_cursor}
+
+
+def _begin_snapshot(db: Session):
+    """Start a transaction whose reads all see one consistent snapshot.
+
+    The session may already be in a transaction (the auth dependency shares
+    it and has read the user), and a connection's isolation level cannot
+    change mid-transaction, so that one is ended first. Nothing was written
+    in it.
+    """
+    db.rollback()
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        # must be the first statement of the new transaction
+        db.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ"))
+    elif dialect == "sqlite":
+        # pysqlite only opens transactions for writes; in WAL mode an explicit
+        # BEGIN pins the snapshot taken by the first read
+        db.connection().exec_driver_sql("BEGIN")
+
+
+def get_dashboard_bootstrap(db: Session, limit: int = 100, history_limit: int = 5, user_id: int | None = None):
+    """Return stats, recent history and the first calculations page from one snapshot.
+
+    History is the head of the first page (both are newest first), so the
+    whole dashboard costs a fixed number of queries: the stats rollup, its
+    sketches and one page.
+    """
+    limit = max(limit, history_limit)
+    _begin_snapshot(db)
+    try:
+        stats = get_calculation_stats(db, user_id)
+        items, next_cursor = list_calculations(db, limit=limit, user_id=user_id)
+        # keep the loaded rows usable once the read transaction ends
+        for item in items:
+            db.expunge(item)
+    finally:
+        db.rollback()
+    recent = items[:history_limit]
+    more_history = len(items) > history_limit or next_cursor is not None
+    return {
+        "stats": stats,
+        "history": {
+            "total": stats["total_count"],
+            "items": recent,
+            "next_cursor": encode_cursor(recent[-1]) if more_history else None,
+        },
+        "calculations": items,
+        "next_cursor": next_cursor,
     }
 
 
-def get_calculation_history(db: Session, limit: int = 20, offset: int = 0):
-    """Return recent calculations (most recent first) with total count."""
-    total = db.query(func.count(Calculation.id)).scalar() or 0
-    items = db.query(Calculation).order_by(Calculation.created_at.desc()).limit(limit).offset(offset).all()
-    return {"total": int(total), "items": items}
+def _filter_calculations(
+    stmt,
+    type: str | None = None,
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+    min_result: float | None = None,
+    max_result: float | None = None,
+):
+    """Apply the optional browse filters to a query or select statement."""
+    if type is not None:
+        stmt = stmt.filter(Calculation.type == type)
+    if created_after is not None:
+        stmt = stmt.filter(Calculation.created_at >= created_after)
+    if created_before is not None:
+        stmt = stmt.filter(Calculation.created_at < created_before)
+    if min_result is not None:
+        stmt = stmt.filter(Calculation.result >= min_result)
+    if max_result is not None:
+        stmt = stmt.filter(Calculation.result <= max_result)
+    return stmt
+
+
+def list_calculations(db: Session, limit: int = 100, cursor: str | None = None, user_id: int | None = None, **filters):
+    """Return one page of ``user_id``'s calculations (newest first) and the cursor of the next page."""
+    query = _filter_calculations(_owned_by(db.query(Calculation), user_id), **filters)
+    return _keyset_page(query, limit, cursor=cursor)
+
+
+def calculation_rows_statement(limit: int | None = None, batch_size: int = 1000, user_id: int | None = None, **filters):
+    """Build the streaming export query: filtered column rows, newest first.
+
+    Plain column rows bypass the identity map and ``yield_per`` fetches
+    them ``batch_size`` at a time through a server-side cursor.
+    """
+    stmt = _filter_calculations(
+        _owned_by(select(
+            Calculation.id,
+            Calculation.a,
+            Calculation.b,
+            Calculation.type,
+            Calculation.result,
+            Calculation.created_at,
+        ), user_id),
+        **filters,
+    ).order_by(Calculation.created_at.desc(), Calculation.id.desc())
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt.execution_options(yield_per=batch_size)
+
+
+def iter_calculations(db: Session, limit: int | None = None, batch_size: int = 1000, user_id: int | None = None, **filters):
+    """Yield ``user_id``'s filtered calculation rows (newest first) in constant memory."""
+    yield from db.execute(calculation_rows_statement(limit, batch_size, user_id, **filters))
@@ -1,7 +1,12 @@
-# app/database.py
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 import os
+import time
+
+from . import metrics
 
 # Use PostgreSQL in production/Docker, SQLite for local development
 DATABASE_URL = os.getenv(
@@ -9,7 +14,135 @@ DATABASE_URL = os.getenv(
     "sqlite:///./app.db",
 )
 
-engine = create_engine(DATABASE_URL)
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    return default if value is None else value.lower() in ("1", "true", "yes", "on")
+
+
+# Engine tuning, all overridable through the environment
+POOL_SIZE = _env_int("DB_POOL_SIZE", 5)
+MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", 10)
+POOL_TIMEOUT = _env_int("DB_POOL_TIMEOUT", 30)
+POOL_RECYCLE = _env_int("DB_POOL_RECYCLE", 1800)
+POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)
+QUERY_CACHE_SIZE = _env_int("DB_QUERY_CACHE_SIZE", 500)
+STATEMENT_TIMEOUT_MS = _env_int("DB_STATEMENT_TIMEOUT_MS", 0)
+PREPARED_STATEMENT_CACHE_SIZE = _env_int("DB_PREPARED_STATEMENT_CACHE_SIZE", 100)
+SQLITE_WAL = _env_bool("DB_SQLITE_WAL", True)
+SQLITE_SYNCHRONOUS = os.getenv("DB_SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_MMAP_SIZE = _env_int("DB_SQLITE_MMAP_SIZE", 256 * 1024 * 1024)
+SQLITE_BUSY_TIMEOUT_MS = _env_int("DB_SQLITE_BUSY_TIMEOUT_MS", 5000)
+
+POOL_CHECKOUT_SECONDS = metrics.Histogram(
+    "db_pool_checkout_seconds", "Time spent waiting to check a connection out of the pool"
+)
+POOL_CHECKOUT_TIMEOUTS = metrics.Counter(
+    "db_pool_checkout_timeouts_total", "Pool checkouts that gave up after DB_POOL_TIMEOUT"
+)
+_pools: dict[str, QueuePool] = {}
+
+
+def _pool_stats():
+    stats = {}
+    for name, pool in list(_pools.items()):
+        capacity = pool.size() + max(pool._max_overflow, 0)
+        for stat, value in (
+            ("checked_out", pool.checkedout()),
+            ("size", pool.size()),
+            ("overflow", max(pool.overflow(), 0)),
+            ("saturation", pool.checkedout() / capacity if capacity else 0.0),
+        ):
+            stats[(("engine", name), ("stat", stat))] = value
+    return stats
+
+
+metrics.Gauge("db_pool", "Connection pool usage; saturation is checked_out / (size + max_overflow)", _pool_stats)
+
+
+class _InstrumentedPoolMixin:
+    """Records checkout latency and timeouts for every connection request."""
+    engine_label = "sync"
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            POOL_CHECKOUT_TIMEOUTS.inc(engine=self.engine_label)
+            raise
+        finally:
+            POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - start, engine=self.engine_label)
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    engine_label = "async"
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    if SQLITE_WAL:
+        cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+def engine_options(url: str, is_async: bool = False) -> dict:
+    """Return ``create_engine`` keyword arguments for ``url`` from the DB_* settings."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    options = {"query_cache_size": QUERY_CACHE_SIZE}
+    connect_args = {}
+    if backend == "sqlite" and parsed.database in (None, "", ":memory:"):
+        # in-memory databases use a single shared connection, not a queue pool
+        return options
+    options.update(
+        poolclass=InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+        pool_size=POOL_SIZE,
+        max_overflow=MAX_OVERFLOW,
+        pool_timeout=POOL_TIMEOUT,
+        pool_recycle=POOL_RECYCLE,
+        pool_pre_ping=POOL_PRE_PING,
+    )
+    if backend == "sqlite" and not is_async:
+        # pooled connections are handed between threadpool workers
+        connect_args["check_same_thread"] = False
+    if backend == "postgresql":
+        if is_async:
+            connect_args["prepared_statement_cache_size"] = PREPARED_STATEMENT_CACHE_SIZE
+            if STATEMENT_TIMEOUT_MS:
+                connect_args["server_settings"] = {"statement_timeout": str(STATEMENT_TIMEOUT_MS)}
+        elif STATEMENT_TIMEOUT_MS:
+            connect_args["options"] = f"-c statement_timeout={STATEMENT_TIMEOUT_MS}"
+    if connect_args:
+        options["connect_args"] = connect_args
+    return options
+
+
+def configure_engine(engine, label: str = "sync"):
+    """Attach SQLite pragmas and pool metrics to an engine built with :func:`engine_options`."""
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+    if isinstance(engine.pool, QueuePool):
+        _pools[label] = engine.pool
+    return engine
+
+
+def create_app_engine(url: str = DATABASE_URL):
+    return configure_engine(create_engine(url, **engine_options(url)))
+
+
+engine = create_app_engine(DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -0,0 +1,117 @@
+# app/events.py
+"""Server-sent events for calculation changes.
+
+``crud`` publishes an event after every committed calculation write;
+``GET /events`` streams them to the dashboards. Events are scoped to the
+owner of the calculations, so a client only hears about its own rows.
+Publishing may happen on any thread: subscribers are grouped by event
+loop and owner, and each loop is woken once per event, which then fans the pre-encoded message out to its
+queues. Every subscriber owns a small bounded queue; a subscriber that
+falls behind has it replaced by a single ``resync`` event, telling the
+client to reload instead of letting the backlog grow.
+"""
+import asyncio
+import json
+import os
+import threading
+
+from . import metrics
+
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "64"))
+EVENTS_KEEPALIVE_SECONDS = float(os.getenv("EVENTS_KEEPALIVE_SECONDS", "15"))
+
+EVENTS_PUBLISHED = metrics.Counter("events_published_total", "Calculation events published")
+EVENTS_RESYNCS = metrics.Counter("events_resyncs_total", "Subscribers that fell behind and were told to resync")
+
+
+def encode_event(event: str, data) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+RESYNC = encode_event("resync", {})
+
+
+class Subscriber:
+    __slots__ = ("queue", "loop", "owner")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int, owner: int = 0):
+        self.loop = loop
+        self.owner = owner
+        self.queue: asyncio.Queue[bytes] = asyncio.Queue(maxsize)
+
+    def offer(self, message: bytes):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # drop the backlog; the client reloads its state on resync
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            EVENTS_RESYNCS.inc()
+
+
+class EventBroker:
+    def __init__(self, queue_size: int = EVENTS_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._by_owner: dict[int, dict[asyncio.AbstractEventLoop, set[Subscriber]]] = {}
+
+    def subscribe(self, owner: int = 0) -> Subscriber:
+        """Register a subscriber for ``owner``'s events on the running event loop."""
+        subscriber = Subscriber(asyncio.get_running_loop(), self.queue_size, owner)
+        with self._lock:
+            self._by_owner.setdefault(owner, {}).setdefault(subscriber.loop, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self._lock:
+            by_loop = self._by_owner.get(subscriber.owner, {})
+            subscribers = by_loop.get(subscriber.loop)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del by_loop[subscriber.loop]
+                if not by_loop:
+                    del self._by_owner[subscriber.owner]
+
+    def subscriber_count(self) -> int:
+        return sum(len(subscribers) for by_loop in self._by_owner.values() for subscribers in by_loop.values())
+
+    def publish(self, event: str, data, owner: int = 0):
+        """Send an event to ``owner``'s subscribers; safe to call from any thread."""
+        message = encode_event(event, data)
+        EVENTS_PUBLISHED.inc(event=event)
+        with self._lock:
+            targets = [(loop, tuple(subscribers)) for loop, subscribers in self._by_owner.get(owner, {}).items()]
+        for loop, subscribers in targets:
+            try:
+                loop.call_soon_threadsafe(_deliver, subscribers, message)
+            except RuntimeError:
+                pass  # loop closed; its subscribers are going away
+
+
+def _deliver(subscribers, message: bytes):
+    for subscriber in subscribers:
+        subscriber.offer(message)
+
+
+async def stream(broker: "EventBroker", is_disconnected, keepalive: float = EVENTS_KEEPALIVE_SECONDS, owner: int = 0):
+    """Yield SSE messages about ``owner``'s calculations for one client until it disconnects."""
+    subscriber = broker.subscribe(owner)
+    try:
+        yield b"retry: 3000\n\n"
+        while True:
+            try:
+                yield await asyncio.wait_for(subscriber.queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                if await is_disconnected():
+                    break
+                # comment lines keep proxies from closing idle connections
+                yield b": keepalive\n\n"
+    finally:
+        broker.unsubscribe(subscriber)
+
+
+broker = EventBroker()
+
+metrics.Gauge("events_subscribers", "Open /events connections", broker.subscriber_count)
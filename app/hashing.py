@@ -0,0 +1,100 @@
+# app/hashing.py
+"""Password hashing off the request workers.
+
+PBKDF2 is CPU-bound and holds the GIL, so the auth routes hand it to a
+dedicated process pool. At most ``HASH_QUEUE_SIZE`` operations may be
+running or waiting at once; beyond that :class:`HashingSaturated` is
+raised immediately (the routes answer 429) instead of letting login
+storms queue up behind each other.
+"""
+import asyncio
+import functools
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+from . import metrics, security
+
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", os.cpu_count() or 1))
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE", HASH_WORKERS * 8))
+# "process" bypasses the GIL; "thread" is available for constrained environments
+HASH_EXECUTOR = os.getenv("HASH_EXECUTOR", "process")
+
+HASH_SECONDS = metrics.Histogram("password_hash_seconds", "Time to hash or verify a password, including queueing")
+HASH_REJECTED = metrics.Counter("password_hash_rejected_total", "Password operations rejected because the hashing queue was full")
+
+
+@functools.lru_cache(maxsize=4)
+def _context(config: str) -> CryptContext:
+    return CryptContext.from_string(config)
+
+
+# Workers receive the parent's context config, so calibration done at
+# startup applies to the pool whatever its start method.
+def _hash(config: str, password: str) -> str:
+    return _context(config).hash(password)
+
+
+def _verify(config: str, password: str, hashed: str) -> tuple[bool, bool]:
+    context = _context(config)
+    if not context.verify(password, hashed):
+        return False, False
+    return True, context.needs_update(hashed)
+
+
+class HashingSaturated(Exception):
+    """Raised when the hashing queue is full."""
+
+
+class HashingExecutor:
+    def __init__(self, workers: int = HASH_WORKERS, max_pending: int = HASH_QUEUE_SIZE, kind: str = HASH_EXECUTOR):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.kind = kind
+        self.pending = 0
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.kind == "process":
+                # spawn rather than fork: the server process is multi-threaded
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="hashing")
+        return self._executor
+
+    async def _submit(self, op: str, fn, *args):
+        if self.pending >= self.max_pending:
+            HASH_REJECTED.inc(op=op)
+            raise HashingSaturated()
+        self.pending += 1
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.pending -= 1
+            HASH_SECONDS.observe(time.perf_counter() - start, op=op)
+
+    async def hash(self, password: str) -> str:
+        return await self._submit("hash", _hash, security.pwd_context_config, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        ok, _ = await self.verify_and_check(password, hashed)
+        return ok
+
+    async def verify_and_check(self, password: str, hashed: str) -> tuple[bool, bool]:
+        """Return ``(matches, needs_update)`` for a stored hash."""
+        return await self._submit("verify", _verify, security.pwd_context_config, password, hashed)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+hashing_executor = HashingExecutor()
+
+metrics.Gauge("password_hash_pending", "Password operations running or queued", lambda: hashing_executor.pending)
@@ -1,16 +1,30 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Header
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, BackgroundTasks, Depends, HTTPException, status, Header, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-from datetime import timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import ValidationError
+from datetime import date, datetime, timedelta, timezone
 from pathlib import Path
-
-from .database import Base, engine, SessionLocal
-from . import models, schemas, crud, calculations
-from .security import verify_password, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
-from .security import SECRET_KEY, ALGORITHM
-from jose import JWTError, jwt
+import csv
+import io
+import json
+from typing import Any, Literal
+
+from .database import engine, SessionLocal
+from .migrate import DB_AUTO_MIGRATE, upgrade_database
+from .async_database import DATABASE_ASYNC, get_async_db, run_db
+from starlette.concurrency import run_in_threadpool
+from . import schemas, crud, calculations, metrics
+from .security import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES, STREAM_TICKET_TTL
+from .security import PASSWORD_HASH_TARGET_MS, configure_password_hashing
+from .security import decode_access_token
+from .user_cache import user_cache
+from .hashing import HashingSaturated, hashing_executor
+from .assets import AssetStore
+from . import events, partitions, timeseries
+from .response_cache import cached_json
+from jose import JWTError
 
 # Add security scheme for Swagger Authorize button
 security = HTTPBearer()
@@ -21,14 +35,30 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# Mount static files at /static and also serve HTML from root
+# Static files are minified, compressed and hashed once when the app is
+# loaded; HTML pages are also served from root
 static_dir = Path(__file__).parent / "static"
-app.mount("/static", StaticFiles(directory=static_dir), name="static")
+asset_store = AssetStore.load(static_dir)
 
-# Create tables on app startup (not at import)
 @app.on_event("startup")
 def on_startup():
-    Base.metadata.create_all(bind=engine)
+    if PASSWORD_HASH_TARGET_MS:
+        # pick password hash rounds for the target verify time on this host
+        configure_password_hashing(target_ms=PASSWORD_HASH_TARGET_MS)
+    # the schema is managed by migrations (app/migrate.py), not created here
+    if DB_AUTO_MIGRATE:
+        upgrade_database(engine)
+    else:
+        db = SessionLocal()
+        try:
+            partitions.ensure_partitions(db)
+        finally:
+            db.close()
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    hashing_executor.shutdown()
 
 
 def get_db():
@@ -39,8 +69,13 @@ def get_db():
         db.close()
 
 
-def get_current_user(authorization: str = Header(None), db: Session = Depends(get_db)):
-    """Dependency to get the current user from the Authorization header."""
+# Calculation and report routes run on the event loop with an AsyncSession
+# when DATABASE_ASYNC is enabled, and share the sync session otherwise.
+get_calc_db = get_async_db if DATABASE_ASYNC else get_db
+
+
+def authenticate(db: Session, authorization: str | None):
+    """Return the user named by the bearer token in ``authorization``, or raise 401."""
     if not authorization:
         raise HTTPException(status_code=401, detail="Not authenticated")
     try:
@@ -48,7 +83,7 @@ def get_current_user(authorization: str = Header(None), db: Session = Depends(ge
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid authorization header")
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_access_token(token)
         username: str = payload.get("sub")
         uid: int | None = payload.get("uid")
         if username is None and uid is None:
@@ -56,6 +91,18 @@ def get_current_user(authorization: str = Header(None), db: Session = Depends(ge
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+    # tokens minted for a refresh session stop working once it is revoked
+    sid = payload.get("sid")
+    if sid is not None and not crud.refresh_session_active(db, sid):
+        raise HTTPException(status_code=401, detail="Session revoked")
+
+    # The uid is stable, so a recently seen user is served from the cache
+    # without touching the database.
+    if uid is not None:
+        user = user_cache.get(db, uid)
+        if user is not None:
+            return user
+
     # First try to find by username (most common). If username changed since
     # the token was issued, fall back to uid if present so users can still be
     # authenticated after updating username.
@@ -66,73 +113,171 @@ def get_current_user(authorization: str = Header(None), db: Session = Depends(ge
         user = crud.get_user_by_id(db, uid)
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
+    if user.id == uid:
+        user_cache.put(user)
     return user
 
+
+def get_current_user(authorization: str = Header(None), db: Session = Depends(get_db)):
+    """Dependency to get the current user from the Authorization header."""
+    return authenticate(db, authorization)
+
+
+def get_optional_user(authorization: str = Header(None), db: Session = Depends(get_db)):
+    """Like ``get_current_user``, but anonymous callers get ``None`` instead of 401.
+
+    Calculations are owned by the user who created them; anonymous callers
+    keep working against the shared pool of unowned calculations.
+    """
+    if not authorization:
+        return None
+    return get_current_user(authorization, db)
+
+
+async def get_current_user_async(authorization: str = Header(None), db=Depends(get_async_db)):
+    """``get_current_user`` on the request's ``AsyncSession``, without a threadpool hop."""
+    return await run_db(db, authenticate, authorization)
+
+
+async def get_optional_user_async(authorization: str = Header(None), db=Depends(get_async_db)):
+    """``get_optional_user`` on the request's ``AsyncSession``."""
+    if not authorization:
+        return None
+    return await get_current_user_async(authorization, db)
+
+
+# In async mode the calculation routes authenticate on the same AsyncSession
+# they query with, so a request holds one connection and never blocks a thread.
+get_calc_user = get_optional_user_async if get_calc_db is get_async_db else get_optional_user
+
+
+def _owner(user) -> int | None:
+    return user.id if user is not None else None
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def read_metrics():
+    """Expose process metrics in the Prometheus text format."""
+    return metrics.render()
+
 @app.get("/")
-def read_root():
-    static_dir = Path(__file__).parent / "static"
-    return FileResponse(static_dir / "register.html")
+def read_root(request: Request):
+    return asset_store.response("register.html", request)
 
 @app.get("/register.html")
-def get_register():
-    static_dir = Path(__file__).parent / "static"
-    return FileResponse(static_dir / "register.html")
+def get_register(request: Request):
+    return asset_store.response("register.html", request)
 
 @app.get("/login.html")
-def get_login():
-    static_dir = Path(__file__).parent / "static"
-    return FileResponse(static_dir / "login.html")
+def get_login(request: Request):
+    return asset_store.response("login.html", request)
 
 @app.get("/dashboard.html")
-def get_dashboard():
-    static_dir = Path(__file__).parent / "static"
-    return FileResponse(static_dir / "dashboard.html")
+def get_dashboard(request: Request):
+    return asset_store.response("dashboard.html", request)
 
 
 @app.get("/profile.html")
-def get_profile():
-    static_dir = Path(__file__).parent / "static"
-    return FileResponse(static_dir / "profile.html")
+def get_profile(request: Request):
+    return asset_store.response("profile.html", request)
 
-@app.post("/users/", response_model=schemas.UserRead, status_code=status.HTTP_201_CREATED)
-def create_user(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
-    if crud.get_user_by_username(db, user_in.username):
-        raise HTTPException(400, "Username already exists")
-    if crud.get_user_by_email(db, user_in.email):
-        raise HTTPException(400, "Email already exists")
-    return crud.create_user(db, user_in)
 
+@app.get("/static/{name}", include_in_schema=False)
+def get_static_asset(name: str, request: Request):
+    """Serve a static asset; fingerprinted names are cached as immutable."""
+    if name not in asset_store:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return asset_store.response(name, request)
 
-@app.post("/users/register", response_model=schemas.TokenResponse, status_code=status.HTTP_201_CREATED)
-def register_user(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
-    """Register a new user and return JWT token."""
-    if crud.get_user_by_username(db, user_in.username):
-        raise HTTPException(400, "Username already exists")
-    if crud.get_user_by_email(db, user_in.email):
-        raise HTTPException(400, "Email already exists")
-    user = crud.create_user(db, user_in)
+async def _offload_hashing(op, *args):
+    """Run a hashing executor call, answering 429 when its queue is full."""
+    try:
+        return await op(*args)
+    except HashingSaturated:
+        raise HTTPException(status_code=429, detail="Too many password operations, retry shortly", headers={"Retry-After": "1"})
+
+
+def _token_response(user, refresh_token: str, family_id: str) -> dict:
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(data={"sub": user.username, "uid": user.id}, expires_delta=access_token_expires)
+    access_token = create_access_token(
+        data={"sub": user.username, "uid": user.id, "sid": family_id}, expires_delta=access_token_expires
+    )
     return {
         "access_token": access_token,
+        "refresh_token": refresh_token,
         "token_type": "bearer",
         "user": {"id": user.id, "username": user.username, "email": user.email}
     }
 
 
+async def _start_session(db: Session, user) -> dict:
+    refresh_token, family_id = await run_db(db, crud.create_refresh_token, user.id)
+    return _token_response(user, refresh_token, family_id)
+
+
+async def _register(db: Session, user_in: schemas.UserCreate):
+    # no lookups first: the unique constraints decide, also under concurrent registrations
+    password_hash = await _offload_hashing(hashing_executor.hash, user_in.password)
+    try:
+        return await run_db(db, crud.create_user, user_in, password_hash)
+    except crud.DuplicateUserError as exc:
+        raise HTTPException(400, str(exc))
+
+
+@app.post("/users/", response_model=schemas.UserRead, status_code=status.HTTP_201_CREATED)
+async def create_user(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
+    return await _register(db, user_in)
+
+
+@app.post("/users/register", response_model=schemas.TokenResponse, status_code=status.HTTP_201_CREATED)
+async def register_user(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
+    """Register a new user and return JWT token."""
+    user = await _register(db, user_in)
+    return await _start_session(db, user)
+
+
+async def _upgrade_password_hash(bind, user_id: int, password: str, old_hash: str):
+    """Rehash with the current cost settings after the login response is sent."""
+    try:
+        new_hash = await hashing_executor.hash(password)
+    except HashingSaturated:
+        return  # retried on the user's next login
+
+    def upgrade():
+        with Session(bind) as db:
+            crud.upgrade_password_hash(db, user_id, old_hash, new_hash)
+
+    await run_in_threadpool(upgrade)
+
+
 @app.post("/users/login", response_model=schemas.TokenResponse)
-def login_user(user_in: schemas.UserLogin, db: Session = Depends(get_db)):
+async def login_user(user_in: schemas.UserLogin, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     """Login a user by verifying username and password, return JWT token."""
-    user = crud.get_user_by_username(db, user_in.username)
-    if not user or not verify_password(user_in.password, user.password_hash):
+    user = await run_db(db, crud.get_user_by_username, user_in.username)
+    if not user:
         raise HTTPException(status_code=401, detail="Invalid username or password")
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(data={"sub": user.username, "uid": user.id}, expires_delta=access_token_expires)
-    return {
-        "access_token": access_token,
-        "token_type": "bearer",
-        "user": {"id": user.id, "username": user.username, "email": user.email}
-    }
+    ok, needs_update = await _offload_hashing(hashing_executor.verify_and_check, user_in.password, user.password_hash)
+    if not ok:
+        raise HTTPException(status_code=401, detail="Invalid username or password")
+    if needs_update:
+        background_tasks.add_task(_upgrade_password_hash, db.get_bind(), user.id, user_in.password, user.password_hash)
+    return await _start_session(db, user)
+
+
+@app.post("/users/refresh", response_model=schemas.TokenResponse)
+async def refresh_session(payload: schemas.RefreshRequest, db: Session = Depends(get_db)):
+    """Rotate a refresh token and mint a new access token without a password check."""
+    try:
+        user, refresh_token, family_id = await run_db(db, crud.rotate_refresh_token, payload.refresh_token)
+    except crud.InvalidRefreshToken as exc:
+        raise HTTPException(status_code=401, detail=str(exc))
+    return _token_response(user, refresh_token, family_id)
+
+
+@app.post("/users/logout")
+async def logout(payload: schemas.RefreshRequest, db: Session = Depends(get_db)):
+    """Revoke the refresh session, and with it the access tokens minted for it."""
+    await run_db(db, crud.logout_refresh_token, payload.refresh_token)
+    return {"detail": "Logged out"}
 
 
 @app.get("/users/me", response_model=schemas.UserRead)
@@ -142,95 +287,322 @@ def read_current_user(current_user=Depends(get_current_user)):
 
 @app.put("/users/me", response_model=schemas.UserRead)
 def update_profile(update: schemas.UserUpdate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    # prevent duplicate username/email
-    if update.username and crud.get_user_by_username(db, update.username) and update.username != current_user.username:
-        raise HTTPException(status_code=400, detail="Username already exists")
-    if update.email and crud.get_user_by_email(db, update.email) and update.email != current_user.email:
-        raise HTTPException(status_code=400, detail="Email already exists")
-    user = crud.update_user(db, current_user, username=update.username, email=update.email)
-    return user
+    # duplicate username/email are rejected by the unique constraints
+    try:
+        return crud.update_user(db, current_user, username=update.username, email=update.email)
+    except crud.DuplicateUserError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
 
 
 @app.post("/users/me/change-password")
-def change_password(payload: schemas.PasswordChange, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    # verify current password
-    if not verify_password(payload.current_password, current_user.password_hash):
+async def change_password(payload: schemas.PasswordChange, authorization: str = Header(None),
+                          db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    # verify current password; the cached user does not carry the hash
+    stored_hash = await run_db(db, crud.get_password_hash, current_user.id)
+    if not await _offload_hashing(hashing_executor.verify, payload.current_password, stored_hash):
         raise HTTPException(status_code=400, detail="Current password is incorrect")
-    crud.change_user_password(db, current_user, payload.new_password)
+    password_hash = await _offload_hashing(hashing_executor.hash, payload.new_password)
+    # the already-verified token is a cache hit; its session stays signed in
+    sid = decode_access_token(authorization.split()[1]).get("sid")
+    await run_db(db, crud.change_user_password, current_user, payload.new_password, password_hash, keep_session=sid)
     return {"detail": "Password changed"}
 
 
 # Calculation BREAD Endpoints
 @app.post("/calculations", response_model=schemas.CalculationRead, status_code=status.HTTP_201_CREATED)
-def add_calculation(calc_in: schemas.CalculationCreate, db: Session = Depends(get_db)):
+async def add_calculation(calc_in: schemas.CalculationCreate, db=Depends(get_calc_db),
+                          current_user=Depends(get_calc_user)):
     """Add (POST) a new calculation."""
     try:
-        return crud.create_calculation(db, calc_in)
+        return await run_db(db, crud.create_calculation, calc_in, _owner(current_user))
     except ZeroDivisionError:
         raise HTTPException(status_code=400, detail="Division by zero")
-    except ValueError as e:
+    except (OverflowError, ValueError) as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+MAX_BATCH_SIZE = 10_000
+
+
+@app.post("/calculations/batch", response_model=schemas.CalculationBatchResult, status_code=status.HTTP_201_CREATED)
+async def add_calculations_batch(items: list[dict[str, Any]], db=Depends(get_calc_db),
+                                 current_user=Depends(get_calc_user)):
+    """Add (POST) many calculations at once.
+
+    Each item is validated and computed independently; invalid items are
+    reported in ``errors`` by position and the valid ones are inserted in
+    a single statement.
+    """
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Batch size exceeds {MAX_BATCH_SIZE} items")
+    valid, positions, errors = [], [], []
+    for index, item in enumerate(items):
+        try:
+            valid.append(schemas.CalculationCreate.model_validate(item))
+            positions.append(index)
+        except ValidationError as e:
+            detail = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            errors.append({"index": index, "detail": detail})
+    created, failed = await run_db(db, crud.create_calculations, valid, _owner(current_user))
+    for i, exc in failed.items():
+        detail = "Division by zero" if isinstance(exc, ZeroDivisionError) else str(exc)
+        errors.append({"index": positions[i], "detail": detail})
+    errors.sort(key=lambda err: err["index"])
+    return {"created": created, "errors": errors}
+
+
+# The report endpoints below are served through the response cache: a
+# repeat poll is answered from pre-serialized bytes, or with 304 when
+# If-None-Match still matches, until a calculation write bumps the version.
+# Entries are cached per caller, since each one sees only their own rows.
+
 @app.get("/calculations/stats", response_model=schemas.CalculationStats)
-def calculations_stats(db: Session = Depends(get_db)):
-    """Return aggregate statistics about calculations."""
-    return crud.get_calculation_stats(db)
+async def calculations_stats(request: Request, since: date | None = None, db=Depends(get_calc_db),
+                             current_user=Depends(get_calc_user)):
+    """Return aggregate statistics about the caller's calculations.
+
+    ``since`` (a UTC day) limits the approximate quantiles and distinct
+    counts in ``sketches`` to calculations created from that day on.
+    """
+    owner = _owner(current_user)
+    return await cached_json(
+        request, db, schemas.CalculationStats, lambda: run_db(db, crud.get_calculation_stats, owner, since), scope=owner
+    )
 
 
 @app.get("/reports/summary", response_model=schemas.CalculationStats)
-def reports_summary(db: Session = Depends(get_db)):
+async def reports_summary(request: Request, since: date | None = None, db=Depends(get_calc_db),
+                          current_user=Depends(get_calc_user)):
     """Alias endpoint for calculation summary/reporting."""
-    return crud.get_calculation_stats(db)
+    owner = _owner(current_user)
+    return await cached_json(
+        request, db, schemas.CalculationStats, lambda: run_db(db, crud.get_calculation_stats, owner, since), scope=owner
+    )
 
 
 @app.get("/reports/history", response_model=schemas.ReportHistory)
-def reports_history(limit: int = 20, offset: int = 0, db: Session = Depends(get_db)):
-    """Return recent calculation history with pagination."""
-    return crud.get_calculation_history(db, limit=limit, offset=offset)
+async def reports_history(
+    request: Request,
+    limit: int = Query(20, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    cursor: str | None = None,
+    total: Literal["exact", "estimate", "cached", "none"] = "exact",
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+    db=Depends(get_calc_db),
+    current_user=Depends(get_calc_user),
+):
+    """Return the caller's recent calculation history with offset or cursor pagination.
+
+    Pass the returned ``next_cursor`` back as ``cursor`` to fetch the next
+    page with a constant-cost index seek. ``created_after``/``created_before``
+    bound the window, so only the matching monthly partitions are read.
+    """
+    owner = _owner(current_user)
+    try:
+        return await cached_json(request, db, schemas.ReportHistory, lambda: run_db(
+            db, crud.get_calculation_history, limit=limit, offset=offset, cursor=cursor, total=total, user_id=owner,
+            created_after=created_after, created_before=created_before,
+        ), scope=owner)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/reports/timeseries", response_model=schemas.Timeseries)
+async def reports_timeseries(
+    request: Request,
+    bucket: Literal["minute", "hour", "day"] = "hour",
+    start: datetime | None = None,
+    end: datetime | None = None,
+    type: list[str] | None = Query(None),
+    percentiles: str | None = Query(None, description="Comma-separated, e.g. 50,90,99"),
+    source: Literal["auto", "raw", "hourly"] = "auto",
+    db=Depends(get_calc_db),
+    current_user=Depends(get_calc_user),
+):
+    """Return count, avg, min, max and optional percentiles of the caller's results per time bucket.
+
+    Buckets are computed in SQL, in UTC; empty buckets are omitted. Without
+    ``start`` the last 60 buckets up to ``end`` (default: now) are returned.
+    """
+    owner = _owner(current_user)
+    unknown = set(type or ()) - set(calculations.operation_types())
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown calculation type: {', '.join(sorted(unknown))}")
+    try:
+        fractions = [float(p) / 100 for p in percentiles.split(",") if p.strip()] if percentiles else []
+    except ValueError:
+        raise HTTPException(status_code=400, detail="percentiles must be comma-separated numbers")
+    # resolve "now" here so cached defaults roll over with the bucket
+    end = timeseries.ceil_bucket(end or datetime.now(timezone.utc), bucket)
+    try:
+        return await cached_json(request, db, schemas.Timeseries, lambda: run_db(
+            db, timeseries.calculation_timeseries, bucket=bucket, start=start, end=end, types=type,
+            percentiles=fractions, user_id=owner, source=source,
+        ), scope=(owner, end))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/dashboard/bootstrap", response_model=schemas.DashboardBootstrap)
+async def dashboard_bootstrap(
+    limit: int = Query(100, ge=1, le=1000),
+    history_limit: int = Query(5, ge=1, le=100),
+    db=Depends(get_calc_db),
+    current_user=Depends(get_calc_user),
+):
+    """Return everything the dashboard renders in one round trip.
+
+    Stats, the recent history and the first page of calculations (at least
+    ``history_limit`` rows) are read from one session and one snapshot.
+    """
+    return await run_db(
+        db, crud.get_dashboard_bootstrap, limit=limit, history_limit=history_limit, user_id=_owner(current_user)
+    )
+
+
+@app.post("/events/ticket", response_model=schemas.StreamTicket, include_in_schema=False)
+def create_stream_ticket(current_user=Depends(get_current_user), db: Session = Depends(get_db)):
+    """Trade the access token for a short-lived, single-use ticket to open ``/events`` with."""
+    return {"ticket": crud.issue_stream_ticket(db, current_user.id), "expires_in": STREAM_TICKET_TTL}
+
+
+@app.get("/events", include_in_schema=False)
+async def calculation_events(request: Request, ticket: str | None = None, db: Session = Depends(get_db)):
+    """Stream calculation created/updated/deleted events with rollup deltas (SSE).
+
+    Only events about the caller's calculations are sent. ``EventSource``
+    cannot set headers, and an access token in the URL would end up in
+    access logs, so signed-in clients pass a ``ticket`` from
+    ``POST /events/ticket`` instead; it works once, within seconds.
+    Without one the stream carries the anonymous calculations. A
+    ``resync`` event means the client missed events and should reload
+    ``/dashboard/bootstrap``.
+    """
+    user_id = None
+    if ticket is not None:
+        user_id = crud.redeem_stream_ticket(db, ticket)
+        if user_id is None:
+            raise HTTPException(status_code=401, detail="Invalid or expired stream ticket")
+    db.close()  # the stream may stay open for hours; don't hold a connection
+    return StreamingResponse(
+        events.stream(events.broker, request.is_disconnected, owner=crud.owner_key(user_id)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+EXPORT_FIELDS = ["id", "a", "b", "type", "result", "created_at"]
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _export_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _csv_line(values) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue()
+
+
+def _export_line(row, format: str) -> str:
+    values = [_export_value(v) for v in row]
+    if format == "csv":
+        return _csv_line(values)
+    return json.dumps(dict(zip(EXPORT_FIELDS, values))) + "\n"
+
+
+def _export_lines(rows, format: str):
+    if format == "csv":
+        yield _csv_line(EXPORT_FIELDS)
+    for row in rows:
+        yield _export_line(row, format)
+
+
+async def _aexport_lines(rows, format: str):
+    if format == "csv":
+        yield _csv_line(EXPORT_FIELDS)
+    async for row in rows:
+        yield _export_line(row, format)
 
 
 @app.get("/calculations", response_model=list[schemas.CalculationRead])
-def browse_calculations(db: Session = Depends(get_db)):
-    """Browse (GET) all calculations."""
-    return db.query(models.Calculation).all()
+async def browse_calculations(
+    response: Response,
+    limit: int | None = Query(None, ge=1, le=1000),
+    cursor: str | None = None,
+    type: str | None = None,
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+    min_result: float | None = None,
+    max_result: float | None = None,
+    format: Literal["json", "ndjson", "csv"] = "json",
+    db=Depends(get_calc_db),
+    current_user=Depends(get_calc_user),
+):
+    """Browse (GET) the caller's calculations, newest first.
+
+    JSON responses are paginated (100 rows by default); the cursor of the
+    next page is returned in the ``X-Next-Cursor`` header. ``ndjson`` and
+    ``csv`` stream every matching row (or ``limit`` rows) from a
+    server-side cursor.
+    """
+    filters = {
+        "type": type,
+        "created_after": created_after,
+        "created_before": created_before,
+        "min_result": min_result,
+        "max_result": max_result,
+        "user_id": _owner(current_user),
+    }
+    if format != "json":
+        if isinstance(db, AsyncSession):
+            rows = await db.stream(crud.calculation_rows_statement(limit=limit, **filters))
+            lines = _aexport_lines(rows, format)
+        else:
+            # consumed lazily by Starlette in the threadpool
+            lines = _export_lines(crud.iter_calculations(db, limit=limit, **filters), format)
+        return StreamingResponse(lines, media_type=EXPORT_MEDIA_TYPES[format])
+    try:
+        items, next_cursor = await run_db(db, crud.list_calculations, limit=limit or 100, cursor=cursor, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
 
 
 @app.get("/calculations/{calc_id}", response_model=schemas.CalculationRead)
-def read_calculation(calc_id: int, db: Session = Depends(get_db)):
+async def read_calculation(calc_id: int, db=Depends(get_calc_db),
+                           current_user=Depends(get_calc_user)):
     """Read (GET) a specific calculation by ID."""
-    calc = crud.get_calculation(db, calc_id)
+    calc = await run_db(db, crud.get_calculation, calc_id, _owner(current_user))
     if not calc:
         raise HTTPException(status_code=404, detail="Calculation not found")
     return calc
 
 
 @app.put("/calculations/{calc_id}", response_model=schemas.CalculationRead)
-def edit_calculation(calc_id: int, calc_in: schemas.CalculationCreate, db: Session = Depends(get_db)):
+async def edit_calculation(calc_id: int, calc_in: schemas.CalculationCreate, db=Depends(get_calc_db),
+                           current_user=Depends(get_calc_user)):
     """Edit (PUT) an existing calculation."""
-    calc = crud.get_calculation(db, calc_id)
+    calc = await run_db(db, crud.get_calculation, calc_id, _owner(current_user))
     if not calc:
         raise HTTPException(status_code=404, detail="Calculation not found")
     try:
         # Recompute result with new values
-        result = calculations.perform_calculation(calc_in.type, calc_in.a, calc_in.b)
-        calc.a = calc_in.a
-        calc.b = calc_in.b
-        calc.type = calc_in.type
-        calc.result = result
-        db.commit()
-        db.refresh(calc)
-        return calc
-    except (ZeroDivisionError, ValueError) as e:
+        return await run_db(db, crud.update_calculation, calc, calc_in)
+    except (ArithmeticError, ValueError) as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @app.delete("/calculations/{calc_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_calculation(calc_id: int, db: Session = Depends(get_db)):
+async def delete_calculation(calc_id: int, db=Depends(get_calc_db),
+                             current_user=Depends(get_calc_user)):
     """Delete (DELETE) a calculation by ID."""
-    calc = crud.get_calculation(db, calc_id)
+    calc = await run_db(db, crud.get_calculation, calc_id, _owner(current_user))
     if not calc:
         raise HTTPException(status_code=404, detail="Calculation not found")
-    db.delete(calc)
-    db.commit()
+    await run_db(db, crud.delete_calculation, calc)
     return None
@@ -0,0 +1,141 @@
+# app/metrics.py
+"""In-process metrics exported in the Prometheus text format at ``GET /metrics``."""
+from __future__ import annotations
+import bisect
+import threading
+from abc import ABC, abstractmethod
+
+_registry: dict[str, "Metric"] = {}
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: tuple) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in key) + "}"
+
+
+class Metric(ABC):
+    type = "untyped"
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+        _registry[name] = self
+
+    @abstractmethod
+    def samples(self) -> list[tuple[str, tuple, float]]:
+        """Return ``(sample name, label key, value)`` triples for the exposition."""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines += [f"{name}{_format_labels(key)} {value}" for name, key, value in self.samples()]
+        return "\n".join(lines)
+
+
+class _LabeledValues(Metric):
+    """Values per label set, stored by the metric or read on scrape from ``callback``.
+
+    ``callback`` returns either a number or a mapping of label dicts
+    (as ``tuple(sorted(labels.items()))``) to numbers.
+    """
+
+    def __init__(self, name: str, help: str, callback=None):
+        super().__init__(name, help)
+        self._values: dict[tuple, float] = {}
+        self._callback = callback
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def samples(self):
+        values = dict(self._values)
+        if self._callback is not None:
+            result = self._callback()
+            values.update(result if isinstance(result, dict) else {(): result})
+        return [(self.name, key, value) for key, value in values.items()]
+
+
+class Counter(_LabeledValues):
+    """A monotonically increasing count; a ``callback`` must only ever return larger values."""
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_LabeledValues):
+    """A gauge set explicitly, or read on scrape from ``callback``."""
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+
+CACHE_EVENTS = ("hits", "misses", "evictions", "expirations")
+
+
+def cache_metrics(name: str, help: str, stats):
+    """Export a ``TTLCache.stats`` callable: its event counts as the counter
+    ``<name>_total`` (labelled ``event``), its size and capacity as the gauge ``<name>``."""
+
+    def events():
+        current = stats()
+        return {(("event", k),): current[k] for k in CACHE_EVENTS}
+
+    def sizes():
+        return {(("stat", k),): v for k, v in stats().items() if k not in CACHE_EVENTS}
+
+    Counter(f"{name}_total", f"{help} hits, misses, evictions and expirations", events)
+    Gauge(name, f"{help} size and maxsize", sizes)
+
+
+class Histogram(Metric):
+    type = "histogram"
+    DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name: str, help: str, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(buckets)
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * len(self.buckets), 0, 0.0])
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += 1
+            series[2] += value
+
+    def count(self, **labels) -> int:
+        series = self._series.get(_label_key(labels))
+        return series[1] if series else 0
+
+    def samples(self):
+        samples = []
+        for key, (bucket_counts, count, total) in self._series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket", key + (("le", bound),), cumulative))
+            samples.append((f"{self.name}_bucket", key + (("le", "+Inf"),), count))
+            samples.append((f"{self.name}_count", key, count))
+            samples.append((f"{self.name}_sum", key, total))
+        return samples
+
+
+def get_metric(name: str) -> Metric | None:
+    return _registry.get(name)
+
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in _registry.values()) + "\n"
@@ -0,0 +1,158 @@
+# app/migrate.py
+"""Schema migrations, run with Alembic from the scripts in ``migrations/``.
+
+Workers no longer create tables on boot. Upgrade the database before
+starting new code with ``python -m app.cli db upgrade`` (or ``alembic
+upgrade head``), or set ``DB_AUTO_MIGRATE=1`` to upgrade on startup in
+development and e2e runs.
+
+Databases created by ``create_all`` before migrations existed have no
+``alembic_version`` table; they are stamped at the baseline revision and
+the later revisions check what is already there before changing it.
+
+Migration scripts use the helpers below for changes that must not block
+writers: :func:`create_index_online` builds indexes with ``CREATE INDEX
+CONCURRENTLY`` on PostgreSQL, and :func:`backfill_in_batches` updates
+large tables in short, separately committed batches.
+"""
+import os
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+from alembic.operations import Operations
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from . import database, partitions
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "migrations"
+BASELINE_REVISION = "0001"
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "").lower() in ("1", "true", "yes", "on")
+# serializes concurrent upgrades (several workers with DB_AUTO_MIGRATE)
+_PG_LOCK_KEY = 0x6D696772
+
+
+def alembic_config(connection: Connection | None = None) -> Config:
+    config = Config()
+    config.set_main_option("script_location", str(MIGRATIONS_DIR))
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+
+def upgrade_database(engine: Engine | None = None, revision: str = "head"):
+    """Upgrade the database behind ``engine`` (the app engine by default) to ``revision``,
+    then create any missing upcoming ``calculations`` partitions."""
+    with (engine or database.engine).connect() as conn:
+        postgres = conn.dialect.name == "postgresql"
+        if postgres:
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": _PG_LOCK_KEY})
+        tables = set(inspect(conn).get_table_names())
+        # alembic manages its own transactions from here
+        conn.commit()
+        try:
+            config = alembic_config(conn)
+            if "alembic_version" not in tables and "users" in tables:
+                command.stamp(config, BASELINE_REVISION)
+            command.upgrade(config, revision)
+            with Session(bind=conn) as db:
+                partitions.ensure_partitions(db)
+        finally:
+            if postgres:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _PG_LOCK_KEY})
+                conn.commit()
+
+
+def has_table(op: Operations, table: str) -> bool:
+    return inspect(op.get_bind()).has_table(table)
+
+
+def has_column(op: Operations, table: str, column: str) -> bool:
+    return column in {c["name"] for c in inspect(op.get_bind()).get_columns(table)}
+
+
+def create_index_online(op: Operations, name: str, table: str, columns: list[str], **kw):
+    """Create an index without blocking writes, skipping it if it already exists.
+
+    On PostgreSQL this runs ``CREATE INDEX CONCURRENTLY`` outside the
+    migration transaction; an invalid index left behind by an interrupted
+    build is dropped and rebuilt. Elsewhere it is a plain ``CREATE INDEX``.
+    """
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        op.create_index(name, table, columns, if_not_exists=True, **kw)
+        return
+    with op.get_context().autocommit_block():
+        invalid = op.get_bind().execute(
+            text(
+                "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = :name AND NOT i.indisvalid"
+            ),
+            {"name": name},
+        ).first()
+        if invalid:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
+        op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True, **kw)
+
+
+def create_foreign_key_online(op: Operations, name: str, source: str, referent: str, local_cols: list[str],
+                              remote_cols: list[str], ondelete: str | None = None):
+    """Add a foreign key without blocking writes while existing rows are checked, skipping it if it already exists.
+
+    On PostgreSQL the constraint is added ``NOT VALID``, a catalog-only
+    change, and then validated outside the migration transaction, which
+    only takes a SHARE UPDATE EXCLUSIVE lock; a constraint left unvalidated
+    by an interrupted run is validated. Elsewhere it goes through
+    ``batch_alter_table``.
+    """
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        if name not in {fk["name"] for fk in inspect(bind).get_foreign_keys(source)}:
+            with op.batch_alter_table(source) as batch:
+                batch.create_foreign_key(name, referent, local_cols, remote_cols, ondelete=ondelete)
+        return
+    validated = bind.execute(
+        text("SELECT convalidated FROM pg_constraint WHERE conname = :name AND conrelid = to_regclass(:table)"),
+        {"name": name, "table": source},
+    ).scalar()
+    if validated is None:
+        on_delete = f" ON DELETE {ondelete}" if ondelete else ""
+        op.execute(
+            f"ALTER TABLE {source} ADD CONSTRAINT {name} FOREIGN KEY ({', '.join(local_cols)}) "
+            f"REFERENCES {referent} ({', '.join(remote_cols)}){on_delete} NOT VALID"
+        )
+    if not validated:
+        # commits the NOT VALID constraint first, releasing its brief lock
+        with op.get_context().autocommit_block():
+            op.execute(f"ALTER TABLE {source} VALIDATE CONSTRAINT {name}")
+
+
+def drop_index_online(op: Operations, name: str, table: str):
+    if op.get_bind().dialect.name != "postgresql":
+        op.drop_index(name, table_name=table, if_exists=True)
+        return
+    with op.get_context().autocommit_block():
+        op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+
+
+def backfill_in_batches(op: Operations, table: str, assignments: str, where: str, batch_size: int = 5000) -> int:
+    """Run ``UPDATE table SET assignments WHERE where`` in batches of ``batch_size`` rows.
+
+    ``where`` must stop matching a row once it has been updated. Each batch
+    is committed on its own, so row locks are held briefly and a long
+    backfill never holds back vacuum or replication. Returns the number of
+    rows updated.
+    """
+    statement = text(
+        f"UPDATE {table} SET {assignments} WHERE id IN "
+        f"(SELECT id FROM {table} WHERE {where} ORDER BY id LIMIT :batch_size)"
+    )
+    total = 0
+    with op.get_context().autocommit_block():
+        while True:
+            updated = op.get_bind().execute(statement, {"batch_size": batch_size}).rowcount
+            total += updated
+            if updated < batch_size:
+                return total
@@ -1,7 +1,14 @@
 # app/models.py
-from sqlalchemy import Column, Integer, String, DateTime, func, UniqueConstraint, Float
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, Integer, String, Date, DateTime, func, UniqueConstraint, Float, Index, ForeignKey
+from sqlalchemy import LargeBinary, SmallInteger
 from .database import Base
 
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
 class User(Base):
     __tablename__ = "users"
 
@@ -17,12 +24,161 @@ class User(Base):
     )
 
 
+class RefreshToken(Base):
+    """A refresh token, stored as its SHA-256 digest.
+
+    Tokens rotate on every use; all tokens descending from one login share
+    a ``family_id``, which access tokens carry as their ``sid`` claim.
+    """
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    token_hash = Column(String(64), unique=True, nullable=False)
+    family_id = Column(String(32), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), default=utcnow, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    revoked_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class StreamTicket(Base):
+    """A single-use ticket for opening ``/events``, stored as its SHA-256 digest.
+
+    ``EventSource`` cannot send an Authorization header, so the dashboard
+    trades its access token for one of these and puts it in the URL
+    instead; it is deleted when redeemed and expires after seconds.
+    """
+    __tablename__ = "stream_tickets"
+
+    token_hash = Column(String(64), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
 class Calculation(Base):
+    """A stored calculation.
+
+    On PostgreSQL the table is range-partitioned by month on ``created_at``
+    (see ``app/partitions.py``); its primary key there is ``(id, created_at)``.
+    """
     __tablename__ = "calculations"
 
     id = Column(Integer, primary_key=True, index=True)
+    # NULL for calculations created without a logged-in user
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True)
     a = Column(Float, nullable=False)
     b = Column(Float, nullable=False)
     type = Column(String(20), nullable=False, index=True)
     result = Column(Float, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # set client-side as well so every row is stored with the same
+    # (microsecond) precision, which keyset pagination compares against
+    created_at = Column(DateTime(timezone=True), default=utcnow, server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        # supports ORDER BY created_at DESC, id DESC and (created_at, id) seeks
+        Index("ix_calculations_created_at_id", "created_at", "id"),
+        # the same, within one owner: per-user pages read only that user's range
+        Index("ix_calculations_user_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_calculations_user_type", "user_id", "type"),
+    )
+
+
+ANONYMOUS_OWNER = 0
+
+
+class CalculationStat(Base):
+    """Per-owner, per-type rollup of calculations, maintained on every write.
+
+    ``owner_id`` is the calculation's ``user_id``, or ``ANONYMOUS_OWNER``
+    for rows without one (primary key columns cannot be NULL).
+    """
+    __tablename__ = "calculation_stats"
+
+    owner_id = Column(Integer, primary_key=True, default=ANONYMOUS_OWNER)
+    type = Column(String(20), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    sum_a = Column(Float, nullable=False, default=0.0)
+    sum_b = Column(Float, nullable=False, default=0.0)
+    sum_result = Column(Float, nullable=False, default=0.0)
+    result_count = Column(Integer, nullable=False, default=0)
+
+
+class CalculationArchive(Base):
+    """Per-owner, per-type, per-month totals of calculations removed by retention.
+
+    The rollup in ``calculation_stats`` keeps counting archived rows, so the
+    raw table plus this archive always add up to the rollup.
+    """
+    __tablename__ = "calculation_archive"
+
+    owner_id = Column(Integer, primary_key=True)
+    type = Column(String(20), primary_key=True)
+    # first day of the month the calculations were created in (UTC)
+    period = Column(Date, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    sum_a = Column(Float, nullable=False, default=0.0)
+    sum_b = Column(Float, nullable=False, default=0.0)
+    sum_result = Column(Float, nullable=False, default=0.0)
+    result_count = Column(Integer, nullable=False, default=0)
+
+
+class CalculationHourly(Base):
+    """Per-owner, per-type, per-hour result aggregates for ``/reports/timeseries``.
+
+    Maintained on write when ``TIMESERIES_HOURLY`` is enabled; retention
+    leaves it alone, so long-range reports outlive the raw rows.
+    """
+    __tablename__ = "calculation_hourly"
+
+    owner_id = Column(Integer, primary_key=True)
+    type = Column(String(20), primary_key=True)
+    # start of the UTC hour
+    hour = Column(DateTime(timezone=True), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    sum_result = Column(Float, nullable=False, default=0.0)
+    result_count = Column(Integer, nullable=False, default=0)
+    min_result = Column(Float, nullable=True)
+    max_result = Column(Float, nullable=True)
+
+
+class CalculationSketchBin(Base):
+    """One DDSketch bin count of ``a``, ``b`` or ``result`` (see ``app/sketches.py``).
+
+    ``grain`` is ``day``, ``month`` or ``all``; ``period`` is the UTC day,
+    the first day of the month, or ``ALL_TIME_PERIOD``. ``sign`` is -1, 0
+    (the zero bin, ``bin`` 0) or 1.
+    """
+    __tablename__ = "calculation_sketch_bins"
+
+    owner_id = Column(Integer, primary_key=True)
+    type = Column(String(20), primary_key=True)
+    grain = Column(String(5), primary_key=True)
+    period = Column(Date, primary_key=True)
+    field = Column(String(6), primary_key=True)
+    sign = Column(SmallInteger, primary_key=True)
+    bin = Column(Integer, primary_key=True, autoincrement=False)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class CalculationSketchRegisters(Base):
+    """HyperLogLog registers of ``a``, ``b`` and ``result`` for one owner, type and period."""
+    __tablename__ = "calculation_sketch_registers"
+
+    owner_id = Column(Integer, primary_key=True)
+    type = Column(String(20), primary_key=True)
+    grain = Column(String(5), primary_key=True)
+    period = Column(Date, primary_key=True)
+    a = Column(LargeBinary, nullable=False)
+    b = Column(LargeBinary, nullable=False)
+    result = Column(LargeBinary, nullable=False)
+
+
+class DataVersion(Base):
+    """The version behind the report ETags, bumped after every committed calculation write.
+
+    Kept in the database so every worker, and CLI commands, agree on it.
+    """
+    __tablename__ = "data_version"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    version = Column(Integer, nullable=False, default=0)
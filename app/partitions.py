@@ -0,0 +1,130 @@
+# app/partitions.py
+"""Monthly partitions of the ``calculations`` table.
+
+On PostgreSQL, migration 0004 turns ``calculations`` into a table
+range-partitioned on ``created_at``: one partition per UTC month
+(``calculations_y2026m10``) and a ``calculations_legacy`` partition
+holding the rows that existed before. There is deliberately no default
+partition: PostgreSQL can only detach partitions concurrently without
+one (see :func:`detach_partition`). Queries bounded by
+``created_at`` (keyset pages after the first, history with
+``created_after``) only scan the partitions that overlap the range.
+
+:func:`ensure_partitions` creates upcoming months ahead of time; it runs
+on every ``upgrade_database`` and app startup as well as from the
+retention job (``python -m app.cli calculations retention``), so a missed
+cron run cannot leave inserts without a partition.
+SQLite has no partitioning: the table stays whole there and retention
+falls back to batched deletes (see ``crud.archive_calculations``).
+"""
+import os
+import re
+from datetime import date, datetime, timezone
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+PARTITIONS_AHEAD = int(os.getenv("CALCULATION_PARTITIONS_AHEAD", "3"))
+# whole months kept before the current one by the retention job; 0 keeps everything
+RETENTION_MONTHS = int(os.getenv("CALCULATION_RETENTION_MONTHS", "0"))
+
+# serializes ensure_partitions across workers starting at the same time
+_PG_LOCK_KEY = 0x70617274
+_PARTITION_NAME = re.compile(r"calculations_y(\d{4})m(\d{2})")
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_bound(month: date) -> datetime:
+    """The first instant of ``month`` in UTC, as compared against ``created_at``."""
+    return datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+
+
+def partition_name(month: date) -> str:
+    return f"calculations_y{month.year}m{month.month:02d}"
+
+
+def partition_ddl(month: date, parent: str = "calculations") -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {parent} "
+        f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{add_months(month, 1).isoformat()} 00:00:00+00')"
+    )
+
+
+def is_partitioned(db: Session) -> bool:
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    return db.execute(
+        text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('calculations')")
+    ).first() is not None
+
+
+def list_partitions(db: Session) -> list[date]:
+    """Months that currently have their own partition, oldest first."""
+    names = db.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass('calculations')"
+    )).scalars()
+    months = []
+    for name in names:
+        match = _PARTITION_NAME.fullmatch(name)
+        if match:
+            months.append(date(int(match[1]), int(match[2]), 1))
+    return sorted(months)
+
+
+def ensure_partitions(db: Session, ahead: int = PARTITIONS_AHEAD, today: date | None = None) -> list[str]:
+    """Create the partitions for this month and the next ``ahead`` months; return the new ones.
+
+    Partitions must exist before rows for their month arrive, as inserts
+    outside every partition fail; startup, migrations and the retention job
+    keep ``ahead`` months in reserve.
+    """
+    if not is_partitioned(db):
+        return []
+    db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _PG_LOCK_KEY})
+    current = month_start(today or datetime.now(timezone.utc).date())
+    existing = set(list_partitions(db))
+    created = []
+    for n in range(ahead + 1):
+        month = add_months(current, n)
+        # months before the first monthly partition are in calculations_legacy
+        if month not in existing and (not existing or month > min(existing)):
+            db.execute(text(partition_ddl(month)))
+            created.append(partition_name(month))
+    db.commit()
+    return created
+
+
+def detach_partition(db: Session, month: date):
+    """Detach ``month``'s partition from ``calculations`` without blocking reads or writes on it.
+
+    ``DETACH PARTITION ... CONCURRENTLY`` only takes a SHARE UPDATE
+    EXCLUSIVE lock on the parent, but can't run in a transaction block, so
+    it goes through its own autocommit connection; the caller must not
+    hold a transaction on ``calculations``. A detach interrupted half way
+    is completed with ``FINALIZE``.
+    """
+    name = partition_name(month)
+    with db.get_bind().connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        pending = conn.execute(
+            text("SELECT inhdetachpending FROM pg_inherits WHERE inhrelid = to_regclass(:name)"), {"name": name}
+        ).scalar()
+        if pending is not None:
+            conn.exec_driver_sql(f"ALTER TABLE calculations DETACH PARTITION {name} {'FINALIZE' if pending else 'CONCURRENTLY'}")
+
+
+def detached_partitions(db: Session) -> list[date]:
+    """Months whose partition was detached but not yet archived (an interrupted retention run), oldest first."""
+    names = db.execute(text(
+        "SELECT relname FROM pg_class WHERE relkind = 'r' AND NOT relispartition "
+        "AND relname ~ '^calculations_y[0-9]{4}m[0-9]{2}$' AND pg_table_is_visible(oid)"
+    )).scalars()
+    return sorted(date(int(match[1]), int(match[2]), 1) for match in map(_PARTITION_NAME.fullmatch, names))
@@ -0,0 +1,61 @@
+# app/registry.py
+"""Registry of calculation operations.
+
+The registry is the single source of truth for which operation types
+exist: request validation, the stats type list and dispatch all read from
+it. Operations are stateless, so each type is backed by one shared
+instance and lookups are a single dict access.
+"""
+from __future__ import annotations
+from importlib.metadata import entry_points
+
+PLUGIN_GROUP = "secure_user_app.operations"
+
+
+class OperationRegistry:
+    def __init__(self):
+        self._operations = {}
+        self._names: tuple[str, ...] = ()
+
+    def register(self, name: str, operation=None, *, replace: bool = False):
+        """Register ``operation`` (a class or an instance) under ``name``.
+
+        Can also be used as a class decorator: ``@registry.register("Mod")``.
+        Classes are instantiated once; the instance is shared by all callers.
+        """
+        if operation is None:
+            return lambda op: self.register(name, op, replace=replace)
+        if name in self._operations and not replace:
+            raise ValueError(f"Operation type already registered: {name}")
+        self._operations[name] = operation() if isinstance(operation, type) else operation
+        self._names = tuple(self._operations)
+        return operation
+
+    def unregister(self, name: str):
+        self._operations.pop(name, None)
+        self._names = tuple(self._operations)
+
+    def get(self, name: str):
+        op = self._operations.get(name)
+        if op is None:
+            raise ValueError(f"Unknown operation type: {name}")
+        return op
+
+    def names(self) -> tuple[str, ...]:
+        return self._names
+
+    def __contains__(self, name) -> bool:
+        return name in self._operations
+
+    def load_plugins(self, group: str = PLUGIN_GROUP):
+        """Register operations advertised by installed packages.
+
+        Each entry point in ``group`` is registered under its name and must
+        load to an operation class or instance.
+        """
+        for ep in entry_points(group=group):
+            if ep.name not in self._operations:
+                self.register(ep.name, ep.load())
+
+
+registry = OperationRegistry()
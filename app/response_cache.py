@@ -0,0 +1,121 @@
+# app/response_cache.py
+"""Conditional requests and a serialized-response cache for read endpoints.
+
+``data_version`` is a counter in the database, bumped inside every
+calculation write's transaction, CLI maintenance included. Report responses
+are cached as JSON bytes keyed by (path, query, caller, version) and carry
+a weak ETag made of the version and a digest of the body, so a poll with a
+matching ``If-None-Match`` is answered 304 straight from the cache, and a
+repeat hit is served without serializing.
+
+Each process re-reads the version at most every ``DATA_VERSION_TTL``
+seconds (its own writes are seen immediately), so every worker hands out
+the same ETags and another worker's writes show up within that interval.
+"""
+import hashlib
+import os
+import threading
+import time
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from starlette.requests import Request
+from starlette.responses import Response
+
+from . import metrics, models, upsert
+from .async_database import run_db
+from .cache import TTLCache
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60"))
+DATA_VERSION_TTL = float(os.getenv("DATA_VERSION_TTL", "1"))
+
+
+class DataVersion:
+    """This process's view of the shared ``data_version`` row."""
+
+    def __init__(self, ttl: float = DATA_VERSION_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._value = None
+        self._expires = 0.0
+        self._generation = 0
+
+    def bump(self, db: Session):
+        """Increment the shared version in ``db``'s current transaction.
+
+        The new version becomes visible together with the write when the
+        caller commits; this process then drops its copy. Call it last,
+        right before the commit, so the row lock is held as briefly as
+        possible and always taken after the write's other locks.
+        """
+        upsert.increment(db, models.DataVersion, ["id"], [{"id": 1, "version": 1}])
+        db.info.setdefault("data_versions_bumped", set()).add(self)
+
+    def invalidate(self):
+        with self._lock:
+            self._expires = 0.0
+            self._generation += 1
+
+    def cached(self) -> str | None:
+        """The version read less than ``ttl`` seconds ago, or ``None``."""
+        with self._lock:
+            return self._value if time.monotonic() < self._expires else None
+
+    def load(self, db: Session) -> str:
+        generation = self._generation
+        value = str(db.scalar(select(models.DataVersion.version).where(models.DataVersion.id == 1)) or 0)
+        with self._lock:
+            # a commit that landed during the read must not be masked for ``ttl``
+            if generation == self._generation:
+                self._value, self._expires = value, time.monotonic() + self.ttl
+        return value
+
+
+data_version = DataVersion()
+response_cache = TTLCache(maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+
+
+@event.listens_for(Session, "after_commit")
+def _version_committed(session: Session):
+    for version in session.info.pop("data_versions_bumped", ()):
+        version.invalidate()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _version_rolled_back(session: Session, previous_transaction):
+    session.info.pop("data_versions_bumped", None)
+
+metrics.cache_metrics("response_cache", "Serialized report response cache", response_cache.stats)
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Weak comparison of ``If-None-Match`` against ``etag`` (RFC 9110)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+async def cached_json(request: Request, db, model, compute, scope=None) -> Response:
+    """Serve ``await compute()`` serialized through ``model``, cached per data version.
+
+    ``db`` is the request's session, used to read the version when the
+    process's copy is stale. ``scope`` identifies whose data the response
+    holds (the caller's user id).
+    """
+    version = data_version.cached() or await run_db(db, data_version.load)
+    key = (request.url.path, tuple(sorted(request.query_params.multi_items())), scope, version)
+    entry = response_cache.get(key)
+    if entry is None:
+        body = model.model_validate(await compute()).model_dump_json().encode()
+        etag = f'W/"{version}-{hashlib.sha256(body).hexdigest()[:16]}"'
+        entry = (body, etag)
+        response_cache.set(key, entry)
+    body, etag = entry
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
@@ -1,7 +1,9 @@
 # app/schemas.py
 from pydantic import BaseModel, EmailStr, constr, field_validator, ConfigDict
 from typing import Optional
-from datetime import datetime
+from datetime import date, datetime
+
+from .calculations import registry
 
 class UserBase(BaseModel):
     username: constr(min_length=3, max_length=50)
@@ -35,10 +37,20 @@ class UserLogin(BaseModel):
 
 class TokenResponse(BaseModel):
     access_token: str
+    refresh_token: str | None = None
     token_type: str = "bearer"
     user: dict  # Contains user info without password
 
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
+class StreamTicket(BaseModel):
+    ticket: str
+    expires_in: float
+
+
 class CalculationCreate(BaseModel):
     a: float
     b: float
@@ -46,9 +58,8 @@ class CalculationCreate(BaseModel):
 
     @field_validator("type")
     def validate_type(cls, v):
-        allowed = {"Add", "Sub", "Multiply", "Divide", "Power"}
-        if v not in allowed:
-            raise ValueError(f"type must be one of {allowed}")
+        if v not in registry:
+            raise ValueError(f"type must be one of {set(registry.names())}")
         return v
 
     @field_validator("b", mode="after")
@@ -75,18 +86,71 @@ class CalculationRead(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class CalculationBatchError(BaseModel):
+    index: int
+    detail: str
+
+
+class CalculationBatchResult(BaseModel):
+    created: list[CalculationRead] = []
+    errors: list[CalculationBatchError] = []
+
+
+class ValueSketch(BaseModel):
+    """Approximate distribution of one field: quantiles within 1%, distinct count within ~2%."""
+    count: int = 0
+    p50: float | None = None
+    p95: float | None = None
+    p99: float | None = None
+    distinct: int = 0
+
+
 class CalculationStats(BaseModel):
     total_count: int
     avg_a: float | None = None
     avg_b: float | None = None
     avg_result: float | None = None
     counts_by_type: dict[str, int] = {}
+    sum_a: float = 0.0
+    sum_b: float = 0.0
+    sum_result: float = 0.0
+    result_count: int = 0
+    # keyed by field: "a", "b", "result"
+    sketches: dict[str, ValueSketch] = {}
+    # the sketches cover calculations created on or after this UTC day; None is all time
+    sketches_since: date | None = None
 
     model_config = ConfigDict(from_attributes=True)
 
 
 class ReportHistory(BaseModel):
-    total: int
+    total: int | None = None
     items: list[CalculationRead] = []
+    next_cursor: str | None = None
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class TimeseriesPoint(BaseModel):
+    bucket: datetime
+    count: int
+    avg: float | None = None
+    min: float | None = None
+    max: float | None = None
+    # e.g. {"p50": 3.0, "p99": 12.5}, only when percentiles were requested
+    percentiles: dict[str, float | None] = {}
+
+
+class Timeseries(BaseModel):
+    bucket: str
+    start: datetime
+    end: datetime
+    source: str
+    points: list[TimeseriesPoint] = []
+
+
+class DashboardBootstrap(BaseModel):
+    stats: CalculationStats
+    history: ReportHistory
+    calculations: list[CalculationRead] = []
+    next_cursor: str | None = None
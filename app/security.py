@@ -1,16 +1,146 @@
 from passlib.context import CryptContext
+from passlib.hash import argon2
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from typing import Optional
+import hashlib
+import math
 import os
+import secrets
+import time
 
-# Use pbkdf2_sha256 instead of bcrypt to avoid 72-byte limit issues
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+from .cache import TTLCache
+
+# Password hashing: scheme, cost profile and optional calibration target.
+# pbkdf2_sha256 stays the default (no bcrypt 72-byte limit); argon2 needs
+# the optional argon2-cffi package.
+PASSWORD_HASH_SCHEME = os.getenv("PASSWORD_HASH_SCHEME", "pbkdf2_sha256")
+PASSWORD_HASH_PROFILE = os.getenv("PASSWORD_HASH_PROFILE", "interactive")
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", "0"))
+PASSWORD_HASH_TARGET_MS = float(os.getenv("PASSWORD_HASH_TARGET_MS", "0"))
+
+# "rounds" is iterations for pbkdf2, log2(N) for scrypt and time_cost for argon2
+HASH_PROFILES = {
+    "interactive": {
+        "pbkdf2_sha256": {"rounds": 29000},
+        "scrypt": {"rounds": 14},
+        "argon2": {"rounds": 2, "memory_cost": 19456},
+    },
+    "moderate": {
+        "pbkdf2_sha256": {"rounds": 210000},
+        "scrypt": {"rounds": 16},
+        "argon2": {"rounds": 3, "memory_cost": 65536},
+    },
+    "sensitive": {
+        "pbkdf2_sha256": {"rounds": 600000},
+        "scrypt": {"rounds": 17},
+        "argon2": {"rounds": 4, "memory_cost": 262144},
+    },
+}
+LOG_ROUNDS_SCHEMES = {"scrypt"}
+# calibrated rounds differ a little between hosts and runs: hashes down to
+# this fraction below them are accepted, so workers don't rehash each
+# other's hashes back and forth
+CALIBRATION_TOLERANCE = 0.25
+
+
+def build_password_context(scheme: str = PASSWORD_HASH_SCHEME, profile: str = PASSWORD_HASH_PROFILE,
+                           rounds: int = 0, min_rounds: int = 0) -> CryptContext:
+    """Return a context hashing with ``scheme`` at the cost of ``profile``.
+
+    Hashes from the other schemes, or below ``min_rounds`` (the configured
+    rounds by default), still verify but are reported by ``needs_update``
+    so logins can upgrade them.
+    """
+    if profile not in HASH_PROFILES:
+        raise ValueError(f"Unknown password hash profile: {profile}")
+    if scheme not in HASH_PROFILES[profile]:
+        raise ValueError(f"Unsupported password hash scheme: {scheme}")
+    if scheme == "argon2" and not argon2.has_backend():
+        raise RuntimeError("PASSWORD_HASH_SCHEME=argon2 requires the argon2-cffi package")
+    settings = dict(HASH_PROFILES[profile][scheme])
+    if rounds:
+        settings["rounds"] = rounds
+    default_rounds = settings.pop("rounds")
+    options = {
+        f"{scheme}__default_rounds": default_rounds,
+        f"{scheme}__min_rounds": min(min_rounds, default_rounds) if min_rounds else default_rounds,
+    }
+    options.update({f"{scheme}__{key}": value for key, value in settings.items()})
+    others = [name for name in HASH_PROFILES[profile] if name != scheme and (name != "argon2" or argon2.has_backend())]
+    return CryptContext(schemes=[scheme, *others], default=scheme, deprecated="auto", **options)
+
+
+def calibrate_rounds(scheme: str = PASSWORD_HASH_SCHEME, profile: str = PASSWORD_HASH_PROFILE,
+                     target_ms: float = PASSWORD_HASH_TARGET_MS, samples: int = 3) -> int:
+    """Return the rounds making one hash take about ``target_ms`` on this machine.
+
+    Never goes below the ``interactive`` profile, however slow the host.
+    """
+    rounds = HASH_PROFILES[profile][scheme]["rounds"]
+    context = build_password_context(scheme, profile)
+    elapsed = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        context.hash("calibration")
+        elapsed.append(time.perf_counter() - start)
+    factor = target_ms / 1000 / min(elapsed)
+    if scheme in LOG_ROUNDS_SCHEMES:
+        calibrated = rounds + math.floor(math.log2(factor))
+    else:
+        calibrated = round(rounds * factor)
+    return max(calibrated, HASH_PROFILES["interactive"][scheme]["rounds"])
+
+
+def calibration_floor(scheme: str, profile: str, rounds: int) -> int:
+    """The lowest rounds still accepted when ``rounds`` came from :func:`calibrate_rounds`."""
+    if scheme in LOG_ROUNDS_SCHEMES:
+        floor = rounds + math.floor(math.log2(1 - CALIBRATION_TOLERANCE))
+    else:
+        floor = math.ceil(rounds * (1 - CALIBRATION_TOLERANCE))
+    return max(floor, HASH_PROFILES["interactive"][scheme]["rounds"])
+
+
+def configure_password_hashing(scheme: str = PASSWORD_HASH_SCHEME, profile: str = PASSWORD_HASH_PROFILE,
+                               rounds: int = PASSWORD_HASH_ROUNDS, target_ms: float = 0) -> CryptContext:
+    """Install the context used by :func:`hash_password` and the hashing executor.
+
+    With ``target_ms`` (and no explicit ``rounds``) each process calibrates
+    on its own, so hashes within ``CALIBRATION_TOLERANCE`` of its rounds
+    are left alone. Pinning ``PASSWORD_HASH_ROUNDS`` to the output of
+    ``python -m app.cli security calibrate`` gives every worker the same
+    rounds instead.
+    """
+    global pwd_context, pwd_context_config
+    min_rounds = 0
+    if target_ms and not rounds:
+        rounds = calibrate_rounds(scheme, profile, target_ms)
+        min_rounds = calibration_floor(scheme, profile, rounds)
+    pwd_context = build_password_context(scheme, profile, rounds, min_rounds)
+    # shipped to the hashing workers, which build their own context from it
+    pwd_context_config = pwd_context.to_string()
+    return pwd_context
+
+
+pwd_context = pwd_context_config = None
+configure_password_hashing()
 
 # JWT configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+# single-use tickets for /events only need to outlive opening the stream
+STREAM_TICKET_TTL = float(os.getenv("STREAM_TICKET_TTL", "30"))
+
+# Claims of already-verified tokens, keyed by token digest and evicted at "exp"
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE)
+
+# Whether a refresh session (an access token's "sid") is still active. A
+# logout reaches other workers' access tokens after at most this TTL.
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "30"))
+session_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=SESSION_CACHE_TTL)
 
 
 def hash_password(password: str) -> str:
@@ -21,6 +151,11 @@ def verify_password(password: str, hashed: str) -> bool:
     return pwd_context.verify(password, hashed)
 
 
+def password_needs_update(hashed: str) -> bool:
+    """Whether ``hashed`` uses a deprecated scheme or less than the configured cost."""
+    return pwd_context.needs_update(hashed)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT token with optional expiration."""
     to_encode = data.copy()
@@ -31,3 +166,33 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
+
+
+def decode_access_token(token: str) -> dict:
+    """Verify a JWT and return its claims, raising ``JWTError`` if invalid.
+
+    Successful verifications are cached until the token's ``exp`` so a
+    session resending the same token skips the HMAC check and JSON parse.
+    The returned dict is shared with the cache and must not be modified.
+    """
+    key = hashlib.sha256(token.encode()).digest()
+    claims = token_cache.get(key)
+    if claims is not None:
+        return claims
+    claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    exp = claims.get("exp")
+    if isinstance(exp, (int, float)):
+        remaining = exp - time.time()
+        if remaining > 0:
+            token_cache.set(key, claims, ttl=remaining)
+    return claims
+
+
+def generate_refresh_token() -> str:
+    """Return a new opaque refresh token (256 bits of randomness)."""
+    return secrets.token_urlsafe(32)
+
+
+def hash_refresh_token(token: str) -> str:
+    # refresh tokens are random, not user-chosen, so a fast digest is enough
+    return hashlib.sha256(token.encode()).hexdigest()
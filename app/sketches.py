@@ -0,0 +1,369 @@
+# app/sketches.py
+"""Mergeable quantile and distinct-count sketches of calculation values.
+
+Each sketch covers the ``a``, ``b`` and ``result`` values of one owner and
+operation type, with two parts per field:
+
+- a DDSketch: counts per logarithmic bin, so any quantile is within
+  ``RELATIVE_ACCURACY`` (1%) of a true value. Bins are exact counts, so
+  values can be removed again, and sketches merge by adding bins;
+- a HyperLogLog with 2**``HLL_PRECISION`` registers (about 2.3% standard
+  error on distinct counts). Registers only grow, so updates and deletes
+  leave the old values counted: distinct counts cover every value ever
+  written.
+
+Sketches are stored once per UTC day, per month and for all time
+(``grain``). Bins are narrow rows in ``calculation_sketch_bins``, bumped
+with the same atomic upsert as the rollup; registers are fixed-size bytes
+in ``calculation_sketch_registers``, raised in place by an SQL expression
+that takes the bytewise max. A write is two statements whatever the size
+of the stored sketches, and nothing is read back or locked in Python.
+
+All-time reads scan one bucket per type, and windowed reads at most a
+month of days plus one bucket per later month, so neither depends on the
+number of calculations.
+"""
+import functools
+import hashlib
+import math
+import struct
+from datetime import date, timezone
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+from sqlalchemy import LargeBinary, and_, bindparam, cast, delete, func, or_, select, tuple_
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from . import upsert
+from .models import ANONYMOUS_OWNER, Calculation, CalculationArchive, CalculationSketchBin, CalculationSketchRegisters
+from .partitions import add_months, month_start
+
+FIELDS = ("a", "b", "result")
+QUANTILES = (0.5, 0.95, 0.99)
+RELATIVE_ACCURACY = 0.01
+# magnitudes below this are counted as zero; the float range then bounds
+# the bins to about 36k per sign
+MIN_VALUE = 1e-9
+HLL_PRECISION = 11
+ALL_TIME_PERIOD = date(1970, 1, 1)
+
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+_REGISTERS = 1 << HLL_PRECISION
+_INVERSE_POWERS = [2.0 ** -r for r in range(65)]
+_BIN_KEY = ["owner_id", "type", "grain", "period", "field", "sign", "bin"]
+
+
+def bin_of(value: float) -> tuple[int, int]:
+    """The ``(sign, bin)`` a finite value is counted in."""
+    if abs(value) < MIN_VALUE:
+        return 0, 0
+    return (1 if value > 0 else -1), math.ceil(math.log(abs(value)) / _LOG_GAMMA)
+
+
+def _bin_value(index: int) -> float:
+    # the point with the same relative distance to both bin edges
+    return 2 * _GAMMA ** index / (_GAMMA + 1)
+
+
+def register_of(value: float) -> tuple[int, int]:
+    """The HyperLogLog ``(register, rank)`` of a finite value."""
+    # stable across processes, unlike hash(); -0.0 and 0.0 are one value
+    h = int.from_bytes(hashlib.blake2b(struct.pack("<d", value + 0.0), digest_size=8).digest(), "big")
+    rest = h & ((1 << (64 - HLL_PRECISION)) - 1)
+    return h >> (64 - HLL_PRECISION), (64 - HLL_PRECISION) - rest.bit_length() + 1
+
+
+def _register_max(left: bytes, right: bytes) -> bytearray:
+    if np is not None:
+        return bytearray(np.maximum(np.frombuffer(left, np.uint8), np.frombuffer(right, np.uint8)).tobytes())
+    return bytearray(map(max, left, right))
+
+
+def _inverse_power_sum(registers: bytes) -> float:
+    if np is not None:
+        return float(np.ldexp(1.0, -np.frombuffer(registers, np.uint8).astype(np.int32)).sum())
+    return sum(map(_INVERSE_POWERS.__getitem__, registers))
+
+
+class FieldSketch:
+    """In-memory DDSketch bins and HyperLogLog registers for one numeric field."""
+
+    def __init__(self):
+        self.bins: dict[tuple[int, int], int] = {}
+        self.registers = bytearray(_REGISTERS)
+
+    @property
+    def count(self) -> int:
+        return sum(self.bins.values())
+
+    def add(self, value: float | None):
+        if value is None or not math.isfinite(value):
+            return
+        key = bin_of(value)
+        self.bins[key] = self.bins.get(key, 0) + 1
+        register, rank = register_of(value)
+        self.registers[register] = max(self.registers[register], rank)
+
+    def remove(self, value: float | None):
+        """Take ``value`` back out of the quantile bins (distinct counts keep it)."""
+        if value is None or not math.isfinite(value):
+            return
+        key = bin_of(value)
+        if self.bins.get(key, 0) > 0:
+            self.bins[key] -= 1
+
+    def merge(self, other: "FieldSketch"):
+        for key, n in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + n
+        self.merge_registers(other.registers)
+
+    def merge_registers(self, registers: bytes):
+        if any(registers):
+            self.registers = _register_max(self.registers, registers) if any(self.registers) else bytearray(registers)
+
+    def quantile(self, q: float) -> float | None:
+        count = self.count
+        if count <= 0:
+            return None
+        rank = q * (count - 1)
+        seen = 0
+        # ascending: large negative magnitudes first, then zero, then positives
+        for sign, index in sorted(self.bins, key=lambda key: (key[0], key[1] * key[0])):
+            seen += self.bins[(sign, index)]
+            if seen > rank:
+                return sign * _bin_value(index) if sign else 0.0
+        return None
+
+    def distinct(self) -> int:
+        zeros = self.registers.count(0)
+        if zeros == _REGISTERS:
+            return 0
+        alpha = 0.7213 / (1 + 1.079 / _REGISTERS)
+        estimate = alpha * _REGISTERS ** 2 / _inverse_power_sum(self.registers)
+        if estimate <= 2.5 * _REGISTERS and zeros:
+            estimate = _REGISTERS * math.log(_REGISTERS / zeros)  # linear counting for small sets
+        return round(estimate)
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            **{f"p{q * 100:g}": self.quantile(q) for q in QUANTILES},
+            "distinct": self.distinct(),
+        }
+
+
+def _day(calc) -> date:
+    """The UTC day of ``calc.created_at`` (SQLite hands back naive UTC values)."""
+    created_at = calc.created_at
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc)
+    return created_at.date()
+
+
+def _periods(day: date) -> list[tuple[str, date]]:
+    return [("day", day), ("month", month_start(day)), ("all", ALL_TIME_PERIOD)]
+
+
+def _raise_register(dialect: str, column, field: str):
+    """``column`` with register ``:<field>_register`` raised to at least ``:<field>_rank``, as an SQL expression."""
+    register, rank = bindparam(f"{field}_register"), bindparam(f"{field}_rank")
+    if dialect == "postgresql":
+        return func.set_byte(column, register, func.greatest(func.get_byte(column, register), rank))
+    # SQLite: splice max(old byte, new byte) between the untouched slices;
+    # max() compares one-byte blobs bytewise
+    return cast(
+        func.substr(column, 1, register)
+        .concat(func.max(func.substr(column, register + 1, 1), rank))
+        .concat(func.substr(column, register + 2)),
+        LargeBinary,
+    )
+
+
+@functools.cache
+def _register_upsert(dialect: str):
+    """The register upsert for ``dialect``, built once: it is the same statement for every write."""
+    model = CalculationSketchRegisters
+    insert = sqlite_insert if dialect == "sqlite" else postgresql_insert
+    # new rows start from zeroed registers built in SQL, so no blob is sent
+    empty = func.zeroblob(_REGISTERS) if dialect == "sqlite" else func.decode(func.repeat("00", _REGISTERS), "hex")
+    stmt = insert(model).values(
+        owner_id=bindparam("owner_id"), type=bindparam("type"), grain=bindparam("grain"), period=bindparam("period"),
+        **{field: _raise_register(dialect, empty, field) for field in FIELDS},
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[model.owner_id, model.type, model.grain, model.period],
+        set_={field: _raise_register(dialect, getattr(model, field), field) for field in FIELDS},
+    )
+
+
+def _merge_registers(db: Session, updates: dict[tuple, dict[str, dict[int, int]]]):
+    """Raise the registers in ``updates`` (``{(owner, type, grain, period): {field: {register: rank}}}``).
+
+    One statement, run with executemany: each parameter set raises one
+    register per field, padded with rank 0 (a no-op) where a field has
+    fewer updates.
+    """
+    model = CalculationSketchRegisters
+    dialect = db.get_bind().dialect.name
+    rows = []
+    for (owner, op_type, grain, period), fields in updates.items():
+        items = {field: sorted(fields.get(field, {}).items()) for field in FIELDS}
+        for i in range(max(map(len, items.values()))):
+            row = {"owner_id": owner, "type": op_type, "grain": grain, "period": period}
+            for field in FIELDS:
+                register, rank = items[field][i] if i < len(items[field]) else (0, 0)
+                row[f"{field}_register"] = register
+                row[f"{field}_rank"] = bytes([rank]) if dialect == "sqlite" else rank
+            rows.append(row)
+    if not rows:
+        return
+    if dialect not in ("sqlite", "postgresql"):
+        for key, fields in updates.items():
+            row = db.get(model, key, with_for_update=True)
+            if row is None:
+                row = model(**dict(zip(("owner_id", "type", "grain", "period"), key)),
+                            **{field: bytes(_REGISTERS) for field in FIELDS})
+                db.add(row)
+            for field, ranks in fields.items():
+                registers = bytearray(getattr(row, field))
+                for register, rank in ranks.items():
+                    registers[register] = max(registers[register], rank)
+                setattr(row, field, bytes(registers))
+        db.flush()
+        return
+    db.connection().execute(_register_upsert(dialect), rows)
+
+
+def record(db: Session, owner: int, op_type: str, calcs, sign: int = 1):
+    """Add (or with ``sign=-1`` remove) ``calcs`` to the daily, monthly and all-time sketches of ``(owner, op_type)``.
+
+    Runs in the caller's transaction as two executemany upserts, one for
+    the bins and one for the registers. Removal only takes values out of
+    the bins.
+    """
+    calcs = list(calcs)
+    if any(calc.created_at is None for calc in calcs):
+        db.flush()  # new rows get their ``created_at`` default
+    by_day = {}
+    for calc in calcs:
+        by_day.setdefault(_day(calc), []).append(calc)
+    bins, registers = {}, {}
+    for day, day_calcs in by_day.items():
+        for calc in day_calcs:
+            for field in FIELDS:
+                value = getattr(calc, field)
+                if value is None or not math.isfinite(value):
+                    continue
+                bin_key = bin_of(value)
+                register, rank = register_of(value)
+                for grain, period in _periods(day):
+                    key = (owner, op_type, grain, period, field, *bin_key)
+                    bins[key] = bins.get(key, 0) + sign
+                    if sign > 0:
+                        ranks = registers.setdefault((owner, op_type, grain, period), {}).setdefault(field, {})
+                        ranks[register] = max(ranks.get(register, 0), rank)
+    _merge_registers(db, registers)
+    upsert.increment(
+        db, CalculationSketchBin, _BIN_KEY, [{**dict(zip(_BIN_KEY, key)), "count": n} for key, n in bins.items()]
+    )
+
+
+def _window(model, since: date | None):
+    if since is None:
+        return model.grain == "all"
+    if since.day == 1:
+        return and_(model.grain == "month", model.period >= since)
+    # days up to the end of the first month, then whole months
+    next_month = add_months(month_start(since), 1)
+    return or_(
+        and_(model.grain == "day", model.period >= since, model.period < next_month),
+        and_(model.grain == "month", model.period >= next_month),
+    )
+
+
+def summarize(db: Session, owner: int, since: date | None = None) -> dict[str, dict]:
+    """Quantiles and distinct counts per field for ``owner``, all time or from the UTC day ``since`` on."""
+    sketches = {field: FieldSketch() for field in FIELDS}
+    bins = db.execute(
+        select(CalculationSketchBin.field, CalculationSketchBin.sign, CalculationSketchBin.bin,
+               func.sum(CalculationSketchBin.count))
+        .where(CalculationSketchBin.owner_id == owner, _window(CalculationSketchBin, since))
+        .group_by(CalculationSketchBin.field, CalculationSketchBin.sign, CalculationSketchBin.bin)
+    )
+    for field, sign, index, n in bins:
+        if n > 0:
+            sketches[field].bins[(sign, index)] = int(n)
+    registers = db.execute(
+        select(*(getattr(CalculationSketchRegisters, field) for field in FIELDS))
+        .where(CalculationSketchRegisters.owner_id == owner, _window(CalculationSketchRegisters, since))
+    )
+    for row in registers:
+        for field, value in zip(FIELDS, row):
+            sketches[field].merge_registers(value)
+    return {field: sketch.summary() for field, sketch in sketches.items()}
+
+
+def _delete_keys(db: Session, model, keys: list[tuple]):
+    columns = tuple_(model.owner_id, model.type, model.grain, model.period)
+    for start in range(0, len(keys), 500):
+        db.execute(delete(model).where(columns.in_(keys[start:start + 500])))
+
+
+def rebuild(db: Session):
+    """Recompute the sketches from the raw rows, keeping those of months that retention archived.
+
+    Day and month buckets of archived months are kept and folded back into
+    the all-time buckets, so those keep counting archived calculations
+    like the rollup. Rows are streamed in (owner, type, time) order; the
+    caller commits.
+    """
+    archived = set(db.execute(
+        select(CalculationArchive.owner_id, CalculationArchive.type, CalculationArchive.period)
+    ).all())
+    for model in (CalculationSketchBin, CalculationSketchRegisters):
+        keys = db.execute(select(model.owner_id, model.type, model.grain, model.period).distinct()).all()
+        _delete_keys(db, model, [
+            tuple(key) for key in keys
+            if key.grain == "all" or (key.owner_id, key.type, month_start(key.period)) not in archived
+        ])
+
+    rows = db.execute(
+        select(Calculation.user_id, Calculation.type, Calculation.a, Calculation.b, Calculation.result,
+               Calculation.created_at)
+        .order_by(Calculation.user_id, Calculation.type, Calculation.created_at)
+        .execution_options(yield_per=1000)
+    )
+    current, batch = None, []
+    for row in rows:
+        key = (ANONYMOUS_OWNER if row.user_id is None else row.user_id, row.type)
+        if key != current or len(batch) >= 1000:
+            if batch:
+                record(db, *current, batch)
+            current, batch = key, []
+        batch.append(row)
+    if batch:
+        record(db, *current, batch)
+
+    # fold the kept months into the all-time buckets
+    for owner, op_type, month in sorted(archived):
+        bins = db.execute(
+            select(CalculationSketchBin.field, CalculationSketchBin.sign, CalculationSketchBin.bin,
+                   CalculationSketchBin.count)
+            .where(CalculationSketchBin.owner_id == owner, CalculationSketchBin.type == op_type,
+                   CalculationSketchBin.grain == "month", CalculationSketchBin.period == month)
+        ).all()
+        upsert.increment(db, CalculationSketchBin, _BIN_KEY, [
+            {"owner_id": owner, "type": op_type, "grain": "all", "period": ALL_TIME_PERIOD,
+             "field": field, "sign": sign, "bin": index, "count": n}
+            for field, sign, index, n in bins
+        ])
+        registers = db.get(CalculationSketchRegisters, (owner, op_type, "month", month))
+        if registers is not None:
+            _merge_registers(db, {(owner, op_type, "all", ALL_TIME_PERIOD): {
+                field: {i: rank for i, rank in enumerate(getattr(registers, field)) if rank} for field in FIELDS
+            }})
@@ -0,0 +1,27 @@
+// Session helpers shared by the signed-in pages.
+// On a 401, authFetch trades the refresh token for a new access token and retries once.
+let refreshing = null;
+async function refreshSession(){
+  const refreshToken = localStorage.getItem('refresh_token');
+  if(!refreshToken) return null;
+  const res = await fetch('/users/refresh',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({refresh_token:refreshToken})});
+  if(!res.ok){ localStorage.removeItem('refresh_token'); return null; }
+  const data = await res.json();
+  localStorage.setItem('token', data.access_token);
+  localStorage.setItem('refresh_token', data.refresh_token);
+  return data.access_token;
+}
+async function authFetch(url, opts={}){
+  const withToken = (t)=>({...opts, headers:{...(opts.headers||{}), 'Authorization':'Bearer '+t}});
+  const res = await fetch(url, withToken(localStorage.getItem('token')));
+  if(res.status!==401) return res;
+  // refresh tokens rotate, so concurrent 401s share a single refresh
+  refreshing = refreshing || refreshSession().finally(()=>{ refreshing=null; });
+  const token = await refreshing;
+  return token ? fetch(url, withToken(token)) : res;
+}
+function logout(){
+  const refreshToken = localStorage.getItem('refresh_token');
+  if(refreshToken) fetch('/users/logout',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({refresh_token:refreshToken}),keepalive:true});
+  localStorage.removeItem('token'); localStorage.removeItem('refresh_token'); localStorage.removeItem('user');
+}
@@ -0,0 +1,348 @@
+# app/timeseries.py
+"""Bucketed result metrics for ``/reports/timeseries``.
+
+Buckets are computed in SQL with date truncation (``date_trunc`` on
+PostgreSQL, ``strftime`` on SQLite), in UTC. Count, avg, min and max come
+from one grouped query. PostgreSQL also computes percentiles in SQL with
+``percentile_cont``; SQLite has no ordered-set aggregates, so there the
+results are streamed in bucket order and interpolated the same way in
+Python.
+
+With ``TIMESERIES_HOURLY`` enabled, every calculation write also keeps
+``calculation_hourly`` up to date: inserts are folded in with an upsert,
+and updates and deletes recompute the affected hour from the raw rows
+(min and max can't be decremented). Hour and day series without
+percentiles are then read from that table, so their cost depends on the
+number of hours in the range rather than the number of calculations.
+Run ``python -m app.cli reports rebuild-hourly`` after enabling it on an
+existing database.
+"""
+import os
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, func, literal, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from .models import ANONYMOUS_OWNER, Calculation, CalculationArchive, CalculationHourly
+from .partitions import month_start
+from .response_cache import data_version
+
+TIMESERIES_HOURLY = os.getenv("TIMESERIES_HOURLY", "").lower() in ("1", "true", "yes", "on")
+MAX_POINTS = int(os.getenv("TIMESERIES_MAX_POINTS", "5000"))
+DEFAULT_POINTS = 60
+
+BUCKETS = {"minute": timedelta(minutes=1), "hour": timedelta(hours=1), "day": timedelta(days=1)}
+_SQLITE_FORMATS = {"minute": "%Y-%m-%d %H:%M:00", "hour": "%Y-%m-%d %H:00:00", "day": "%Y-%m-%d 00:00:00"}
+_HOUR = timedelta(hours=1)
+
+
+def _utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def floor_bucket(value: datetime, bucket: str) -> datetime:
+    value = _utc(value)
+    if bucket == "day":
+        return value.replace(hour=0, minute=0, second=0, microsecond=0)
+    if bucket == "hour":
+        return value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(second=0, microsecond=0)
+
+
+def ceil_bucket(value: datetime, bucket: str) -> datetime:
+    floored = floor_bucket(value, bucket)
+    return floored if floored == _utc(value) else floored + BUCKETS[bucket]
+
+
+def _bucket_expr(db: Session, column, bucket: str):
+    if db.get_bind().dialect.name == "postgresql":
+        return func.date_trunc(bucket, func.timezone("UTC", column))
+    return func.strftime(_SQLITE_FORMATS[bucket], column)
+
+
+def _as_bucket(value) -> datetime:
+    # SQLite returns the strftime text, PostgreSQL a naive UTC timestamp
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return _utc(value)
+
+
+def _owner_filter(column, user_id: int | None):
+    return column.is_(None) if user_id is None else column == user_id
+
+
+def percentile_cont(values: list[float], fraction: float) -> float | None:
+    """Linear interpolation between the closest ranks, like SQL ``percentile_cont``."""
+    if not values:
+        return None
+    position = fraction * (len(values) - 1)
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def percentile_label(fraction: float) -> str:
+    return f"p{fraction * 100:g}"
+
+
+def calculation_timeseries(
+    db: Session,
+    bucket: str = "hour",
+    start: datetime | None = None,
+    end: datetime | None = None,
+    types: list[str] | None = None,
+    percentiles: list[float] | None = None,
+    user_id: int | None = None,
+    source: str = "auto",
+) -> dict:
+    """Return ``user_id``'s result metrics per ``bucket`` between ``start`` and ``end``.
+
+    The range is widened to whole buckets. Empty buckets are omitted.
+    ``percentiles`` are fractions (``0.5``, ``0.99``). ``source`` picks the
+    raw table or the hourly pre-aggregate; ``auto`` uses the latter when it
+    is maintained and can answer the query. Raises ``ValueError`` for
+    invalid arguments.
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f"Unknown bucket {bucket!r}")
+    percentiles = sorted(set(percentiles or []))
+    if any(not 0 <= p <= 1 for p in percentiles):
+        raise ValueError("Percentiles must be between 0 and 100")
+    end = ceil_bucket(end or datetime.now(timezone.utc), bucket)
+    start = floor_bucket(start, bucket) if start else end - BUCKETS[bucket] * DEFAULT_POINTS
+    if start >= end:
+        raise ValueError("start must be before end")
+    if (end - start) / BUCKETS[bucket] > MAX_POINTS:
+        raise ValueError(f"Range spans more than {MAX_POINTS} {bucket} buckets")
+
+    hourly_possible = TIMESERIES_HOURLY and bucket != "minute" and not percentiles
+    if source == "hourly" and not hourly_possible:
+        raise ValueError("The hourly pre-aggregate is disabled or can't answer this query")
+    use_hourly = source == "hourly" or (source == "auto" and hourly_possible)
+    if use_hourly:
+        points = _hourly_points(db, bucket, start, end, types, user_id)
+    else:
+        points = _raw_points(db, bucket, start, end, types, user_id, percentiles)
+    return {
+        "bucket": bucket,
+        "start": start,
+        "end": end,
+        "source": "hourly" if use_hourly else "raw",
+        "points": points,
+    }
+
+
+def _raw_filters(user_id, start, end, types):
+    filters = [
+        _owner_filter(Calculation.user_id, user_id),
+        Calculation.created_at >= start,
+        Calculation.created_at < end,
+    ]
+    if types:
+        filters.append(Calculation.type.in_(types))
+    return filters
+
+
+def _raw_points(db, bucket, start, end, types, user_id, percentiles):
+    bucket_col = _bucket_expr(db, Calculation.created_at, bucket).label("bucket")
+    filters = _raw_filters(user_id, start, end, types)
+    postgres = db.get_bind().dialect.name == "postgresql"
+    columns = [
+        bucket_col,
+        func.count(Calculation.id),
+        func.avg(Calculation.result),
+        func.min(Calculation.result),
+        func.max(Calculation.result),
+    ]
+    if postgres:
+        columns += [func.percentile_cont(p).within_group(Calculation.result) for p in percentiles]
+    rows = db.execute(select(*columns).where(*filters).group_by(bucket_col).order_by(bucket_col)).all()
+    points = [
+        {
+            "bucket": _as_bucket(row[0]),
+            "count": row[1],
+            "avg": row[2],
+            "min": row[3],
+            "max": row[4],
+            "percentiles": {percentile_label(p): v for p, v in zip(percentiles, row[5:])},
+        }
+        for row in rows
+    ]
+    if percentiles and not postgres:
+        by_bucket = {point["bucket"]: point for point in points}
+        for bucket_start, values in _sorted_results(db, bucket_col, filters):
+            by_bucket[bucket_start]["percentiles"] = {
+                percentile_label(p): percentile_cont(values, p) for p in percentiles
+            }
+    return points
+
+
+def _sorted_results(db, bucket_col, filters):
+    """Yield ``(bucket, sorted results)`` while streaming the rows once."""
+    stmt = (
+        select(bucket_col, Calculation.result)
+        .where(*filters, Calculation.result.is_not(None))
+        .order_by(bucket_col, Calculation.result)
+        .execution_options(yield_per=1000)
+    )
+    current, values = None, []
+    for bucket_value, result in db.execute(stmt):
+        if bucket_value != current:
+            if values:
+                yield _as_bucket(current), values
+            current, values = bucket_value, []
+        values.append(result)
+    if values:
+        yield _as_bucket(current), values
+
+
+def _hourly_points(db, bucket, start, end, types, user_id):
+    bucket_col = _bucket_expr(db, CalculationHourly.hour, bucket).label("bucket")
+    filters = [
+        CalculationHourly.owner_id == (ANONYMOUS_OWNER if user_id is None else user_id),
+        CalculationHourly.hour >= start,
+        CalculationHourly.hour < end,
+    ]
+    if types:
+        filters.append(CalculationHourly.type.in_(types))
+    rows = db.execute(
+        select(
+            bucket_col,
+            func.sum(CalculationHourly.count),
+            func.sum(CalculationHourly.sum_result),
+            func.sum(CalculationHourly.result_count),
+            func.min(CalculationHourly.min_result),
+            func.max(CalculationHourly.max_result),
+        ).where(*filters).group_by(bucket_col).order_by(bucket_col)
+    ).all()
+    return [
+        {
+            "bucket": _as_bucket(bucket_value),
+            "count": int(count),
+            "avg": sum_result / result_count if result_count else None,
+            "min": min_result,
+            "max": max_result,
+            "percentiles": {},
+        }
+        for bucket_value, count, sum_result, result_count, min_result, max_result in rows
+    ]
+
+
+def hour_of(calc) -> datetime:
+    return floor_bucket(calc.created_at, "hour")
+
+
+def record_inserts(db: Session, owner: int, calcs):
+    """Fold newly inserted calculations into ``calculation_hourly`` (same transaction)."""
+    groups = {}
+    for calc in calcs:
+        group = groups.setdefault(
+            (calc.type, hour_of(calc)),
+            {"count": 0, "sum_result": 0.0, "result_count": 0, "min_result": None, "max_result": None},
+        )
+        group["count"] += 1
+        if calc.result is not None:
+            group["sum_result"] += calc.result
+            group["result_count"] += 1
+            group["min_result"] = calc.result if group["min_result"] is None else min(group["min_result"], calc.result)
+            group["max_result"] = calc.result if group["max_result"] is None else max(group["max_result"], calc.result)
+    dialect = db.get_bind().dialect.name
+    for (op_type, hour), values in groups.items():
+        if dialect not in ("sqlite", "postgresql"):
+            recompute_hour(db, owner, op_type, hour)
+            continue
+        dialect_insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        least, greatest = (func.least, func.greatest) if dialect == "postgresql" else (func.min, func.max)
+        stmt = dialect_insert(CalculationHourly).values(owner_id=owner, type=op_type, hour=hour, **values)
+        new = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[CalculationHourly.owner_id, CalculationHourly.type, CalculationHourly.hour],
+            set_={
+                "count": CalculationHourly.count + new.count,
+                "sum_result": CalculationHourly.sum_result + new.sum_result,
+                "result_count": CalculationHourly.result_count + new.result_count,
+                # NULL means "no result yet" on either side
+                "min_result": least(
+                    func.coalesce(CalculationHourly.min_result, new.min_result),
+                    func.coalesce(new.min_result, CalculationHourly.min_result),
+                ),
+                "max_result": greatest(
+                    func.coalesce(CalculationHourly.max_result, new.max_result),
+                    func.coalesce(new.max_result, CalculationHourly.max_result),
+                ),
+            },
+        )
+        db.execute(stmt)
+
+
+def recompute_hour(db: Session, owner: int, op_type: str, hour: datetime):
+    """Recompute one ``calculation_hourly`` row from the raw table (pending changes must be flushed)."""
+    user_id = None if owner == ANONYMOUS_OWNER else owner
+    count, sum_result, result_count, min_result, max_result = db.execute(
+        select(
+            func.count(Calculation.id),
+            func.coalesce(func.sum(Calculation.result), literal(0.0)),
+            func.count(Calculation.result),
+            func.min(Calculation.result),
+            func.max(Calculation.result),
+        ).where(*_raw_filters(user_id, hour, hour + _HOUR, [op_type]))
+    ).one()
+    db.execute(delete(CalculationHourly).where(
+        CalculationHourly.owner_id == owner, CalculationHourly.type == op_type, CalculationHourly.hour == hour
+    ))
+    if count:
+        db.add(CalculationHourly(
+            owner_id=owner, type=op_type, hour=hour, count=count, sum_result=float(sum_result),
+            result_count=result_count, min_result=min_result, max_result=max_result,
+        ))
+
+
+def rebuild_hourly(db: Session) -> int:
+    """Recompute ``calculation_hourly`` from the raw table; returns the number of rows rebuilt.
+
+    Hours in months that retention archived keep their stored rows: their
+    raw calculations are gone, so only the pre-aggregate still has them.
+    """
+    archived = set(db.execute(
+        select(CalculationArchive.owner_id, CalculationArchive.type, CalculationArchive.period)
+    ).all())
+
+    def kept(owner_id, op_type, hour_value) -> bool:
+        return (owner_id, op_type, month_start(_as_bucket(hour_value).date())) in archived
+
+    hour = _bucket_expr(db, Calculation.created_at, "hour").label("hour")
+    owner = func.coalesce(Calculation.user_id, ANONYMOUS_OWNER).label("owner")
+    rows = [
+        row for row in db.execute(
+            select(
+                owner,
+                Calculation.type,
+                hour,
+                func.count(Calculation.id),
+                func.coalesce(func.sum(Calculation.result), literal(0.0)),
+                func.count(Calculation.result),
+                func.min(Calculation.result),
+                func.max(Calculation.result),
+            ).group_by(owner, Calculation.type, hour)
+        )
+        if not kept(*row[:3])
+    ]
+    stale = [
+        tuple(key) for key in db.execute(select(CalculationHourly.owner_id, CalculationHourly.type, CalculationHourly.hour))
+        if not kept(*key)
+    ]
+    for start in range(0, len(stale), 500):
+        db.execute(delete(CalculationHourly).where(
+            tuple_(CalculationHourly.owner_id, CalculationHourly.type, CalculationHourly.hour).in_(stale[start:start + 500])
+        ))
+    db.add_all(
+        CalculationHourly(
+            owner_id=owner_id, type=op_type, hour=_as_bucket(hour_value), count=count, sum_result=float(sum_result),
+            result_count=result_count, min_result=min_result, max_result=max_result,
+        )
+        for owner_id, op_type, hour_value, count, sum_result, result_count, min_result, max_result in rows
+    )
+    data_version.bump(db)
+    db.commit()
+    return len(rows)
@@ -0,0 +1,39 @@
+# app/upsert.py
+"""Atomic counter upserts shared by the rollup tables."""
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+
+def dialect_insert(db: Session):
+    """The dialect's ``insert`` with ``on_conflict_*`` support, or ``None``."""
+    return {"sqlite": sqlite.insert, "postgresql": postgresql.insert}.get(db.get_bind().dialect.name)
+
+
+def increment(db: Session, model, key_columns: list[str], rows: list[dict]):
+    """Add each row's non-key values to the ``model`` row with the same key, creating missing rows.
+
+    All rows go through one ``INSERT ... ON CONFLICT DO UPDATE`` on SQLite
+    and PostgreSQL, run with executemany so the compiled statement is
+    cached, and concurrent writers never lose increments. Every row must
+    carry the same columns.
+    """
+    if not rows:
+        return
+    deltas = [k for k in rows[0] if k not in key_columns]
+    insert = dialect_insert(db)
+    if insert is not None:
+        stmt = insert(model)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[getattr(model, k) for k in key_columns],
+            set_={k: getattr(model, k) + stmt.excluded[k] for k in deltas},
+        )
+        db.execute(stmt, rows)
+        return
+    for values in rows:
+        row = db.get(model, tuple(values[k] for k in key_columns), with_for_update=True)
+        if row is None:
+            db.add(model(**values))
+            db.flush()
+        else:
+            for k in deltas:
+                setattr(row, k, getattr(row, k) + values[k])
@@ -0,0 +1,109 @@
+# app/user_cache.py
+"""Short-lived cache of authenticated users keyed by user id.
+
+``get_current_user`` consults it before querying ``users``; cached rows
+are re-attached to the request session with ``Session.merge(load=False)``
+so handlers can keep modifying and committing them without a SELECT.
+``crud.update_user`` and ``crud.change_user_password`` invalidate entries.
+
+The default backend is process-local. Multi-worker deployments can set
+``USER_CACHE_BACKEND=redis`` (with ``REDIS_URL``) so invalidations are
+seen by every worker.
+"""
+import json
+import os
+from datetime import datetime
+
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from . import models
+from .cache import TTLCache
+
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_BACKEND = os.getenv("USER_CACHE_BACKEND", "local")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# never the password hash: snapshots may live in Redis, and only the
+# password check needs it (``crud.get_password_hash``)
+_FIELDS = ("id", "username", "email", "created_at")
+
+
+class LocalUserCacheBackend:
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL, clock=None):
+        kwargs = {"clock": clock} if clock else {}
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl, **kwargs)
+
+    def get(self, uid: int) -> dict | None:
+        return self._cache.get(uid)
+
+    def set(self, uid: int, snapshot: dict):
+        self._cache.set(uid, snapshot)
+
+    def delete(self, uid: int):
+        self._cache.delete(uid)
+
+    def clear(self):
+        self._cache.clear()
+
+
+class RedisUserCacheBackend:
+    """Shared backend on any client exposing Redis ``get``/``set(ex=)``/``delete``."""
+
+    def __init__(self, client, ttl: float = USER_CACHE_TTL, prefix: str = "user-cache:"):
+        self._client = client
+        self._ttl = max(int(ttl), 1)
+        self._prefix = prefix
+
+    def get(self, uid: int) -> dict | None:
+        raw = self._client.get(f"{self._prefix}{uid}")
+        if raw is None:
+            return None
+        snapshot = json.loads(raw)
+        snapshot["created_at"] = datetime.fromisoformat(snapshot["created_at"])
+        return snapshot
+
+    def set(self, uid: int, snapshot: dict):
+        payload = dict(snapshot, created_at=snapshot["created_at"].isoformat())
+        self._client.set(f"{self._prefix}{uid}", json.dumps(payload), ex=self._ttl)
+
+    def delete(self, uid: int):
+        self._client.delete(f"{self._prefix}{uid}")
+
+    def clear(self):
+        # entries expire on their own; nothing process-local to drop
+        pass
+
+
+class UserCache:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def get(self, db: Session, uid: int) -> models.User | None:
+        """Return the cached user attached to ``db``, or ``None`` on a miss."""
+        snapshot = self.backend.get(uid)
+        if snapshot is None:
+            return None
+        user = models.User(**snapshot)
+        make_transient_to_detached(user)
+        return db.merge(user, load=False)
+
+    def put(self, user: models.User):
+        self.backend.set(user.id, {field: getattr(user, field) for field in _FIELDS})
+
+    def invalidate(self, uid: int):
+        self.backend.delete(uid)
+
+    def clear(self):
+        self.backend.clear()
+
+
+def _default_backend():
+    if USER_CACHE_BACKEND == "redis":
+        import redis  # optional dependency, only needed for the shared backend
+
+        return RedisUserCacheBackend(redis.Redis.from_url(REDIS_URL))
+    return LocalUserCacheBackend()
+
+
+user_cache = UserCache(_default_backend())
@@ -0,0 +1,68 @@
+"""Compare per-row POST /calculations with POST /calculations/batch.
+
+Usage::
+
+    python benchmarks/bench_batch_insert.py [--rows 2000] [--database-url URL]
+
+Runs against a throwaway SQLite file unless ``--database-url`` points at
+another (empty, disposable) database.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.testclient import TestClient
+
+from app.database import Base
+from app.main import app, get_db
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--database-url")
+    args = parser.parse_args()
+
+    url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    engine = create_engine(url)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def override_get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    client = TestClient(app)
+    ops = ["Add", "Sub", "Multiply", "Divide", "Power"]
+    payload = [{"a": i % 97 + 1, "b": i % 7 + 1, "type": ops[i % len(ops)]} for i in range(args.rows)]
+
+    start = time.perf_counter()
+    for item in payload:
+        client.post("/calculations", json=item)
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    response = client.post("/calculations/batch", json=payload)
+    batch = time.perf_counter() - start
+    assert len(response.json()["created"]) == args.rows
+
+    print(f"{args.rows} rows on {engine.dialect.name}")
+    print(f"  per-row POST: {single:8.3f}s  {args.rows / single:10.0f} rows/s")
+    print(f"  batch POST:   {batch:8.3f}s  {args.rows / batch:10.0f} rows/s")
+    print(f"  speedup:      {single / batch:8.1f}x")
+    Base.metadata.drop_all(bind=engine)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Measure requests/sec of the calculation routes under many concurrent clients.
+
+Upgrade the schema (``python -m app.cli db upgrade``), start the server in
+the mode to measure, then run the benchmark::
+
+    uvicorn app.main:app --port 8000                     # threadpool (sync sessions)
+    DATABASE_ASYNC=1 uvicorn app.main:app --port 8000    # event loop (AsyncSession)
+
+    python benchmarks/bench_load.py --url http://127.0.0.1:8000 --clients 250 --seconds 15
+
+Each client loops over GET /calculations/stats, GET /reports/history and
+POST /calculations until the time is up.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+
+
+async def client_loop(client: httpx.AsyncClient, deadline: float, counts: dict):
+    while time.perf_counter() < deadline:
+        choice = random.random()
+        try:
+            if choice < 0.4:
+                response = await client.get("/calculations/stats")
+            elif choice < 0.8:
+                response = await client.get("/reports/history", params={"limit": 20, "total": "cached"})
+            else:
+                response = await client.post(
+                    "/calculations", json={"a": random.random(), "b": random.random() + 1, "type": "Divide"}
+                )
+            counts["ok" if response.status_code < 400 else "error"] += 1
+        except httpx.HTTPError:
+            counts["error"] += 1
+
+
+async def run(url: str, clients: int, seconds: float):
+    counts = {"ok": 0, "error": 0}
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        deadline = time.perf_counter() + seconds
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client, deadline, counts) for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+    print(f"{clients} clients, {elapsed:.1f}s: {counts['ok'] / elapsed:.0f} req/s ok, {counts['error']} errors")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--clients", type=int, default=250)
+    parser.add_argument("--seconds", type=float, default=15)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.clients, args.seconds))
+
+
+if __name__ == "__main__":
+    main()
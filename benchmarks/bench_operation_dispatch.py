@@ -0,0 +1,47 @@
+"""Measure per-call overhead of operation dispatch.
+
+Usage::
+
+    python benchmarks/bench_operation_dispatch.py [--calls 1000000]
+
+Compares the registry lookup used by ``perform_calculation`` with the
+previous implementation, which rebuilt the type mapping and instantiated
+a new operation object on every call.
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import calculations
+from app.calculations import Add, Sub, Multiply, Divide, Power
+
+
+def legacy_perform_calculation(op_type, a, b):
+    mapping = {
+        "Add": Add,
+        "Sub": Sub,
+        "Multiply": Multiply,
+        "Divide": Divide,
+        "Power": Power,
+    }
+    cls = mapping.get(op_type)
+    if cls is None:
+        raise ValueError(f"Unknown operation type: {op_type}")
+    return cls().compute(a, b)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    for label, fn in [("legacy", legacy_perform_calculation), ("registry", calculations.perform_calculation)]:
+        seconds = min(timeit.repeat(lambda: fn("Multiply", 3.0, 4.0), number=args.calls, repeat=3))
+        print(f"{label:>9}: {seconds / args.calls * 1e9:7.1f} ns/call")
+
+
+if __name__ == "__main__":
+    main()
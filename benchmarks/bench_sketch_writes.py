@@ -0,0 +1,79 @@
+"""Measure POST /calculations latency as the stored sketches grow.
+
+Usage::
+
+    python benchmarks/bench_sketch_writes.py [--rows 5000] [--samples 200] [--database-url URL]
+
+Times single-row POSTs on an empty table, then again after ``--rows``
+values spread over thousands of sketch bins and every HyperLogLog
+register. The two medians should be about the same. Runs against a
+throwaway SQLite file unless ``--database-url`` points at another (empty,
+disposable) database.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.testclient import TestClient
+
+from app.database import Base
+from app.main import app, get_db
+
+
+def median_post_ms(client, samples: int) -> float:
+    timings = []
+    for i in range(samples):
+        start = time.perf_counter()
+        client.post("/calculations", json={"a": i + 0.5, "b": 2, "type": "Add"})
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--database-url")
+    args = parser.parse_args()
+
+    url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    engine = create_engine(url)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def override_get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    client = TestClient(app)
+
+    empty = median_post_ms(client, args.samples)
+    rng = random.Random(1)
+    for start in range(0, args.rows, 1000):
+        client.post("/calculations/batch", json=[
+            {"a": rng.lognormvariate(0, 8), "b": rng.uniform(-1e6, 1e6), "type": "Add"}
+            for _ in range(min(1000, args.rows - start))
+        ])
+    full = median_post_ms(client, args.samples)
+
+    print(f"median POST /calculations on {engine.dialect.name}")
+    print(f"  empty sketches:          {empty:8.2f} ms")
+    print(f"  after {args.rows:>6} rows:       {full:8.2f} ms")
+    Base.metadata.drop_all(bind=engine)
+
+
+if __name__ == "__main__":
+    main()
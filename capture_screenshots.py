@@ -14,6 +14,7 @@ screenshots_dir.mkdir(exist_ok=True)
 # Start server
 env = os.environ.copy()
 env["DATABASE_URL"] = "sqlite:///./test_e2e.db"
+env["DB_AUTO_MIGRATE"] = "1"
 
 print("Starting server...")
 process = subprocess.Popen(
@@ -0,0 +1,52 @@
+"""Alembic environment wired to ``app.models``.
+
+Uses the connection handed over by ``app.migrate.upgrade_database`` when
+there is one, and otherwise the app's ``DATABASE_URL``. Offline (``--sql``)
+mode is not supported: revisions inspect the live schema.
+"""
+from logging.config import fileConfig
+
+from alembic import context
+
+from app import models  # noqa: F401  registers every table on Base.metadata
+from app.database import DATABASE_URL, Base, create_app_engine
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+target_metadata = Base.metadata
+
+
+def _configure(**kw):
+    context.configure(
+        target_metadata=target_metadata,
+        # one transaction per revision, so an autocommit block
+        # (CREATE INDEX CONCURRENTLY) only ever commits finished revisions
+        transaction_per_migration=True,
+        # SQLite can only alter tables by copying them
+        render_as_batch=True,
+        compare_type=True,
+        **kw,
+    )
+
+
+def run_migrations_online():
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        _configure(connection=connection)
+        with context.begin_transaction():
+            context.run_migrations()
+        return
+    engine = create_app_engine(DATABASE_URL)
+    try:
+        with engine.connect() as connection:
+            _configure(connection=connection)
+            with context.begin_transaction():
+                context.run_migrations()
+    finally:
+        engine.dispose()
+
+
+if context.is_offline_mode():
+    raise SystemExit("offline migrations are not supported; run against a live database")
+run_migrations_online()
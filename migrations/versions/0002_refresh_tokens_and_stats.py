@@ -0,0 +1,64 @@
+"""Refresh tokens and the per-type calculation stats rollup
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+
+Either table may already exist in databases adopted from ``create_all``.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.migrate import has_table
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not has_table(op, "refresh_tokens"):
+        op.create_table(
+            "refresh_tokens",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("token_hash", sa.String(length=64), nullable=False),
+            sa.Column("family_id", sa.String(length=32), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+            sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+            sa.Column("revoked_at", sa.DateTime(timezone=True), nullable=True),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint("token_hash"),
+        )
+        op.create_index("ix_refresh_tokens_user_id", "refresh_tokens", ["user_id"])
+        op.create_index("ix_refresh_tokens_family_id", "refresh_tokens", ["family_id"])
+
+    if not has_table(op, "calculation_stats"):
+        op.create_table(
+            "calculation_stats",
+            sa.Column("type", sa.String(length=20), nullable=False),
+            sa.Column("count", sa.Integer(), nullable=False),
+            sa.Column("sum_a", sa.Float(), nullable=False),
+            sa.Column("sum_b", sa.Float(), nullable=False),
+            sa.Column("sum_result", sa.Float(), nullable=False),
+            sa.Column("result_count", sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint("type"),
+        )
+        # seed from existing calculations
+        op.execute(
+            "INSERT INTO calculation_stats (type, count, sum_a, sum_b, sum_result, result_count) "
+            "SELECT type, COUNT(id), COALESCE(SUM(a), 0), COALESCE(SUM(b), 0), COALESCE(SUM(result), 0), "
+            "COUNT(result) FROM calculations GROUP BY type"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("calculation_stats")
+    op.drop_table("refresh_tokens")
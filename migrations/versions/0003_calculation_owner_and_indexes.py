@@ -0,0 +1,83 @@
+"""Calculation owners and the indexes behind history and per-user queries
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+
+The indexes are built online (``CREATE INDEX CONCURRENTLY`` on
+PostgreSQL), each in its own autocommit block, and the owner foreign key
+is added ``NOT VALID`` and validated separately, so writers keep going
+while existing rows are indexed and checked. The stats rollup is re-keyed
+by (owner, type) and rebuilt from the raw table in the same transaction.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.migrate import create_foreign_key_online, create_index_online, drop_index_online, has_column
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ("ix_calculations_created_at_id", ["created_at", "id"]),
+    ("ix_calculations_user_created_at_id", ["user_id", "created_at", "id"]),
+    ("ix_calculations_user_type", ["user_id", "type"]),
+]
+AGGREGATES = "COUNT(id), COALESCE(SUM(a), 0), COALESCE(SUM(b), 0), COALESCE(SUM(result), 0), COUNT(result)"
+
+
+def _create_stats(*key_columns):
+    op.create_table(
+        "calculation_stats",
+        *key_columns,
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.Column("sum_a", sa.Float(), nullable=False),
+        sa.Column("sum_b", sa.Float(), nullable=False),
+        sa.Column("sum_result", sa.Float(), nullable=False),
+        sa.Column("result_count", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint(*(column.name for column in key_columns)),
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not has_column(op, "calculations", "user_id"):
+        # nullable with no default: a catalog-only change on PostgreSQL
+        with op.batch_alter_table("calculations") as batch:
+            batch.add_column(sa.Column("user_id", sa.Integer(), nullable=True))
+    create_foreign_key_online(
+        op, "fk_calculations_user_id_users", "calculations", "users", ["user_id"], ["id"], ondelete="CASCADE"
+    )
+
+    if not has_column(op, "calculation_stats", "owner_id"):
+        op.drop_table("calculation_stats")
+        _create_stats(sa.Column("owner_id", sa.Integer(), nullable=False), sa.Column("type", sa.String(20), nullable=False))
+        op.execute(
+            "INSERT INTO calculation_stats (owner_id, type, count, sum_a, sum_b, sum_result, result_count) "
+            f"SELECT COALESCE(user_id, 0), type, {AGGREGATES} FROM calculations GROUP BY COALESCE(user_id, 0), type"
+        )
+
+    # commits the work above; each index is then built outside a transaction
+    for name, columns in INDEXES:
+        create_index_online(op, name, "calculations", columns)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, _ in reversed(INDEXES):
+        drop_index_online(op, name, "calculations")
+    op.drop_table("calculation_stats")
+    _create_stats(sa.Column("type", sa.String(20), nullable=False))
+    op.execute(
+        "INSERT INTO calculation_stats (type, count, sum_a, sum_b, sum_result, result_count) "
+        f"SELECT type, {AGGREGATES} FROM calculations GROUP BY type"
+    )
+    with op.batch_alter_table("calculations") as batch:
+        batch.drop_constraint("fk_calculations_user_id_users", type_="foreignkey")
+        batch.drop_column("user_id")
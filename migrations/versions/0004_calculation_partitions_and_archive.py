@@ -0,0 +1,120 @@
+"""Monthly partitions for calculations (PostgreSQL) and the retention archive
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+
+On PostgreSQL the existing table becomes the ``calculations_legacy``
+partition of a new range-partitioned ``calculations``, without copying
+or rescanning it:
+
+1. online: the unique (id, created_at) index the partitioned primary key
+   needs, and a CHECK constraint matching the legacy partition's bound,
+   added NOT VALID and then validated without blocking writes;
+2. one short transaction: rename the table and its indexes, create the
+   partitioned table with the same columns, indexes and foreign key,
+   attach the old table (the validated CHECK skips the scan and its
+   indexes are adopted), then add the monthly partitions.
+
+There is no default partition, so that retention can detach expired
+months concurrently; ``ensure_partitions`` keeps months ahead instead.
+
+The legacy partition ends at the start of next month, so rows written
+while the migration runs still fit in it. Other databases only get the
+archive table.
+"""
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.partitions import PARTITIONS_AHEAD, add_months, month_start, partition_ddl
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, Sequence[str], None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ("ix_calculations_id", "id"),
+    ("ix_calculations_type", "type"),
+    ("ix_calculations_created_at_id", "created_at, id"),
+    ("ix_calculations_user_created_at_id", "user_id, created_at, id"),
+    ("ix_calculations_user_type", "user_id, type"),
+]
+COLUMNS = """
+    id INTEGER NOT NULL DEFAULT nextval('calculations_id_seq'),
+    user_id INTEGER REFERENCES users (id) ON DELETE CASCADE,
+    a FLOAT NOT NULL,
+    b FLOAT NOT NULL,
+    type VARCHAR(20) NOT NULL,
+    result FLOAT,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+"""
+
+
+def _partitioned() -> bool:
+    return op.get_bind().execute(
+        sa.text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('calculations')")
+    ).first() is not None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "calculation_archive",
+        sa.Column("owner_id", sa.Integer(), nullable=False),
+        sa.Column("type", sa.String(length=20), nullable=False),
+        sa.Column("period", sa.Date(), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.Column("sum_a", sa.Float(), nullable=False),
+        sa.Column("sum_b", sa.Float(), nullable=False),
+        sa.Column("sum_result", sa.Float(), nullable=False),
+        sa.Column("result_count", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("owner_id", "type", "period"),
+    )
+    if op.get_bind().dialect.name != "postgresql" or _partitioned():
+        return
+
+    first_month = add_months(month_start(datetime.now(timezone.utc).date()), 1)
+    bound = f"{first_month.isoformat()} 00:00:00+00"
+    with op.get_context().autocommit_block():
+        op.execute("CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS calculations_id_created_at ON calculations (id, created_at)")
+        op.execute(
+            f"ALTER TABLE calculations ADD CONSTRAINT calculations_legacy_bound CHECK (created_at < '{bound}') NOT VALID"
+        )
+        op.execute("ALTER TABLE calculations VALIDATE CONSTRAINT calculations_legacy_bound")
+
+    op.execute("ALTER TABLE calculations RENAME TO calculations_legacy")
+    op.execute("ALTER INDEX calculations_pkey RENAME TO calculations_legacy_pkey")
+    op.execute("ALTER INDEX calculations_id_created_at RENAME TO calculations_legacy_id_created_at")
+    for name, _ in INDEXES:
+        op.execute(f"ALTER INDEX IF EXISTS {name} RENAME TO {name.replace('calculations', 'calculations_legacy', 1)}")
+    op.execute("ALTER SEQUENCE calculations_id_seq OWNED BY NONE")
+    op.execute(f"CREATE TABLE calculations ({COLUMNS}, PRIMARY KEY (id, created_at)) PARTITION BY RANGE (created_at)")
+    op.execute("ALTER SEQUENCE calculations_id_seq OWNED BY calculations.id")
+    for name, columns in INDEXES:
+        op.execute(f"CREATE INDEX {name} ON calculations ({columns})")
+    # matching indexes and the foreign key of the old table are attached, not rebuilt
+    op.execute(f"ALTER TABLE calculations ATTACH PARTITION calculations_legacy FOR VALUES FROM (MINVALUE) TO ('{bound}')")
+    for n in range(PARTITIONS_AHEAD + 1):
+        op.execute(partition_ddl(add_months(first_month, n)))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == "postgresql" and _partitioned():
+        op.execute("CREATE TABLE calculations_unpartitioned (LIKE calculations INCLUDING DEFAULTS)")
+        op.execute("INSERT INTO calculations_unpartitioned SELECT * FROM calculations")
+        op.execute("ALTER SEQUENCE calculations_id_seq OWNED BY NONE")
+        op.execute("DROP TABLE calculations")
+        op.execute("ALTER TABLE calculations_unpartitioned RENAME TO calculations")
+        op.execute("ALTER TABLE calculations ADD PRIMARY KEY (id)")
+        op.execute("ALTER TABLE calculations ADD FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE")
+        op.execute("ALTER SEQUENCE calculations_id_seq OWNED BY calculations.id")
+        for name, columns in INDEXES:
+            op.execute(f"CREATE INDEX {name} ON calculations ({columns})")
+    op.drop_table("calculation_archive")
@@ -0,0 +1,42 @@
+"""Hourly result aggregates for /reports/timeseries
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+
+The table starts empty; it is only maintained while ``TIMESERIES_HOURLY``
+is enabled. Fill it with ``python -m app.cli reports rebuild-hourly``
+when turning that on.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, Sequence[str], None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "calculation_hourly",
+        sa.Column("owner_id", sa.Integer(), nullable=False),
+        sa.Column("type", sa.String(length=20), nullable=False),
+        sa.Column("hour", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.Column("sum_result", sa.Float(), nullable=False),
+        sa.Column("result_count", sa.Integer(), nullable=False),
+        sa.Column("min_result", sa.Float(), nullable=True),
+        sa.Column("max_result", sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint("owner_id", "type", "hour"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("calculation_hourly")
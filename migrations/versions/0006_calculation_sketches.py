@@ -0,0 +1,56 @@
+"""Quantile and distinct-count sketches for calculation stats
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+
+Adds ``calculation_sketch_bins`` (one counter row per owner, type, bucket,
+field and bin) and ``calculation_sketch_registers`` (fixed-size HyperLogLog
+registers per owner, type and bucket). Both start empty and only cover
+writes made after the upgrade; ``python -m app.cli stats rebuild`` fills
+them from the existing calculations.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, Sequence[str], None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "calculation_sketch_bins",
+        sa.Column("owner_id", sa.Integer(), nullable=False),
+        sa.Column("type", sa.String(length=20), nullable=False),
+        sa.Column("grain", sa.String(length=5), nullable=False),
+        sa.Column("period", sa.Date(), nullable=False),
+        sa.Column("field", sa.String(length=6), nullable=False),
+        sa.Column("sign", sa.SmallInteger(), nullable=False),
+        sa.Column("bin", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("owner_id", "type", "grain", "period", "field", "sign", "bin"),
+    )
+    op.create_table(
+        "calculation_sketch_registers",
+        sa.Column("owner_id", sa.Integer(), nullable=False),
+        sa.Column("type", sa.String(length=20), nullable=False),
+        sa.Column("grain", sa.String(length=5), nullable=False),
+        sa.Column("period", sa.Date(), nullable=False),
+        sa.Column("a", sa.LargeBinary(), nullable=False),
+        sa.Column("b", sa.LargeBinary(), nullable=False),
+        sa.Column("result", sa.LargeBinary(), nullable=False),
+        sa.PrimaryKeyConstraint("owner_id", "type", "grain", "period"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("calculation_sketch_registers")
+    op.drop_table("calculation_sketch_bins")
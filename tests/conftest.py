@@ -6,11 +6,15 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 import pytest
 from starlette.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session, sessionmaker
 
+from app import partitions
 from app.database import Base
 from app.main import app, get_db
+from app.user_cache import user_cache
+from app.security import session_cache
+from app.response_cache import data_version, response_cache
 
 import subprocess
 import time
@@ -55,20 +59,42 @@ app.dependency_overrides[get_db] = override_get_db
 @pytest.fixture
 def client():
     """Return a TestClient for API tests."""
-    # Clean up database before each test
+    # Clean up database before each test; ids are reused, so drop cached users too
     Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
+    user_cache.clear()
+    session_cache.clear()
+    response_cache.clear()
+    data_version.invalidate()
     yield TestClient(app)
     # Clean up after test
     Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
 
 
+@pytest.fixture
+def empty_database():
+    """An empty test database for migration tests; the model schema is restored afterwards."""
+    def reset():
+        Base.metadata.drop_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE IF EXISTS alembic_version"))
+            # partitions detached by an interrupted retention run are no longer dropped with calculations
+            for month in partitions.detached_partitions(Session(bind=conn)) if engine.dialect.name == "postgresql" else []:
+                conn.execute(text(f"DROP TABLE {partitions.partition_name(month)}"))
+
+    reset()
+    yield engine
+    reset()
+    Base.metadata.create_all(bind=engine)
+
+
 @pytest.fixture(scope="session")
 def server():
     """Start the FastAPI server for E2E tests for the duration of the test session."""
     env = os.environ.copy()
     env["DATABASE_URL"] = "sqlite:///./test_e2e.db"
+    env["DB_AUTO_MIGRATE"] = "1"
 
     process = subprocess.Popen(
         [
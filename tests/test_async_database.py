@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from app import schemas, async_database as adb
+from app.main import app, get_async_db, get_calc_db, get_calc_user, get_optional_user_async
+from tests import conftest as conf
+
+pytest.importorskip("aiosqlite")
+
+
+def test_to_async_url():
+    assert adb.to_async_url("sqlite:///./app.db") == "sqlite+aiosqlite:///./app.db"
+    assert adb.to_async_url("postgresql://u:p@db:5432/app") == "postgresql+asyncpg://u:p@db:5432/app"
+    assert adb.to_async_url("postgresql+psycopg2://u:p@db/app") == "postgresql+asyncpg://u:p@db/app"
+    with pytest.raises(ValueError):
+        adb.to_async_url("mysql://u:p@db/app")
+
+
+@pytest.fixture
+def async_client(client):
+    """Route calculation endpoints through an AsyncSession on the test database."""
+    if not conf.TEST_DB.startswith("sqlite"):
+        pytest.skip("async route test runs against the SQLite test database")
+    sessions = adb.init_async_engine(conf.TEST_DB)
+
+    async def override():
+        async with sessions() as db:
+            yield db
+
+    # mirror DATABASE_ASYNC=1: queries and authentication both use the AsyncSession
+    overrides = {get_calc_db: override, get_async_db: override, get_calc_user: get_optional_user_async}
+    previous = {dep: app.dependency_overrides.get(dep) for dep in overrides}
+    app.dependency_overrides.update(overrides)
+    yield client
+    for dep, fn in previous.items():
+        if fn is None:
+            app.dependency_overrides.pop(dep, None)
+        else:
+            app.dependency_overrides[dep] = fn
+    asyncio.run(adb.async_engine.dispose())
+
+
+def test_calculation_routes_with_async_session(async_client):
+    created = async_client.post("/calculations", json={"a": 2, "b": 5, "type": "Power"})
+    assert created.status_code == 201
+    calc_id = created.json()["id"]
+    assert created.json()["result"] == 32
+
+    batch = async_client.post("/calculations/batch", json=[{"a": 1, "b": 2, "type": "Add"}, {"a": 1, "b": 0, "type": "Divide"}])
+    assert len(batch.json()["created"]) == 1
+
+    assert async_client.put(f"/calculations/{calc_id}", json={"a": 3, "b": 2, "type": "Power"}).json()["result"] == 9
+    assert async_client.get(f"/calculations/{calc_id}").json()["result"] == 9
+    assert async_client.get("/calculations/stats").json()["total_count"] == 2
+    assert len(async_client.get("/reports/history?limit=1").json()["items"]) == 1
+    assert async_client.get("/dashboard/bootstrap").json()["history"]["total"] == 2
+    assert len(async_client.get("/calculations").json()) == 2
+    assert len(async_client.get("/calculations?format=ndjson").text.splitlines()) == 2
+    assert async_client.delete(f"/calculations/{calc_id}").status_code == 204
+    assert async_client.get(f"/calculations/{calc_id}").status_code == 404
+
+
+def test_async_routes_authenticate_on_async_session(async_client):
+    res = async_client.post("/users/register", json={"username": "async_user", "email": "async@example.com", "password": "secret123"})
+    headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+    assert async_client.post("/calculations", json={"a": 1, "b": 2, "type": "Add"}, headers=headers).status_code == 201
+    async_client.post("/calculations", json={"a": 5, "b": 2, "type": "Add"})
+
+    # the cached user is served on the second request
+    for _ in range(2):
+        assert async_client.get("/calculations/stats", headers=headers).json()["total_count"] == 1
+    assert async_client.get("/calculations/stats").json()["total_count"] == 1
+    assert async_client.get("/calculations", headers={"Authorization": "Bearer nope"}).status_code == 401
+
+
+def test_run_db_with_async_session():
+    sessions = adb.init_async_engine(conf.TEST_DB)
+
+    async def scenario():
+        from app import crud
+        async with sessions() as db:
+            calc = await adb.run_db(db, crud.create_calculation, schemas.CalculationCreate(a=6, b=7, type="Multiply"))
+            fetched = await adb.run_db(db, crud.get_calculation, calc.id)
+            await adb.run_db(db, crud.delete_calculation, fetched)
+            return fetched.result
+
+    try:
+        assert asyncio.run(scenario()) == 42
+    finally:
+        asyncio.run(adb.async_engine.dispose())
@@ -0,0 +1,117 @@
+import asyncio
+
+from sqlalchemy import text
+
+from app import cli, crud
+from app.events import broker
+from tests import conftest as conf
+from tests.test_events import parse
+
+
+def register(client, username):
+    payload = {"username": username, "email": f"{username}@example.com", "password": "secret123"}
+    res = client.post("/users/register", json=payload)
+    assert res.status_code == 201
+    return {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+
+def create(client, headers=None, a=1, op="Add"):
+    res = client.post("/calculations", json={"a": a, "b": 2, "type": op}, headers=headers)
+    assert res.status_code == 201
+    return res.json()["id"]
+
+
+def test_each_caller_sees_only_their_calculations(client):
+    alice, bob = register(client, "alice"), register(client, "bob")
+    alice_id = create(client, alice, a=1)
+    create(client, alice, a=2, op="Multiply")
+    bob_id = create(client, bob, a=10)
+    anonymous_id = create(client)
+
+    assert [c["id"] for c in client.get("/calculations", headers=alice).json()] == [alice_id + 1, alice_id]
+    assert [c["id"] for c in client.get("/calculations", headers=bob).json()] == [bob_id]
+    assert [c["id"] for c in client.get("/calculations").json()] == [anonymous_id]
+
+    stats = client.get("/calculations/stats", headers=alice).json()
+    assert stats["total_count"] == 2
+    assert stats["counts_by_type"]["Multiply"] == 1
+    assert client.get("/reports/summary", headers=bob).json()["total_count"] == 1
+    history = client.get("/reports/history", headers=alice).json()
+    assert history["total"] == 2
+    assert client.get("/reports/history?total=cached", headers=bob).json()["total"] == 1
+    assert client.get("/dashboard/bootstrap", headers=bob).json()["stats"]["total_count"] == 1
+    assert len(client.get("/calculations?format=csv", headers=bob).text.splitlines()) == 2  # header + 1 row
+
+    # other owners' rows are invisible, not forbidden
+    assert client.get(f"/calculations/{bob_id}", headers=alice).status_code == 404
+    assert client.put(f"/calculations/{bob_id}", json={"a": 1, "b": 1, "type": "Add"}, headers=alice).status_code == 404
+    assert client.delete(f"/calculations/{anonymous_id}", headers=alice).status_code == 404
+    assert client.delete(f"/calculations/{bob_id}", headers=bob).status_code == 204
+
+    db = conf.TestingSessionLocal()
+    try:
+        assert crud.verify_calculation_stats(db) == []
+    finally:
+        db.close()
+
+
+def test_invalid_token_is_rejected_rather_than_treated_as_anonymous(client):
+    res = client.get("/calculations", headers={"Authorization": "Bearer not-a-token"})
+    assert res.status_code == 401
+
+
+def test_report_cache_is_scoped_to_the_caller(client):
+    alice = register(client, "alice")
+    create(client, alice)
+    cached = client.get("/calculations/stats", headers=alice)
+    assert cached.json()["total_count"] == 1
+    anonymous = client.get("/calculations/stats", headers={"If-None-Match": cached.headers["etag"]})
+    assert anonymous.status_code == 200
+    assert anonymous.json()["total_count"] == 0
+
+
+def test_per_user_listing_uses_the_owner_index(client):
+    stmt = crud.calculation_rows_statement(limit=10, user_id=1, type="Add")
+    with conf.engine.connect() as conn:
+        compiled = stmt.compile(conn, compile_kwargs={"literal_binds": True})
+        plan = " ".join(row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {compiled}")))
+    assert "ix_calculations_user_created_at_id" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_events_are_delivered_to_the_owner_only(client):
+    alice = register(client, "alice")
+
+    async def scenario():
+        alice_sub, anonymous_sub = broker.subscribe(owner=1), broker.subscribe()
+        try:
+            await asyncio.to_thread(create, client, alice)
+            event = parse(await asyncio.wait_for(alice_sub.queue.get(), 1))
+            await asyncio.sleep(0.05)
+            return event, anonymous_sub.queue.qsize()
+        finally:
+            broker.unsubscribe(alice_sub)
+            broker.unsubscribe(anonymous_sub)
+
+    (kind, data), anonymous_pending = asyncio.run(scenario())
+    assert kind == "created"
+    assert data["calculations"][0]["a"] == 1
+    assert anonymous_pending == 0
+
+
+def test_backfill_assigns_anonymous_rows_in_batches(client, monkeypatch):
+    register(client, "alice")
+    for a in range(5):
+        create(client, a=a)
+    monkeypatch.setattr(cli, "SessionLocal", conf.TestingSessionLocal)
+
+    assert cli.main(["calculations", "backfill", "--user", "alice", "--batch-size", "2"]) == 0
+    db = conf.TestingSessionLocal()
+    try:
+        assert crud.get_calculation_stats(db, 1)["total_count"] == 5
+        assert crud.get_calculation_stats(db)["total_count"] == 0
+        assert crud.verify_calculation_stats(db) == []
+    finally:
+        db.close()
+    assert cli.main(["calculations", "backfill", "--user", "nobody"]) == 1
+
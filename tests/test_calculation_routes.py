@@ -183,7 +183,7 @@ def test_add_calculation_with_runtime_error(client, monkeypatch):
     
     original_create = crud_module.create_calculation
     
-    def mock_create_calculation_error(db, calc_in):
+    def mock_create_calculation_error(db, calc_in, user_id=None):
         raise ValueError("Test error during calculation")
     
     monkeypatch.setattr(crud_module, "create_calculation", mock_create_calculation_error)
@@ -214,3 +214,77 @@ def test_edit_calculation_with_runtime_error(client, monkeypatch):
     response = client.put(f"/calculations/{calc_id}", json=edit_payload)
     assert response.status_code == 400
     assert "Test error during edit calculation" in response.json()["detail"]
+
+
+def test_browse_calculations_pagination_and_filters(client):
+    """GET /calculations pages with X-Next-Cursor and applies filters."""
+    for a in range(1, 6):
+        client.post("/calculations", json={"a": a, "b": 2, "type": "Multiply"})
+    client.post("/calculations", json={"a": 1, "b": 1, "type": "Add"})
+
+    first = client.get("/calculations?limit=2&type=Multiply")
+    assert first.status_code == 200
+    assert [c["a"] for c in first.json()] == [5, 4]
+    cursor = first.headers["X-Next-Cursor"]
+    second = client.get(f"/calculations?limit=2&type=Multiply&cursor={cursor}")
+    assert [c["a"] for c in second.json()] == [3, 2]
+
+    ranged = client.get("/calculations?min_result=4&max_result=8").json()
+    assert sorted(c["result"] for c in ranged) == [4, 6, 8]
+
+    future = client.get("/calculations?created_after=2999-01-01T00:00:00").json()
+    assert future == []
+
+
+def test_browse_calculations_streaming_exports(client):
+    """NDJSON and CSV exports stream every matching row."""
+    import csv
+    import io
+    import json
+
+    for a in range(3):
+        client.post("/calculations", json={"a": a, "b": 1, "type": "Add"})
+
+    ndjson = client.get("/calculations?format=ndjson")
+    assert ndjson.status_code == 200
+    assert ndjson.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in ndjson.text.splitlines()]
+    assert [r["a"] for r in rows] == [2, 1, 0]
+    assert set(rows[0]) == {"id", "a", "b", "type", "result", "created_at"}
+
+    exported = client.get("/calculations?format=csv&limit=2")
+    assert exported.headers["content-type"].startswith("text/csv")
+    table = list(csv.reader(io.StringIO(exported.text)))
+    assert table[0] == ["id", "a", "b", "type", "result", "created_at"]
+    assert len(table) == 3
+
+
+def test_add_calculations_batch(client):
+    """POST /calculations/batch inserts valid items and reports per-item errors."""
+    payload = [
+        {"a": 1, "b": 2, "type": "Add"},
+        {"a": 1, "b": 0, "type": "Divide"},
+        {"a": 2, "b": 10, "type": "Power"},
+        {"a": 1, "b": 2, "type": "Modulo"},
+        {"a": 6, "b": 3, "type": "Divide"},
+    ]
+    response = client.post("/calculations/batch", json=payload)
+    assert response.status_code == 201
+    data = response.json()
+    assert [c["result"] for c in data["created"]] == [3, 1024, 2]
+    assert all("id" in c and "created_at" in c for c in data["created"])
+    assert [e["index"] for e in data["errors"]] == [1, 3]
+    assert data["errors"][0]["detail"] == "Division by zero"
+    assert "type" in data["errors"][1]["detail"]
+
+    stats = client.get("/calculations/stats").json()
+    assert stats["total_count"] == 3
+    assert stats["counts_by_type"]["Divide"] == 1
+
+
+def test_add_calculations_batch_too_large(client, monkeypatch):
+    import app.main as main_module
+
+    monkeypatch.setattr(main_module, "MAX_BATCH_SIZE", 2)
+    response = client.post("/calculations/batch", json=[{"a": 1, "b": 1, "type": "Add"}] * 3)
+    assert response.status_code == 400
@@ -14,3 +14,81 @@ def test_calculation_stats_endpoint(client):
     assert counts.get('Add', 0) >= 1
     assert counts.get('Multiply', 0) >= 1
     assert counts.get('Divide', 0) >= 1
+
+
+def test_calculation_stats_single_grouped_query(client):
+    """Stats come from the rollup rows plus the two sketch reads and include every registered type."""
+    from sqlalchemy import event
+    from tests import conftest as conf
+
+    client.post('/calculations', json={"a": 2, "b": 3, "type": "Add"})
+    client.post('/calculations', json={"a": 4, "b": 5, "type": "Add"})
+    client.post('/calculations', json={"a": 2, "b": 3, "type": "Power"})
+
+    statements = []
+
+    def count_statements(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(conf.engine, "before_cursor_execute", count_statements)
+    try:
+        resp = client.get('/calculations/stats')
+    finally:
+        event.remove(conf.engine, "before_cursor_execute", count_statements)
+
+    assert resp.status_code == 200
+    # the shared data version (stale after the writes), the rollup rows,
+    # then the all-time sketch bins and registers
+    assert len(statements) == 4
+    assert "data_version" in statements[0]
+    assert "calculation_sketch_bins" in statements[2] and "calculation_sketch_registers" in statements[3]
+    data = resp.json()
+    assert data['total_count'] == 3
+    assert data['avg_a'] == 8 / 3
+    assert data['avg_result'] == (5 + 9 + 8) / 3
+    assert data['counts_by_type'] == {"Add": 2, "Sub": 0, "Multiply": 0, "Divide": 0, "Power": 1}
+
+
+def test_stats_rollup_follows_edit_and_delete(client):
+    """The rollup is updated by create, edit and delete and never drifts."""
+    from app import crud
+    from tests import conftest as conf
+
+    first = client.post('/calculations', json={"a": 1, "b": 2, "type": "Add"}).json()
+    second = client.post('/calculations', json={"a": 6, "b": 3, "type": "Divide"}).json()
+    client.put(f"/calculations/{first['id']}", json={"a": 3, "b": 4, "type": "Multiply"})
+    client.delete(f"/calculations/{second['id']}")
+
+    data = client.get('/calculations/stats').json()
+    assert data['total_count'] == 1
+    assert data['counts_by_type']['Add'] == 0
+    assert data['counts_by_type']['Multiply'] == 1
+    assert data['counts_by_type']['Divide'] == 0
+    assert data['avg_result'] == 12
+
+    db = conf.TestingSessionLocal()
+    try:
+        assert crud.verify_calculation_stats(db) == []
+    finally:
+        db.close()
+
+
+def test_stats_verify_and_rebuild_commands(client, monkeypatch, capsys):
+    """`stats verify` reports drift and `stats rebuild` repairs it."""
+    from app import cli, models
+    from tests import conftest as conf
+
+    client.post('/calculations', json={"a": 1, "b": 2, "type": "Add"})
+    db = conf.TestingSessionLocal()
+    try:
+        db.query(models.CalculationStat).delete()
+        db.commit()
+    finally:
+        db.close()
+
+    monkeypatch.setattr(cli, "SessionLocal", conf.TestingSessionLocal)
+    assert cli.main(["stats", "verify"]) == 1
+    assert "drift for Add" in capsys.readouterr().out
+    assert cli.main(["stats", "rebuild"]) == 0
+    assert cli.main(["stats", "verify"]) == 0
+    assert client.get('/calculations/stats').json()['counts_by_type']['Add'] == 1
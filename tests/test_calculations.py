@@ -1,3 +1,4 @@
+import math
 import pytest
 from pydantic import ValidationError
 
@@ -35,3 +36,95 @@ def test_calc_create_validation_divide_by_zero():
 def test_calc_create_invalid_type():
     with pytest.raises(ValidationError):
         CalculationCreate(a=1, b=2, type="Pow")
+
+
+EDGE_VALUES = [0.0, -0.0, 1.0, -1.0, 2.5, -8.0, 1e308, -1e200, 1024.0, 1 / 3, float("inf"), float("-inf"), float("nan")]
+
+
+def _scalar(op_type, a, b):
+    try:
+        return calculations.perform_calculation(op_type, a, b), None
+    except (ArithmeticError, ValueError) as e:
+        return None, e
+
+
+@pytest.mark.parametrize("backend", ["numpy", "fallback"])
+def test_perform_calculations_matches_scalar_path(backend, monkeypatch):
+    if backend == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(calculations, "np", None)
+
+    types, a, b = [], [], []
+    for op_type in calculations.operation_types():
+        for x in EDGE_VALUES:
+            for y in EDGE_VALUES:
+                types.append(op_type)
+                a.append(x)
+                b.append(y)
+
+    results, errors = calculations.perform_calculations(types, a, b)
+    for i, (op_type, x, y) in enumerate(zip(types, a, b)):
+        expected, expected_error = _scalar(op_type, x, y)
+        if expected_error is not None:
+            assert type(errors.get(i)) is type(expected_error), (op_type, x, y)
+            assert str(errors[i]) == str(expected_error)
+            assert results[i] is None
+        else:
+            assert i not in errors, (op_type, x, y, errors.get(i))
+            if math.isnan(expected):
+                assert math.isnan(results[i])
+            elif op_type == "Power" and math.isfinite(expected):
+                # NumPy's pow may differ from libm's in the last bit
+                assert abs(results[i] - expected) <= 2 * math.ulp(expected), (op_type, x, y)
+            else:
+                assert results[i] == expected, (op_type, x, y)
+
+
+def test_perform_calculations_reports_unknown_type_per_element():
+    results, errors = calculations.perform_calculations(["Add", "Modulo"], [1, 1], [2, 2])
+    assert results == [3, None]
+    assert list(errors) == [1]
+    assert isinstance(errors[1], ValueError)
+
+
+def test_power_rejects_non_real_results():
+    with pytest.raises(ValueError):
+        calculations.perform_calculation("Power", -8, 0.5)
+    with pytest.raises(OverflowError):
+        calculations.perform_calculation("Power", 10.0, 400.0)
+    with pytest.raises(ZeroDivisionError):
+        calculations.perform_calculation("Power", 0.0, -1.0)
+
+
+def test_get_operation_returns_shared_instance():
+    assert calculations.get_operation("Add") is calculations.get_operation("Add")
+
+
+@pytest.fixture
+def modulo_operation():
+    class Modulo:
+        def compute(self, a, b):
+            if b == 0:
+                raise ZeroDivisionError("Division by zero")
+            return a % b
+
+    calculations.registry.register("Modulo", Modulo)
+    yield
+    calculations.registry.unregister("Modulo")
+
+
+def test_registered_plugin_operation_is_used_everywhere(modulo_operation, client):
+    """A registered operation is accepted, dispatched and counted in stats."""
+    assert calculations.perform_calculation("Modulo", 7, 3) == 1
+    assert CalculationCreate(a=7, b=3, type="Modulo").type == "Modulo"
+
+    response = client.post("/calculations", json={"a": 7, "b": 3, "type": "Modulo"})
+    assert response.status_code == 201
+    assert response.json()["result"] == 1
+    assert client.get("/calculations/stats").json()["counts_by_type"]["Modulo"] == 1
+
+
+def test_registry_rejects_duplicate_names():
+    with pytest.raises(ValueError):
+        calculations.registry.register("Add", calculations.Add)
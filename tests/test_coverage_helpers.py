@@ -21,9 +21,11 @@ def test_on_startup_and_get_db_generator():
 def test_read_root_function():
     # cover the simple root handler
     # Root endpoint now returns register.html file
-    response = main.read_root()
-    # Check that it's a FileResponse
+    from starlette.requests import Request
+    response = main.read_root(Request({"type": "http", "method": "GET", "path": "/", "headers": []}))
+    # Check that the prebuilt register.html response is returned
     assert response is not None
+    assert response.status_code == 200
 
 
 def test_calculationcreate_divide_by_zero_validator():
@@ -0,0 +1,81 @@
+from sqlalchemy import event
+
+from tests import conftest as conf
+
+
+def create(client, n):
+    for i in range(n):
+        assert client.post("/calculations", json={"a": i, "b": 2, "type": "Add"}).status_code == 201
+
+
+def test_bootstrap_on_empty_database(client):
+    res = client.get("/dashboard/bootstrap")
+    assert res.status_code == 200
+    data = res.json()
+    assert data["stats"]["total_count"] == 0
+    assert data["history"] == {"total": 0, "items": [], "next_cursor": None}
+    assert data["calculations"] == []
+    assert data["next_cursor"] is None
+
+
+def test_bootstrap_matches_the_individual_endpoints(client):
+    create(client, 7)
+    data = client.get("/dashboard/bootstrap").json()
+
+    assert data["stats"] == client.get("/calculations/stats").json()
+    assert data["calculations"] == client.get("/calculations").json()
+    history = client.get("/reports/history?limit=5").json()
+    assert data["history"]["items"] == history["items"]
+    assert data["history"]["total"] == 7
+    assert data["history"]["next_cursor"] == history["next_cursor"]
+    assert data["next_cursor"] is None
+
+
+def test_bootstrap_pages_calculations(client):
+    create(client, 7)
+    data = client.get("/dashboard/bootstrap?limit=6").json()
+    assert len(data["calculations"]) == 6
+    rest = client.get(f"/calculations?cursor={data['next_cursor']}").json()
+    assert [c["id"] for c in rest] == [1]
+
+
+def test_bootstrap_runs_four_queries(client):
+    create(client, 3)
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(conf.engine, "before_cursor_execute", record)
+    try:
+        assert client.get("/dashboard/bootstrap").status_code == 200
+    finally:
+        event.remove(conf.engine, "before_cursor_execute", record)
+    selects = [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+    # stats (rollup rows, sketch bins, sketch registers) and the first page
+    assert len(selects) == 4
+
+
+def test_bootstrap_reads_from_a_snapshot_after_auth_used_the_session(client, monkeypatch):
+    from sqlalchemy import text
+
+    from app import crud
+    from tests.test_calculation_ownership import register
+
+    alice = register(client, "alice")
+    create(client, 2)
+    seen = []
+    get_stats = crud.get_calculation_stats
+
+    def spy(db, *args, **kwargs):
+        if db.get_bind().dialect.name == "postgresql":
+            seen.append(db.execute(text("SHOW transaction_isolation")).scalar())
+        else:
+            # pysqlite only reports a transaction that BEGIN actually opened
+            seen.append(db.connection().connection.driver_connection.in_transaction)
+        return get_stats(db, *args, **kwargs)
+
+    monkeypatch.setattr(crud, "get_calculation_stats", spy)
+    # an authenticated request: get_optional_user reads through the same session first
+    assert client.get("/dashboard/bootstrap", headers=alice).status_code == 200
+    assert seen == ["repeatable read" if conf.engine.dialect.name == "postgresql" else True]
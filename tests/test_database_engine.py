@@ -0,0 +1,59 @@
+import pytest
+from sqlalchemy import text
+
+from app import database, metrics
+
+
+def test_engine_options_for_sqlite_file():
+    options = database.engine_options("sqlite:///./some.db")
+    assert options["poolclass"] is database.InstrumentedQueuePool
+    assert options["pool_size"] == database.POOL_SIZE
+    assert options["pool_pre_ping"] is True
+    assert options["connect_args"] == {"check_same_thread": False}
+
+
+def test_engine_options_for_sqlite_memory_skip_pool_sizing():
+    options = database.engine_options("sqlite://")
+    assert "pool_size" not in options
+
+
+def test_engine_options_for_postgres(monkeypatch):
+    monkeypatch.setattr(database, "STATEMENT_TIMEOUT_MS", 2500)
+    sync_options = database.engine_options("postgresql://u:p@db/app")
+    assert sync_options["connect_args"] == {"options": "-c statement_timeout=2500"}
+
+    async_options = database.engine_options("postgresql+asyncpg://u:p@db/app", is_async=True)
+    assert async_options["poolclass"] is database.InstrumentedAsyncQueuePool
+    assert async_options["connect_args"]["server_settings"] == {"statement_timeout": "2500"}
+    assert async_options["connect_args"]["prepared_statement_cache_size"] == database.PREPARED_STATEMENT_CACHE_SIZE
+
+
+def test_sqlite_pragmas_and_pool_metrics(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "_pools", dict(database._pools))
+    engine = database.create_app_engine(f"sqlite:///{tmp_path}/tuned.db")
+    try:
+        before = database.POOL_CHECKOUT_SECONDS.count(engine="sync")
+        with engine.connect() as conn:
+            assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+            assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+            assert conn.execute(text("PRAGMA mmap_size")).scalar() == database.SQLITE_MMAP_SIZE
+            assert database._pool_stats()[(("engine", "sync"), ("stat", "checked_out"))] == 1
+        assert database.POOL_CHECKOUT_SECONDS.count(engine="sync") == before + 1
+    finally:
+        engine.dispose()
+
+
+def test_metrics_endpoint(client):
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "# TYPE db_pool_checkout_seconds histogram" in response.text
+    assert 'db_pool{engine="sync",stat="saturation"}' in response.text
+    assert "# TYPE calculation_result_cache_total counter" in response.text
+    assert 'calculation_result_cache_total{event="hits"}' in response.text
+    assert 'calculation_result_cache{stat="maxsize"}' in response.text
+    assert "# TYPE response_cache_total counter" in response.text
+
+
+def test_metric_requires_samples():
+    with pytest.raises(TypeError):
+        metrics.Metric("incomplete_metric", "no samples()")
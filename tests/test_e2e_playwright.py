@@ -15,6 +15,7 @@ def server():
     # Start the server in background
     env = os.environ.copy()
     env["DATABASE_URL"] = "sqlite:///./test_e2e.db"
+    env["DB_AUTO_MIGRATE"] = "1"
     
     process = subprocess.Popen(
         [
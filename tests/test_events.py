@@ -0,0 +1,115 @@
+import asyncio
+import json
+
+from app import events, models
+from app.events import EventBroker, RESYNC, broker
+
+
+def parse(message: bytes):
+    event, data = message.decode().strip().split("\n")
+    return event.removeprefix("event: "), json.loads(data.removeprefix("data: "))
+
+
+def test_publish_from_another_thread_reaches_every_subscriber():
+    async def scenario():
+        local = EventBroker()
+        subscribers = [local.subscribe() for _ in range(5000)]
+        await asyncio.to_thread(local.publish, "created", {"ids": [1]})
+        messages = [await asyncio.wait_for(sub.queue.get(), 1) for sub in subscribers]
+        return messages, local
+
+    messages, local = asyncio.run(scenario())
+    assert len(set(messages)) == 1
+    assert parse(messages[0]) == ("created", {"ids": [1]})
+    assert local.subscriber_count() == 5000
+
+
+def test_slow_subscriber_gets_a_resync_instead_of_a_backlog():
+    async def scenario():
+        local = EventBroker(queue_size=2)
+        sub = local.subscribe()
+        for i in range(3):
+            local.publish("deleted", {"ids": [i]})
+        await asyncio.sleep(0)
+        return [sub.queue.get_nowait() for _ in range(sub.queue.qsize())]
+
+    assert asyncio.run(scenario()) == [RESYNC]
+
+
+def test_stream_sends_keepalives_and_unsubscribes_on_disconnect():
+    async def scenario():
+        local = EventBroker()
+        disconnected = False
+
+        async def is_disconnected():
+            return disconnected
+
+        gen = events.stream(local, is_disconnected, keepalive=0.01)
+        assert await gen.__anext__() == b"retry: 3000\n\n"
+        local.publish("created", {"calculations": []})
+        assert parse(await gen.__anext__())[0] == "created"
+        assert await gen.__anext__() == b": keepalive\n\n"
+        assert local.subscriber_count() == 1
+        disconnected = True
+        async for _ in gen:
+            pass
+        return local.subscriber_count()
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_calculation_writes_publish_events_with_stats_deltas(client):
+    async def scenario():
+        sub = broker.subscribe()
+        try:
+            created = await asyncio.to_thread(client.post, "/calculations", json={"a": 2, "b": 3, "type": "Add"})
+            calc_id = created.json()["id"]
+            await asyncio.to_thread(client.put, f"/calculations/{calc_id}", json={"a": 2, "b": 3, "type": "Multiply"})
+            await asyncio.to_thread(client.post, "/calculations/batch", json=[{"a": 1, "b": 1, "type": "Sub"}])
+            await asyncio.to_thread(client.delete, f"/calculations/{calc_id}")
+            return calc_id, [parse(await asyncio.wait_for(sub.queue.get(), 1)) for _ in range(4)]
+        finally:
+            broker.unsubscribe(sub)
+
+    calc_id, received = asyncio.run(scenario())
+    assert [event for event, _ in received] == ["created", "updated", "created", "deleted"]
+
+    created = received[0][1]
+    assert created["calculations"][0]["id"] == calc_id
+    assert created["stats"] == [{"type": "Add", "count": 1, "sum_a": 2, "sum_b": 3, "sum_result": 5, "result_count": 1}]
+    updated = received[1][1]
+    assert updated["calculations"][0]["result"] == 6
+    assert [(d["type"], d["count"]) for d in updated["stats"]] == [("Add", -1), ("Multiply", 1)]
+    assert received[2][1]["calculations"][0]["type"] == "Sub"
+    deleted = received[3][1]
+    assert deleted["ids"] == [calc_id]
+    assert deleted["stats"][0]["sum_result"] == -6
+
+
+def test_stream_tickets_are_single_use_and_short_lived(client, monkeypatch):
+    from app import crud, security
+    from tests import conftest as conf
+    from tests.test_calculation_ownership import register
+
+    alice = register(client, "alice")
+    assert client.post("/events/ticket").status_code == 401
+    res = client.post("/events/ticket", headers=alice)
+    assert res.status_code == 200
+    ticket = res.json()["ticket"]
+    assert res.json()["expires_in"] == security.STREAM_TICKET_TTL
+
+    db = conf.TestingSessionLocal()
+    try:
+        assert crud.redeem_stream_ticket(db, ticket) == 1
+        assert crud.redeem_stream_ticket(db, ticket) is None
+        monkeypatch.setattr(crud, "STREAM_TICKET_TTL", -1)
+        expired = crud.issue_stream_ticket(db, 1)
+        assert crud.redeem_stream_ticket(db, expired) is None
+        # issuing sweeps expired tickets
+        crud.issue_stream_ticket(db, 1)
+        assert db.query(models.StreamTicket).count() == 1
+    finally:
+        db.close()
+    # a spent ticket (or an access token in its place) can't open the stream
+    assert client.get("/events", params={"ticket": ticket}).status_code == 401
+    assert client.get("/events", params={"ticket": alice["Authorization"].split()[1]}).status_code == 401
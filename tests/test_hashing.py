@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from app import metrics
+from app.hashing import HashingExecutor, HashingSaturated, hashing_executor
+from app.security import verify_password
+
+
+def test_process_pool_hashes_and_verifies():
+    executor = HashingExecutor(workers=1, max_pending=4, kind="process")
+    try:
+        hashed = asyncio.run(executor.hash("secret123"))
+        assert verify_password("secret123", hashed)
+        assert asyncio.run(executor.verify("secret123", hashed))
+        assert not asyncio.run(executor.verify("wrong", hashed))
+    finally:
+        executor.shutdown()
+    assert executor.pending == 0
+
+
+def test_saturated_executor_rejects_without_queueing():
+    executor = HashingExecutor(workers=1, max_pending=0, kind="thread")
+    rejected = metrics.get_metric("password_hash_rejected_total").value(op="hash")
+    with pytest.raises(HashingSaturated):
+        asyncio.run(executor.hash("secret123"))
+    assert metrics.get_metric("password_hash_rejected_total").value(op="hash") == rejected + 1
+
+
+def test_auth_routes_return_429_when_hashing_is_saturated(client, monkeypatch):
+    payload = {"username": "busy", "email": "busy@example.com", "password": "secret123"}
+    assert client.post("/users/register", json=payload).status_code == 201
+
+    monkeypatch.setattr(hashing_executor, "max_pending", 0)
+    res = client.post("/users/login", json={"username": "busy", "password": "secret123"})
+    assert res.status_code == 429
+    assert res.headers["retry-after"] == "1"
+    payload = {"username": "busy2", "email": "busy2@example.com", "password": "secret123"}
+    assert client.post("/users/register", json=payload).status_code == 429
+
+
+def test_hashing_metrics_are_exported(client):
+    payload = {"username": "metered", "email": "metered@example.com", "password": "secret123"}
+    client.post("/users/register", json=payload)
+    client.post("/users/login", json={"username": "metered", "password": "secret123"})
+
+    body = client.get("/metrics").text
+    assert 'password_hash_seconds_count{op="hash"}' in body
+    assert 'password_hash_seconds_count{op="verify"}' in body
+    assert "password_hash_pending 0" in body
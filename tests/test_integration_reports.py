@@ -13,3 +13,55 @@ def test_reports_history_endpoint(client):
     assert 'items' in data
     assert isinstance(data['items'], list)
     assert len(data['items']) == 2
+
+
+def test_reports_history_cursor_pagination(client):
+    """Walking next_cursor visits every row once, newest first."""
+    ids = [client.post('/calculations', json={"a": i, "b": 1, "type": "Add"}).json()["id"] for i in range(5)]
+
+    seen = []
+    resp = client.get('/reports/history?limit=2&total=none').json()
+    assert resp['total'] is None
+    seen += [item['id'] for item in resp['items']]
+    while resp['next_cursor']:
+        resp = client.get(f"/reports/history?limit=2&total=none&cursor={resp['next_cursor']}").json()
+        seen += [item['id'] for item in resp['items']]
+    assert seen == list(reversed(ids))
+
+
+def test_reports_history_cursor_breaks_created_at_ties(client):
+    """Rows sharing a created_at are ordered and paged by id."""
+    from datetime import datetime, timezone
+    from app import models
+    from tests import conftest as conf
+
+    stamp = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    db = conf.TestingSessionLocal()
+    try:
+        db.add_all(models.Calculation(a=i, b=0, type="Add", result=i, created_at=stamp) for i in range(3))
+        db.commit()
+    finally:
+        db.close()
+
+    first = client.get('/reports/history?limit=2').json()
+    second = client.get(f"/reports/history?limit=2&cursor={first['next_cursor']}").json()
+    ids = [item['id'] for item in first['items'] + second['items']]
+    assert ids == sorted(ids, reverse=True)
+    assert len(set(ids)) == 3
+    assert second['next_cursor'] is None
+
+
+def test_reports_history_total_modes(client):
+    for i in range(3):
+        client.post('/calculations', json={"a": i, "b": 1, "type": "Multiply"})
+
+    assert client.get('/reports/history?total=exact').json()['total'] == 3
+    assert client.get('/reports/history?total=cached').json()['total'] == 3
+    # SQLite has no planner statistics, so the estimate falls back to the rollup
+    assert client.get('/reports/history?total=estimate').json()['total'] == 3
+
+
+def test_reports_history_invalid_cursor(client):
+    resp = client.get('/reports/history?cursor=not-a-cursor')
+    assert resp.status_code == 400
+    assert resp.json()['detail'] == "Invalid cursor"
@@ -26,3 +26,41 @@ def test_create_access_token_default_expiration():
     assert isinstance(token, str)
     assert len(token) > 0
     assert token.count(".") == 2
+
+
+def test_decode_access_token_caches_until_expiry(monkeypatch):
+    """Verified claims are cached by token digest and expire with the token."""
+    import time
+    from jose import jwt
+    from app import security
+
+    security.token_cache.clear()
+    calls = []
+    real_decode = jwt.decode
+
+    def counting_decode(*args, **kwargs):
+        calls.append(1)
+        return real_decode(*args, **kwargs)
+
+    monkeypatch.setattr(security.jwt, "decode", counting_decode)
+    token = create_access_token(data={"sub": "cached", "uid": 1}, expires_delta=timedelta(seconds=30))
+    assert security.decode_access_token(token)["sub"] == "cached"
+    assert security.decode_access_token(token)["sub"] == "cached"
+    assert len(calls) == 1
+
+    # the entry's lifetime is bounded by the token's exp claim
+    key = next(iter(security.token_cache._data))
+    _, expires_at = security.token_cache._data[key]
+    assert expires_at - time.monotonic() <= 30
+
+
+def test_decode_access_token_rejects_invalid_tokens():
+    from jose import JWTError
+    from app import security
+
+    token = create_access_token(data={"sub": "x"})
+    with pytest.raises(JWTError):
+        security.decode_access_token(token[:-2] + ("AA" if not token.endswith("AA") else "BB"))
+    expired = create_access_token(data={"sub": "x"}, expires_delta=timedelta(seconds=-1))
+    with pytest.raises(JWTError):
+        security.decode_access_token(expired)
@@ -0,0 +1,197 @@
+import re
+import threading
+
+import pytest
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from sqlalchemy import create_engine, event, exc, inspect, text
+
+from app import cli, main, migrate
+from app.database import Base
+from tests import conftest as conf
+
+
+def sqlite_engine(tmp_path, name="migrated.db"):
+    return create_engine(f"sqlite:///{tmp_path / name}")
+
+
+def test_migrations_build_the_schema_of_the_models(tmp_path):
+    engine = sqlite_engine(tmp_path)
+    migrate.upgrade_database(engine)
+    with engine.connect() as conn:
+        assert compare_metadata(MigrationContext.configure(conn, opts={"compare_type": True}), Base.metadata) == []
+        assert conn.execute(text("SELECT version_num FROM alembic_version")).scalar() == "0008"
+
+    with engine.connect() as conn:
+        command.downgrade(migrate.alembic_config(conn), "base")
+    assert inspect(engine).get_table_names() == ["alembic_version"]
+    engine.dispose()
+
+
+def test_pre_migration_database_is_adopted_and_upgraded(tmp_path):
+    engine = sqlite_engine(tmp_path, "legacy.db")
+    # the schema create_all produced before migrations, with data
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR(50) NOT NULL UNIQUE, "
+            "email VARCHAR(255) NOT NULL UNIQUE, password_hash VARCHAR(255) NOT NULL, "
+            "created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE calculations (id INTEGER PRIMARY KEY, a FLOAT NOT NULL, b FLOAT NOT NULL, "
+            "type VARCHAR(20) NOT NULL, result FLOAT, created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL)"
+        ))
+        conn.execute(text("INSERT INTO calculations (a, b, type, result) VALUES (1, 2, 'Add', 3), (2, 2, 'Add', 4)"))
+
+    for _ in range(2):  # idempotent
+        migrate.upgrade_database(engine)
+
+    inspector = inspect(engine)
+    assert "user_id" in {c["name"] for c in inspector.get_columns("calculations")}
+    assert {"ix_calculations_created_at_id", "ix_calculations_user_created_at_id", "ix_calculations_user_type"} <= {
+        i["name"] for i in inspector.get_indexes("calculations")
+    }
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT version_num FROM alembic_version")).scalar() == "0008"
+        assert conn.execute(text("SELECT owner_id, type, count, sum_result FROM calculation_stats")).all() == [
+            (0, "Add", 2, 7.0)
+        ]
+        assert conn.execute(text("SELECT COUNT(*) FROM calculations")).scalar() == 2
+    engine.dispose()
+
+
+def test_backfill_in_batches_commits_each_batch(tmp_path):
+    engine = sqlite_engine(tmp_path, "backfill.db")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, flag INTEGER)"))
+        conn.execute(text("INSERT INTO items (flag) VALUES " + ", ".join(["(NULL)"] * 25)))
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    with engine.connect() as conn:
+        op = Operations(MigrationContext.configure(conn))
+        assert migrate.backfill_in_batches(op, "items", "flag = 1", "flag IS NULL", batch_size=10) == 25
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM items WHERE flag = 1")).scalar() == 25
+    assert len([s for s in statements if s.startswith("UPDATE items")]) == 3
+    engine.dispose()
+
+
+def test_startup_only_migrates_when_enabled(monkeypatch):
+    calls = []
+    monkeypatch.setattr(main, "upgrade_database", lambda engine: calls.append(engine))
+    monkeypatch.setattr(main, "DB_AUTO_MIGRATE", False)
+    main.on_startup()
+    assert calls == []
+    monkeypatch.setattr(main, "DB_AUTO_MIGRATE", True)
+    main.on_startup()
+    assert calls == [main.engine]
+
+
+def test_cli_db_upgrade(tmp_path, monkeypatch):
+    engine = sqlite_engine(tmp_path, "cli.db")
+    monkeypatch.setattr(cli, "engine", engine)
+    assert cli.main(["db", "upgrade"]) == 0
+    assert "calculation_stats" in inspect(engine).get_table_names()
+    engine.dispose()
+
+
+postgres_only = pytest.mark.skipif(
+    conf.engine.dialect.name != "postgresql", reason="set TEST_DATABASE_URL to a PostgreSQL database"
+)
+
+
+@postgres_only
+def test_upgrade_on_postgres_builds_indexes_concurrently(empty_database):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(empty_database, "before_cursor_execute", record)
+    try:
+        migrate.upgrade_database(empty_database)
+    finally:
+        event.remove(empty_database, "before_cursor_execute", record)
+    with empty_database.connect() as conn:
+        assert conn.execute(text("SELECT version_num FROM alembic_version")).scalar() == "0008"
+        assert conn.execute(text(
+            "SELECT COUNT(*) FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname LIKE 'ix_calculations%' AND NOT i.indisvalid"
+        )).scalar() == 0
+    locked = statements.index(next(s for s in statements if s.startswith("SELECT pg_advisory_lock")))
+    assert all(not s.startswith("CREATE") for s in statements[:locked])
+    assert statements[-1].startswith("SELECT pg_advisory_unlock")
+    built = {re.search(r"CONCURRENTLY (?:IF NOT EXISTS )?(\w+)", s)[1] for s in statements if s.startswith("CREATE") and "INDEX CONCURRENTLY" in s}
+    assert {"ix_calculations_created_at_id", "ix_calculations_user_created_at_id", "ix_calculations_user_type"} <= built
+
+
+@postgres_only
+def test_owner_foreign_key_is_validated_after_being_added_not_valid(empty_database):
+    migrate.upgrade_database(empty_database, "0002")
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    def record_commit(conn):
+        statements.append("COMMIT")
+
+    event.listen(empty_database, "before_cursor_execute", record)
+    event.listen(empty_database, "commit", record_commit)
+    try:
+        migrate.upgrade_database(empty_database, "0003")
+    finally:
+        event.remove(empty_database, "before_cursor_execute", record)
+        event.remove(empty_database, "commit", record_commit)
+    added = next(i for i, s in enumerate(statements) if "ADD CONSTRAINT fk_calculations_user_id_users" in s)
+    validated = next(i for i, s in enumerate(statements) if "VALIDATE CONSTRAINT fk_calculations_user_id_users" in s)
+    assert statements[added].endswith("NOT VALID")
+    # the brief lock taken to add the constraint is released before rows are checked
+    assert "COMMIT" in statements[added:validated]
+    with empty_database.connect() as conn:
+        assert conn.execute(text(
+            "SELECT convalidated FROM pg_constraint WHERE conname = 'fk_calculations_user_id_users'"
+        )).scalar() is True
+
+
+@postgres_only
+def test_upgrade_rebuilds_an_invalid_index_left_by_an_interrupted_build(empty_database):
+    migrate.upgrade_database(empty_database, "0002")
+    with empty_database.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(
+            "INSERT INTO calculations (a, b, type, result, created_at) "
+            "VALUES (1, 2, 'Add', 3, '2026-01-01 00:00:00+00'), (2, 2, 'Add', 4, '2026-01-01 00:00:00+00')"
+        ))
+        # a failed concurrent build leaves its index behind, marked invalid
+        with pytest.raises(exc.IntegrityError):
+            conn.execute(text("CREATE UNIQUE INDEX CONCURRENTLY ix_calculations_created_at_id ON calculations (created_at)"))
+
+    migrate.upgrade_database(empty_database, "0003")
+    with empty_database.connect() as conn:
+        valid, definition = conn.execute(text(
+            "SELECT i.indisvalid, pg_get_indexdef(i.indexrelid) FROM pg_index i "
+            "JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = 'ix_calculations_created_at_id'"
+        )).one()
+    assert valid
+    assert definition.endswith("(created_at, id)") and "UNIQUE" not in definition
+
+
+@postgres_only
+def test_concurrent_upgrades_wait_for_the_advisory_lock(empty_database):
+    with empty_database.connect() as holder:
+        holder.execute(text("SELECT pg_advisory_lock(:key)"), {"key": migrate._PG_LOCK_KEY})
+        holder.commit()
+        upgrade = threading.Thread(target=migrate.upgrade_database, args=(empty_database,))
+        upgrade.start()
+        upgrade.join(timeout=1)
+        assert upgrade.is_alive()
+        assert "alembic_version" not in inspect(empty_database).get_table_names()
+        holder.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": migrate._PG_LOCK_KEY})
+        holder.commit()
+    upgrade.join(timeout=60)
+    assert not upgrade.is_alive()
+    with empty_database.connect() as conn:
+        assert conn.execute(text("SELECT version_num FROM alembic_version")).scalar() == "0008"
@@ -0,0 +1,206 @@
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import text, update
+
+from app import cli, crud, migrate, models, partitions
+from tests import conftest as conf
+
+
+def create(client, n, a=1, op="Add"):
+    return [client.post("/calculations", json={"a": a, "b": 2, "type": op}).json()["id"] for _ in range(n)]
+
+
+def backdate(ids, when):
+    db = conf.TestingSessionLocal()
+    try:
+        db.execute(update(models.Calculation).where(models.Calculation.id.in_(ids)).values(created_at=when))
+        db.commit()
+        # moving rows in time bypasses the writes that keep the daily sketches in step
+        crud.rebuild_calculation_stats(db)
+    finally:
+        db.close()
+
+
+def test_month_arithmetic_and_partition_ddl():
+    assert partitions.month_start(date(2026, 10, 17)) == date(2026, 10, 1)
+    assert partitions.add_months(date(2026, 11, 1), 2) == date(2027, 1, 1)
+    assert partitions.add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+    assert partitions.partition_ddl(date(2026, 12, 1)) == (
+        "CREATE TABLE IF NOT EXISTS calculations_y2026m12 PARTITION OF calculations "
+        "FOR VALUES FROM ('2026-12-01 00:00:00+00') TO ('2027-01-01 00:00:00+00')"
+    )
+
+
+def test_archive_compacts_old_rows_without_changing_totals(client):
+    old = create(client, 3, a=1) + create(client, 2, a=5, op="Multiply")
+    older = create(client, 2, a=7)
+    recent = create(client, 1, a=9)
+    backdate(old, datetime(2026, 3, 15, tzinfo=timezone.utc))
+    backdate(older, datetime(2026, 1, 31, 23, 59, tzinfo=timezone.utc))
+    before = client.get("/calculations/stats").json()
+
+    db = conf.TestingSessionLocal()
+    try:
+        assert crud.archive_calculations(db, date(2026, 4, 1), batch_size=2) == 7
+        archive = {
+            (row.type, row.period): (row.count, row.sum_a)
+            for row in db.query(models.CalculationArchive).all()
+        }
+        assert crud.verify_calculation_stats(db) == []
+        assert crud.archive_calculations(db, date(2026, 4, 1)) == 0
+    finally:
+        db.close()
+
+    assert archive == {
+        ("Add", date(2026, 3, 1)): (3, 3.0),
+        ("Multiply", date(2026, 3, 1)): (2, 10.0),
+        ("Add", date(2026, 1, 1)): (2, 14.0),
+    }
+    assert [c["id"] for c in client.get("/calculations").json()] == recent
+    # the rollup still counts archived rows
+    assert client.get("/calculations/stats").json() == before
+
+    db = conf.TestingSessionLocal()
+    try:
+        crud.rebuild_calculation_stats(db)
+    finally:
+        db.close()
+    assert client.get("/calculations/stats").json() == before
+
+
+def test_history_window_counts_exactly(client):
+    old = create(client, 3)
+    create(client, 2)
+    backdate(old, datetime.now(timezone.utc) - timedelta(days=40))
+    since = (datetime.now(timezone.utc) - timedelta(days=1)).isoformat()
+    history = client.get("/reports/history", params={"created_after": since, "total": "cached"}).json()
+    assert history["total"] == 2
+    assert len(history["items"]) == 2
+    assert client.get("/reports/history?total=cached").json()["total"] == 5
+
+
+def test_retention_command_on_sqlite(client, monkeypatch, capsys):
+    ids = create(client, 2)
+    backdate(ids, datetime.now(timezone.utc) - timedelta(days=400))
+    monkeypatch.setattr(cli, "SessionLocal", conf.TestingSessionLocal)
+    assert cli.main(["calculations", "retention", "--months", "6"]) == 0
+    assert "archived 2 calculation(s)" in capsys.readouterr().out
+    assert client.get("/calculations").json() == []
+    # without --months nothing is archived (and SQLite has no partitions to create)
+    assert cli.main(["calculations", "retention", "--months", "0"]) == 0
+    assert capsys.readouterr().out == ""
+
+
+postgres_only = pytest.mark.skipif(
+    conf.engine.dialect.name != "postgresql", reason="set TEST_DATABASE_URL to a PostgreSQL database"
+)
+
+
+@pytest.fixture
+def migrated_to(empty_database):
+    return lambda revision: migrate.upgrade_database(empty_database, revision)
+
+
+def this_month():
+    return partitions.month_start(datetime.now(timezone.utc).date())
+
+
+def holders(conn):
+    """``{id: partition}`` for every calculation."""
+    return dict(conn.execute(text("SELECT id, tableoid::regclass::text FROM calculations")).all())
+
+
+@postgres_only
+def test_upgrade_partitions_a_populated_table_in_place(migrated_to):
+    migrated_to("0003")
+    with conf.engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO calculations (a, b, type, result, created_at) "
+            "VALUES (1, 2, 'Add', 3, '2025-01-15 00:00:00+00'), (2, 2, 'Multiply', 4, now())"
+        ))
+        table = conn.execute(text("SELECT 'calculations'::regclass::oid")).scalar()
+
+    migrated_to("0004")
+    first = partitions.add_months(this_month(), 1)
+    db = conf.TestingSessionLocal()
+    try:
+        assert partitions.is_partitioned(db)
+        assert partitions.list_partitions(db) == [
+            partitions.add_months(first, n) for n in range(partitions.PARTITIONS_AHEAD + 1)
+        ]
+        # the old table became the legacy partition without being copied
+        assert db.execute(text("SELECT relname FROM pg_class WHERE oid = :oid"), {"oid": table}).scalar() == (
+            "calculations_legacy"
+        )
+        assert set(holders(db).values()) == {"calculations_legacy"}
+        db.execute(text(
+            "INSERT INTO calculations (a, b, type, result, created_at) VALUES (3, 2, 'Add', 5, :at)"
+        ), {"at": partitions.month_bound(first)})
+        db.commit()
+        assert sorted(holders(db).values()) == ["calculations_legacy", "calculations_legacy", partitions.partition_name(first)]
+        # ids keep coming from the old sequence
+        assert sorted(holders(db)) == [1, 2, 3]
+    finally:
+        db.close()
+
+
+@postgres_only
+def test_ensure_partitions_creates_months_ahead_once(migrated_to):
+    migrated_to("head")
+    db = conf.TestingSessionLocal()
+    try:
+        ahead = partitions.PARTITIONS_AHEAD + 2
+        # this month is still covered by the legacy partition
+        assert partitions.ensure_partitions(db, ahead=ahead) == [
+            partitions.partition_name(partitions.add_months(this_month(), n))
+            for n in range(partitions.PARTITIONS_AHEAD + 2, ahead + 1)
+        ]
+        assert partitions.ensure_partitions(db, ahead=ahead) == []
+        assert partitions.list_partitions(db)[-1] == partitions.add_months(this_month(), ahead)
+    finally:
+        db.close()
+
+
+@postgres_only
+def test_upgrade_database_replaces_missing_upcoming_partitions(migrated_to):
+    migrated_to("head")
+    db = conf.TestingSessionLocal()
+    try:
+        upcoming = partitions.list_partitions(db)
+        # as if the retention cron had not run for months
+        for month in upcoming[1:]:
+            db.execute(text(f"DROP TABLE {partitions.partition_name(month)}"))
+        db.commit()
+        migrate.upgrade_database(conf.engine)
+        assert partitions.list_partitions(db) == upcoming
+    finally:
+        db.close()
+
+
+@postgres_only
+def test_archive_detaches_and_drops_expired_partitions(migrated_to):
+    migrated_to("head")
+    first = partitions.add_months(this_month(), 1)
+    second = partitions.add_months(first, 1)
+    db = conf.TestingSessionLocal()
+    try:
+        for month, a in [(first, 1), (first, 2), (second, 5)]:
+            db.execute(text(
+                "INSERT INTO calculations (a, b, type, result, created_at) VALUES (:a, 2, 'Add', :a + 2, :at)"
+            ), {"a": a, "at": partitions.month_bound(month) + timedelta(days=3)})
+        db.commit()
+        # a run interrupted after detaching: the table is archived by the next run
+        partitions.detach_partition(db, second)
+        assert partitions.detached_partitions(db) == [second]
+
+        assert crud.archive_calculations(db, partitions.add_months(first, 1)) == 3
+        assert partitions.detached_partitions(db) == []
+        assert first not in partitions.list_partitions(db) and second not in partitions.list_partitions(db)
+        assert db.execute(text("SELECT to_regclass(:name)"), {"name": partitions.partition_name(first)}).scalar() is None
+        assert {
+            (row.period, row.count, row.sum_a) for row in db.query(models.CalculationArchive).all()
+        } == {(first, 2, 3.0), (second, 1, 5.0)}
+        assert db.execute(text("SELECT COUNT(*) FROM calculations")).scalar() == 0
+    finally:
+        db.close()
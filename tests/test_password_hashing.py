@@ -0,0 +1,95 @@
+import pytest
+
+from app import crud, models, security
+from tests import conftest as conf
+
+
+@pytest.fixture
+def restore_hashing():
+    yield
+    security.configure_password_hashing()
+
+
+def stored_hash(username):
+    db = conf.TestingSessionLocal()
+    try:
+        return db.query(models.User).filter_by(username=username).one().password_hash
+    finally:
+        db.close()
+
+
+def test_profiles_set_default_and_minimum_rounds():
+    context = security.build_password_context("pbkdf2_sha256", "moderate")
+    assert context.hash("secret").startswith("$pbkdf2-sha256$210000$")
+    assert context.needs_update(security.build_password_context("pbkdf2_sha256", "interactive").hash("secret"))
+
+    with pytest.raises(ValueError):
+        security.build_password_context("pbkdf2_sha256", "extreme")
+    with pytest.raises(ValueError):
+        security.build_password_context("md5_crypt", "interactive")
+
+
+def test_scrypt_context_still_verifies_and_upgrades_pbkdf2_hashes():
+    legacy = security.build_password_context("pbkdf2_sha256", "interactive").hash("secret")
+    context = security.build_password_context("scrypt", "interactive")
+    assert context.hash("secret").startswith("$scrypt$ln=14,")
+    assert context.verify("secret", legacy)
+    assert context.needs_update(legacy)
+
+
+def test_calibration_never_goes_below_interactive_profile():
+    assert security.calibrate_rounds("pbkdf2_sha256", "interactive", target_ms=0.001, samples=1) == 29000
+    assert security.calibrate_rounds("scrypt", "interactive", target_ms=0.001, samples=1) == 14
+
+
+def test_login_upgrades_outdated_hash_in_background(client, restore_hashing):
+    payload = {"username": "rehash", "email": "rehash@example.com", "password": "secret123"}
+    assert client.post("/users/register", json=payload).status_code == 201
+    assert stored_hash("rehash").startswith("$pbkdf2-sha256$29000$")
+
+    security.configure_password_hashing(rounds=30000)
+    res = client.post("/users/login", json={"username": "rehash", "password": "secret123"})
+    assert res.status_code == 200
+
+    upgraded = stored_hash("rehash")
+    assert upgraded.startswith("$pbkdf2-sha256$30000$")
+    assert security.verify_password("secret123", upgraded)
+    assert client.post("/users/login", json={"username": "rehash", "password": "secret123"}).status_code == 200
+    assert stored_hash("rehash") == upgraded
+
+
+def test_upgrade_skips_password_changed_meanwhile(client):
+    payload = {"username": "raced", "email": "raced@example.com", "password": "secret123"}
+    client.post("/users/register", json=payload)
+    current = stored_hash("raced")
+
+    db = conf.TestingSessionLocal()
+    try:
+        user = crud.get_user_by_username(db, "raced")
+        assert not crud.upgrade_password_hash(db, user.id, "stale-hash", security.hash_password("secret123"))
+    finally:
+        db.close()
+    assert stored_hash("raced") == current
+
+
+def test_calibrated_workers_accept_each_others_hashes(monkeypatch, restore_hashing):
+    # two workers timing the host slightly differently
+    calibrated = iter([100000, 90000])
+    monkeypatch.setattr(security, "calibrate_rounds", lambda *args: next(calibrated))
+    first = security.configure_password_hashing(target_ms=100)
+    second = security.configure_password_hashing(target_ms=100)
+    assert first.hash("secret").startswith("$pbkdf2-sha256$100000$")
+    assert not second.needs_update(first.hash("secret"))
+    assert not first.needs_update(second.hash("secret"))
+    # well below the calibrated cost still gets upgraded
+    assert first.needs_update(security.build_password_context("pbkdf2_sha256", "interactive", rounds=70000).hash("secret"))
+    assert security.calibration_floor("scrypt", "interactive", 16) == 15
+    assert security.calibration_floor("scrypt", "interactive", 14) == 14
+
+
+def test_cli_prints_calibrated_rounds(monkeypatch, capsys):
+    from app import cli
+
+    monkeypatch.setattr(security, "calibrate_rounds", lambda scheme, profile, target_ms: 123456)
+    assert cli.main(["security", "calibrate", "--target-ms", "200"]) == 0
+    assert capsys.readouterr().out.strip() == "PASSWORD_HASH_ROUNDS=123456"
@@ -1,3 +1,5 @@
+import math
+
 from app import calculations
 
 
@@ -8,3 +10,45 @@ def test_power_operation():
     assert calculations.perform_calculation("Power", 9, 0.5) == 3
     # negative exponent
     assert calculations.perform_calculation("Power", 2, -1) == 0.5
+
+
+def test_power_results_are_memoized():
+    calculations.result_cache.clear()
+    before = calculations.result_cache.stats()
+    assert calculations.perform_calculation("Power", 2.0, 10.0) == 1024
+    assert calculations.perform_calculation("Power", 2.0, 10.0) == 1024
+    after = calculations.result_cache.stats()
+    assert after["misses"] - before["misses"] == 1
+    assert after["hits"] - before["hits"] == 1
+
+
+def test_result_cache_keys_are_bit_exact():
+    calculations.result_cache.clear()
+    assert calculations.perform_calculation("Power", 0.0, -0.0) == 1.0
+    # -0.0 ** -1 must not reuse an entry computed for 0.0 (or vice versa)
+    assert math.copysign(1, calculations.perform_calculation("Power", -0.0, 3.0)) == -1
+    assert math.copysign(1, calculations.perform_calculation("Power", 0.0, 3.0)) == 1
+    nan = float("nan")
+    assert math.isnan(calculations.perform_calculation("Power", nan, 2.0))
+    assert math.isnan(calculations.perform_calculation("Power", nan, 2.0))
+    assert calculations.perform_calculation("Power", nan, 0.0) == 1.0
+
+
+def test_result_caching_is_switchable_per_operation():
+    calculations.result_cache.clear()
+    calculations.perform_calculation("Add", 1.0, 2.0)
+    assert len(calculations.result_cache) == 0
+
+    calculations.set_result_caching("Add", True)
+    try:
+        calculations.perform_calculation("Add", 1.0, 2.0)
+        assert len(calculations.result_cache) == 1
+    finally:
+        calculations.set_result_caching("Add", None)
+
+    calculations.set_result_caching("Power", False)
+    try:
+        calculations.perform_calculation("Power", 3.0, 3.0)
+        assert len(calculations.result_cache) == 1
+    finally:
+        calculations.set_result_caching("Power", None)
@@ -0,0 +1,110 @@
+from datetime import timedelta
+
+from sqlalchemy import event, update
+
+from app import models
+from app.hashing import hashing_executor
+from app.security import hash_refresh_token
+from tests import conftest as conf
+
+
+def register(client, username="refresher"):
+    payload = {"username": username, "email": f"{username}@example.com", "password": "secret123"}
+    res = client.post("/users/register", json=payload)
+    assert res.status_code == 201
+    return res.json()
+
+
+def auth(tokens):
+    return {"Authorization": f"Bearer {tokens['access_token']}"}
+
+
+def test_refresh_rotates_tokens_without_password_check(client, monkeypatch):
+    tokens = register(client)
+    assert tokens["refresh_token"]
+
+    async def no_password_checks(*args):
+        raise AssertionError("refresh must not verify a password")
+
+    monkeypatch.setattr(hashing_executor, "verify_and_check", no_password_checks)
+    res = client.post("/users/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert res.status_code == 200
+    rotated = res.json()
+    assert rotated["refresh_token"] != tokens["refresh_token"]
+    assert rotated["user"]["username"] == "refresher"
+    assert client.get("/users/me", headers=auth(rotated)).status_code == 200
+
+    db = conf.TestingSessionLocal()
+    try:
+        stored = {row.token_hash for row in db.query(models.RefreshToken)}
+    finally:
+        db.close()
+    assert stored == {hash_refresh_token(tokens["refresh_token"]), hash_refresh_token(rotated["refresh_token"])}
+
+
+def test_reused_refresh_token_revokes_the_session(client):
+    tokens = register(client)
+    rotated = client.post("/users/refresh", json={"refresh_token": tokens["refresh_token"]}).json()
+
+    res = client.post("/users/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert res.status_code == 401
+    assert res.json()["detail"] == "Refresh token reuse detected"
+    assert client.post("/users/refresh", json={"refresh_token": rotated["refresh_token"]}).status_code == 401
+    res = client.get("/users/me", headers=auth(rotated))
+    assert res.status_code == 401
+    assert res.json()["detail"] == "Session revoked"
+
+
+def test_logout_revokes_refresh_and_access_tokens(client):
+    tokens = register(client)
+    other = client.post("/users/login", json={"username": "refresher", "password": "secret123"}).json()
+
+    assert client.post("/users/logout", json={"refresh_token": tokens["refresh_token"]}).status_code == 200
+    assert client.get("/users/me", headers=auth(tokens)).status_code == 401
+    assert client.post("/users/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 401
+    # other logins are separate sessions
+    assert client.get("/users/me", headers=auth(other)).status_code == 200
+    assert client.post("/users/logout", json={"refresh_token": "unknown"}).status_code == 200
+
+
+def test_expired_refresh_token_is_rejected(client):
+    tokens = register(client)
+    db = conf.TestingSessionLocal()
+    try:
+        db.execute(update(models.RefreshToken).values(expires_at=models.utcnow() - timedelta(seconds=1)))
+        db.commit()
+    finally:
+        db.close()
+    res = client.post("/users/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert res.status_code == 401
+    assert res.json()["detail"] == "Invalid refresh token"
+
+
+def test_revocation_check_is_cached(client):
+    tokens = register(client)
+    client.get("/users/me", headers=auth(tokens))
+
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(conf.engine, "before_cursor_execute", record)
+    try:
+        assert client.get("/users/me", headers=auth(tokens)).status_code == 200
+    finally:
+        event.remove(conf.engine, "before_cursor_execute", record)
+    assert not any("refresh_tokens" in statement for statement in statements)
+
+
+def test_password_change_signs_out_other_sessions(client):
+    tokens = register(client)
+    other = client.post("/users/login", json={"username": "refresher", "password": "secret123"}).json()
+
+    res = client.post("/users/me/change-password", headers=auth(tokens),
+                      json={"current_password": "secret123", "new_password": "newsecret1"})
+    assert res.status_code == 200
+    assert client.get("/users/me", headers=auth(tokens)).status_code == 200
+    assert client.get("/users/me", headers=auth(other)).status_code == 401
+    assert client.post("/users/refresh", json={"refresh_token": other["refresh_token"]}).status_code == 401
+    assert client.post("/users/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 200
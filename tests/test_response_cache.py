@@ -0,0 +1,122 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.main import app, get_db
+from app.response_cache import DataVersion, data_version, etag_matches
+from tests import conftest as conf
+
+
+def record_statements(fn):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(conf.engine, "before_cursor_execute", record)
+    try:
+        return fn(), statements
+    finally:
+        event.remove(conf.engine, "before_cursor_execute", record)
+
+
+def test_conditional_get_returns_304_without_queries(client):
+    client.post("/calculations", json={"a": 1, "b": 2, "type": "Add"})
+    first = client.get("/reports/summary")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert etag.startswith('W/"')
+    assert first.headers["cache-control"] == "no-cache"
+
+    res, statements = record_statements(lambda: client.get("/reports/summary", headers={"If-None-Match": etag}))
+    assert res.status_code == 304
+    assert res.content == b""
+    assert res.headers["etag"] == etag
+    assert statements == []
+
+    res, statements = record_statements(lambda: client.get("/reports/summary"))
+    assert res.status_code == 200
+    assert res.json() == first.json()
+    assert statements == []
+
+
+def test_writes_change_the_version(client):
+    etag = client.get("/calculations/stats").headers["etag"]
+    client.post("/calculations", json={"a": 1, "b": 2, "type": "Add"})
+
+    res = client.get("/calculations/stats", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.json()["total_count"] == 1
+    assert res.headers["etag"] != etag
+
+
+def test_version_is_shared_through_the_database(client):
+    etag = client.get("/reports/history").headers["etag"]
+
+    # another worker, or a CLI command, commits a write and bumps the shared row
+    other = DataVersion()
+    db = conf.TestingSessionLocal()
+    try:
+        db.add(models.Calculation(a=1, b=2, type="Add", result=3))
+        other.bump(db)
+        db.commit()
+        version = other.load(db)
+    finally:
+        db.close()
+
+    # this worker notices once its copy of the version expires (DATA_VERSION_TTL)
+    assert client.get("/reports/history", headers={"If-None-Match": etag}).status_code == 304
+    data_version.invalidate()
+    res = client.get("/reports/history", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert len(res.json()["items"]) == 1
+    assert res.headers["etag"].startswith(f'W/"{version}-')
+
+
+def test_writes_use_a_single_connection(client):
+    # with one pooled connection, a nested checkout while writing times out
+    engine = create_engine(conf.TEST_DB, connect_args=conf.connect_args, pool_size=1, max_overflow=0, pool_timeout=2)
+    sessions = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def one_connection_db():
+        db = sessions()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    previous = app.dependency_overrides[get_db]
+    app.dependency_overrides[get_db] = one_connection_db
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            statuses = list(pool.map(
+                lambda i: client.post("/calculations", json={"a": i, "b": 1, "type": "Add"}).status_code, range(24)
+            ))
+    finally:
+        app.dependency_overrides[get_db] = previous
+        engine.dispose()
+    assert statuses == [201] * 24
+    assert client.get("/calculations/stats").json()["total_count"] == 24
+
+
+def test_history_is_cached_per_query(client):
+    for i in range(3):
+        client.post("/calculations", json={"a": i, "b": 1, "type": "Add"})
+    one = client.get("/reports/history?limit=1")
+    two = client.get("/reports/history?limit=2")
+    assert len(one.json()["items"]) == 1
+    assert len(two.json()["items"]) == 2
+    assert one.headers["etag"] != two.headers["etag"]
+    assert client.get("/reports/history?limit=1", headers={"If-None-Match": one.headers["etag"]}).status_code == 304
+    assert client.get("/reports/history?cursor=bogus").status_code == 400
+
+
+def test_etag_matches_uses_weak_comparison():
+    assert etag_matches('W/"v-1"', 'W/"v-1"')
+    assert etag_matches('"v-1"', 'W/"v-1"')
+    assert etag_matches('W/"v-0", W/"v-1"', 'W/"v-1"')
+    assert etag_matches("*", 'W/"v-1"')
+    assert not etag_matches('W/"v-2"', 'W/"v-1"')
+    assert not etag_matches(None, 'W/"v-1"')
@@ -0,0 +1,143 @@
+import random
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event
+
+from app import cli, crud, sketches
+from tests import conftest as conf
+from tests.test_calculation_ownership import register
+
+
+def exact_quantile(values, q):
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+def test_quantiles_stay_within_the_relative_accuracy():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(0, 3) * rng.choice((1, -1)) for _ in range(20000)] + [0.0] * 50
+    sketch = sketches.FieldSketch()
+    for value in values:
+        sketch.add(value)
+    for q in (0.01, 0.25, 0.5, 0.95, 0.99):
+        assert sketch.quantile(q) == pytest.approx(exact_quantile(values, q), rel=sketches.RELATIVE_ACCURACY)
+    assert sketch.distinct() == pytest.approx(20001, rel=0.05)
+
+
+def test_sketches_merge_remove_and_round_trip():
+    left, right, both = sketches.FieldSketch(), sketches.FieldSketch(), sketches.FieldSketch()
+    for value in range(1, 501):
+        (left if value % 2 else right).add(float(value))
+        both.add(float(value))
+    left.merge(right)
+    assert (left.bins, left.registers) == (both.bins, both.registers)
+
+    restored = sketches.FieldSketch()
+    restored.merge(both)
+    for value in range(251, 501):
+        restored.remove(float(value))
+    assert restored.count == 250
+    assert restored.quantile(1.0) == pytest.approx(250, rel=sketches.RELATIVE_ACCURACY)
+    # distinct counts only grow
+    assert restored.distinct() == both.distinct() == pytest.approx(500, rel=0.05)
+    assert sketches.FieldSketch().quantile(0.5) is None
+
+
+def test_stats_expose_sketches_maintained_on_write(client):
+    alice = register(client, "alice")
+    ids = [
+        client.post("/calculations", json={"a": a, "b": 2, "type": "Add"}, headers=alice).json()["id"]
+        for a in range(1, 101)
+    ]
+    client.post("/calculations/batch", json=[{"a": a, "b": 3, "type": "Multiply"} for a in range(1, 51)], headers=alice)
+    client.put(f"/calculations/{ids[0]}", json={"a": 1000, "b": 2, "type": "Sub"}, headers=alice)
+    client.delete(f"/calculations/{ids[1]}", headers=alice)
+    client.post("/calculations", json={"a": 5, "b": 5, "type": "Add"})  # anonymous
+
+    stats = client.get("/calculations/stats", headers=alice).json()
+    a, b = stats["sketches"]["a"], stats["sketches"]["b"]
+    assert a["count"] == stats["total_count"] == 149
+    expected = [*range(3, 101), *range(1, 51), 1000]
+    for q in ("p50", "p95", "p99"):
+        assert a[q] == pytest.approx(exact_quantile(expected, int(q[1:]) / 100), rel=0.01)
+    assert b["distinct"] == 2
+    assert stats["sketches"]["result"]["count"] == 149
+    assert stats["sketches_since"] is None
+    assert client.get("/calculations/stats").json()["sketches"]["a"]["count"] == 1
+
+    today = datetime.now(timezone.utc).date()
+    assert client.get("/reports/summary", params={"since": str(today)}, headers=alice).json()["sketches"] == stats["sketches"]
+    tomorrow = client.get("/calculations/stats", params={"since": str(today + timedelta(days=1))}, headers=alice).json()
+    assert tomorrow["sketches_since"] == str(today + timedelta(days=1))
+    assert tomorrow["sketches"]["a"] == {"count": 0, "p50": None, "p95": None, "p99": None, "distinct": 0}
+    # the totals are all-time either way
+    assert tomorrow["total_count"] == 149
+
+
+def test_backfill_and_rebuild_keep_sketches_consistent(client, monkeypatch):
+    register(client, "alice")
+    for a in range(1, 11):
+        client.post("/calculations", json={"a": a, "b": 2, "type": "Add"})
+    monkeypatch.setattr(cli, "SessionLocal", conf.TestingSessionLocal)
+    assert cli.main(["calculations", "backfill", "--user", "alice", "--batch-size", "4"]) == 0
+
+    db = conf.TestingSessionLocal()
+    try:
+        moved = crud.get_calculation_stats(db, 1)["sketches"]
+        assert moved["a"]["count"] == 10
+        assert crud.get_calculation_stats(db)["sketches"]["a"]["count"] == 0
+        crud.rebuild_calculation_stats(db)
+        assert crud.get_calculation_stats(db, 1)["sketches"] == moved
+    finally:
+        db.close()
+
+
+def test_write_cost_does_not_grow_with_the_stored_sketches(client):
+    alice = register(client, "alice")
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(len(parameters) if isinstance(parameters, (list, tuple, dict)) else 0)
+
+    def post(a):
+        statements.clear()
+        event.listen(conf.engine, "before_cursor_execute", count)
+        try:
+            assert client.post("/calculations", json={"a": a, "b": 2, "type": "Add"}, headers=alice).status_code == 201
+        finally:
+            event.remove(conf.engine, "before_cursor_execute", count)
+        return list(statements)
+
+    post(1.0)  # warm the user cache
+    first = post(1.5)
+    # spread values over thousands of bins and every register
+    rng = random.Random(3)
+    client.post(
+        "/calculations/batch",
+        json=[{"a": rng.lognormvariate(0, 8), "b": rng.uniform(-1e6, 1e6), "type": "Add"} for _ in range(3000)],
+        headers=alice,
+    )
+    later = post(2.5)
+    # same statements with the same bound parameters: no sketch is read or rewritten
+    assert later == first
+    assert max(later) < 200
+
+
+def test_windows_combine_day_and_month_buckets(client):
+    db = conf.TestingSessionLocal()
+    try:
+        days = {date(2026, 1, 10): 1.0, date(2026, 2, 5): 2.0, date(2026, 3, 1): 3.0, date(2026, 3, 20): 4.0}
+        for day, value in days.items():
+            created_at = datetime(day.year, day.month, day.day, 12, tzinfo=timezone.utc)
+            sketches.record(db, 7, "Add", [SimpleNamespace(a=value, b=value, result=value, created_at=created_at)])
+        db.commit()
+        for since, expected in [
+            (None, 4), (date(2026, 1, 11), 3), (date(2026, 2, 1), 3), (date(2026, 2, 6), 2),
+            (date(2026, 3, 2), 1), (date(2026, 4, 1), 0),
+        ]:
+            summary = sketches.summarize(db, 7, since)["a"]
+            assert (summary["count"], summary["distinct"]) == (expected, expected), since
+    finally:
+        db.close()
@@ -2,6 +2,7 @@
 Test coverage for static file serving routes.
 """
 import pytest
+from app.assets import minify
 from app.main import get_register, get_login, get_dashboard
 
 
@@ -31,9 +32,92 @@ def test_get_dashboard_route(client):
     assert "Dashboard" in content or "dashboard" in content.lower()
 
 
+def make_request(headers=()):
+    from starlette.requests import Request
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": list(headers)})
+
+
 def test_get_dashboard_direct_call():
     """Call the `get_dashboard` function directly to exercise its code paths."""
-    resp = get_dashboard()
-    # Should return a FileResponse object (Starlette response)
-    from starlette.responses import FileResponse
-    assert isinstance(resp, FileResponse)
+    resp = get_dashboard(make_request())
+    # Should return a prebuilt Starlette response for the in-memory asset
+    from starlette.responses import Response
+    assert isinstance(resp, Response)
+    assert resp.status_code == 200
+    assert b"Dashboard" in resp.body or b"dashboard" in resp.body.lower()
+
+
+def test_html_is_minified_compressed_and_revalidated(client):
+    response = client.get("/dashboard.html", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["cache-control"] == "no-cache"
+    assert response.headers["content-type"] == "text/html; charset=utf-8"
+    # only the multi-line template literals in the inline script keep their indentation
+    assert "\n    " not in response.text.split("<script")[0]
+    assert "<!--" not in response.text
+
+    identity = client.get("/dashboard.html", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in identity.headers
+    assert identity.text == response.text
+    assert identity.headers["etag"] != response.headers["etag"]
+
+
+def test_minify_keeps_whitespace_that_is_content():
+    page = (
+        "<body>\n    <pre>\n  x = 1\n    y</pre>\n    <textarea>\n  note\n</textarea>\n"
+        "    <script>\n      // don't\n      const row = `\n        <td>${xs.map(x => `  ${x}`)}</td>\n      `;\n"
+        "      const n = 1;\n    </script>\n</body>\n"
+    )
+    assert minify(page, "text/html") == (
+        "<body>\n<pre>\n  x = 1\n    y</pre>\n<textarea>\n  note\n</textarea>\n"
+        "<script>\n// don't\nconst row = `\n        <td>${xs.map(x => `  ${x}`)}</td>\n      `;\n"
+        "const n = 1;\n</script>\n</body>\n"
+    )
+    assert minify("  let s = 'a`b';\n  let t = `\n  x`;\n", "text/javascript") == "let s = 'a`b';\nlet t = `\n  x`;\n"
+
+
+def test_pages_share_the_fingerprinted_auth_script(client):
+    from app.main import asset_store
+
+    url = asset_store.url("auth.js")
+    for page in ("/dashboard.html", "/profile.html"):
+        html = client.get(page).text
+        assert f'<script src="{url}"></script>' in html
+        assert "async function authFetch" not in html
+    script = client.get(url)
+    assert script.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert "async function authFetch" in script.text
+
+
+def test_if_none_match_returns_304(client):
+    etag = client.get("/login.html", headers={"Accept-Encoding": "gzip"}).headers["etag"]
+    response = client.get("/login.html", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+    assert client.get("/login.html", headers={"If-None-Match": '"stale"'}).status_code == 200
+
+
+def test_brotli_is_preferred_when_available(client):
+    pytest.importorskip("brotli")
+    response = client.get("/register.html", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["content-encoding"] == "br"
+    assert "Register" in response.text or "Create Account" in response.text
+
+
+def test_pages_reference_fingerprinted_immutable_assets(client):
+    from app.main import asset_store
+    url = asset_store.url("avatar-default.svg")
+    assert url != "/static/avatar-default.svg"
+    assert url in client.get("/dashboard.html").text
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert response.headers["content-type"] == "image/svg+xml"
+    plain = client.get("/static/avatar-default.svg")
+    assert plain.status_code == 200
+    assert plain.headers["cache-control"] == "no-cache"
+    assert client.get("/static/missing.css").status_code == 404
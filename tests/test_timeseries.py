@@ -0,0 +1,138 @@
+from datetime import date, datetime, timezone
+
+import pytest
+from sqlalchemy import update
+
+from app import cli, crud, models, timeseries
+from tests import conftest as conf
+from tests.test_calculation_ownership import register
+
+WINDOW = {"start": "2026-03-15T10:00:00Z", "end": "2026-03-15T12:00:00Z"}
+
+
+def create(client, a, op="Add", headers=None):
+    return client.post("/calculations", json={"a": a, "b": 2, "type": op}, headers=headers).json()["id"]
+
+
+def backdate(calc_id, when):
+    db = conf.TestingSessionLocal()
+    try:
+        db.execute(update(models.Calculation).where(models.Calculation.id == calc_id).values(created_at=when))
+        db.commit()
+    finally:
+        db.close()
+
+
+def at(hour, minute):
+    return datetime(2026, 3, 15, hour, minute, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def seeded(client):
+    # Add results 3, 4, 5, 6 and one Multiply (result 20)
+    for a, when in [(1, at(10, 5)), (2, at(10, 5)), (3, at(10, 40)), (4, at(11, 20))]:
+        backdate(create(client, a), when)
+    backdate(create(client, 10, "Multiply"), at(11, 59))
+    return client
+
+
+def test_hour_buckets_with_percentiles(seeded):
+    res = seeded.get("/reports/timeseries", params={**WINDOW, "type": "Add", "percentiles": "50,90"})
+    assert res.status_code == 200
+    body = res.json()
+    assert body["source"] == "raw"
+    assert [(p["bucket"], p["count"], p["avg"], p["min"], p["max"]) for p in body["points"]] == [
+        ("2026-03-15T10:00:00Z", 3, 4.0, 3.0, 5.0),
+        ("2026-03-15T11:00:00Z", 1, 6.0, 6.0, 6.0),
+    ]
+    assert body["points"][0]["percentiles"] == {"p50": 4.0, "p90": pytest.approx(4.8)}
+    assert body["points"][1]["percentiles"] == {"p50": 6.0, "p90": 6.0}
+
+
+def test_minute_and_day_buckets_and_type_filter(seeded):
+    minutes = seeded.get("/reports/timeseries", params={**WINDOW, "bucket": "minute"}).json()
+    assert [(p["bucket"][11:16], p["count"]) for p in minutes["points"]] == [
+        ("10:05", 2), ("10:40", 1), ("11:20", 1), ("11:59", 1)
+    ]
+    days = seeded.get("/reports/timeseries", params={**WINDOW, "bucket": "day", "type": ["Add", "Multiply"]}).json()
+    assert days["start"] == "2026-03-15T00:00:00Z" and days["end"] == "2026-03-16T00:00:00Z"
+    assert [(p["count"], p["max"]) for p in days["points"]] == [(5, 20.0)]
+    other = register(seeded, "carol")
+    assert seeded.get("/reports/timeseries", params=WINDOW, headers=other).json()["points"] == []
+
+
+def test_invalid_requests_are_rejected(client):
+    assert client.get("/reports/timeseries", params={"bucket": "week"}).status_code == 422
+    assert client.get("/reports/timeseries", params={"type": "Modulo"}).status_code == 400
+    assert client.get("/reports/timeseries", params={"percentiles": "p99"}).status_code == 400
+    assert client.get("/reports/timeseries", params={"percentiles": "150"}).status_code == 400
+    assert client.get("/reports/timeseries", params={"bucket": "minute", "start": "2020-01-01T00:00:00Z"}).status_code == 400
+    assert client.get("/reports/timeseries", params={**WINDOW, "start": WINDOW["end"]}).status_code == 400
+    # the pre-aggregate is off by default
+    assert client.get("/reports/timeseries", params={"source": "hourly"}).status_code == 400
+
+
+def test_percentile_cont_interpolates_like_sql():
+    assert timeseries.percentile_cont([], 0.5) is None
+    assert timeseries.percentile_cont([1.0, 2.0, 3.0, 4.0], 0.5) == 2.5
+    assert timeseries.percentile_cont([1.0, 2.0, 3.0, 4.0], 1.0) == 4.0
+    assert timeseries.percentile_label(0.999) == "p99.9"
+
+
+def test_hourly_rollup_is_maintained_on_write(client, monkeypatch, capsys):
+    monkeypatch.setattr(timeseries, "TIMESERIES_HOURLY", True)
+    alice = register(client, "alice")
+    ids = [create(client, a, headers=alice) for a in (1, 2, 3)]
+    client.post("/calculations/batch", json=[{"a": 5, "b": 2, "type": "Multiply"}, {"a": 6, "b": 2, "type": "Add"}],
+                headers=alice)
+    create(client, 100)  # anonymous
+    client.put(f"/calculations/{ids[0]}", json={"a": 50, "b": 2, "type": "Sub"}, headers=alice)
+    client.delete(f"/calculations/{ids[1]}", headers=alice)
+
+    def series(source, headers=alice):
+        body = client.get("/reports/timeseries", params={"bucket": "hour", "source": source}, headers=headers).json()
+        return body["source"], [(p["bucket"], p["count"], p["avg"], p["min"], p["max"]) for p in body["points"]]
+
+    source, points = series("auto")
+    assert source == "hourly"
+    assert points == series("raw")[1]
+    assert [p[1:] for p in points] == [(4, 17.75, 5.0, 48.0)]
+    assert series("auto", headers=None)[1][0][1:] == (1, 102.0, 102.0, 102.0)
+    # percentiles always come from the raw rows
+    assert client.get("/reports/timeseries", params={"percentiles": "50"}, headers=alice).json()["source"] == "raw"
+
+    db = conf.TestingSessionLocal()
+    try:
+        db.query(models.CalculationHourly).delete()
+        db.commit()
+    finally:
+        db.close()
+    monkeypatch.setattr(cli, "SessionLocal", conf.TestingSessionLocal)
+    assert cli.main(["reports", "rebuild-hourly"]) == 0
+    assert "rebuilt 4 owner/type/hour row(s)" in capsys.readouterr().out
+    assert series("hourly")[1] == points
+
+
+def test_rebuild_hourly_keeps_archived_months(seeded, monkeypatch):
+    monkeypatch.setattr(timeseries, "TIMESERIES_HOURLY", True)
+    create(seeded, 7)  # this month, stays raw
+
+    def hourly(params):
+        body = seeded.get("/reports/timeseries", params={**params, "source": "hourly"}).json()
+        return [(p["bucket"], p["count"], p["avg"], p["min"], p["max"]) for p in body["points"]]
+
+    db = conf.TestingSessionLocal()
+    try:
+        # the seeded rows were moved in time after their hourly upserts
+        timeseries.rebuild_hourly(db)
+        before = hourly(WINDOW), hourly({"bucket": "day"})
+        assert crud.archive_calculations(db, date(2026, 4, 1)) == 5
+        assert timeseries.rebuild_hourly(db) == 1
+        assert db.query(models.CalculationHourly).count() == 4
+    finally:
+        db.close()
+    assert (hourly(WINDOW), hourly({"bucket": "day"})) == before
+    assert before[0] == [
+        ("2026-03-15T10:00:00Z", 3, 4.0, 3.0, 5.0),
+        ("2026-03-15T11:00:00Z", 2, 13.0, 6.0, 20.0),
+    ]
@@ -0,0 +1,112 @@
+from sqlalchemy import event
+
+from app import models
+from app.user_cache import LocalUserCacheBackend, RedisUserCacheBackend, UserCache
+from tests import conftest as conf
+
+
+def register(client, username="cache_user", email="cache@example.com"):
+    res = client.post("/users/register", json={"username": username, "email": email, "password": "secret123"})
+    assert res.status_code == 201
+    return {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+
+def count_statements(fn):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(conf.engine, "before_cursor_execute", record)
+    try:
+        result = fn()
+    finally:
+        event.remove(conf.engine, "before_cursor_execute", record)
+    return result, statements
+
+
+def test_authenticated_requests_skip_user_lookup(client):
+    headers = register(client)
+    assert client.get("/users/me", headers=headers).status_code == 200
+
+    response, statements = count_statements(lambda: client.get("/users/me", headers=headers))
+    assert response.status_code == 200
+    assert response.json()["username"] == "cache_user"
+    assert statements == []
+
+
+def test_profile_update_invalidates_cached_user(client):
+    headers = register(client)
+    client.get("/users/me", headers=headers)
+    r = client.put("/users/me", headers=headers, json={"username": "renamed_user"})
+    assert r.status_code == 200
+    assert client.get("/users/me", headers=headers).json()["username"] == "renamed_user"
+
+
+def test_password_change_invalidates_cached_user(client):
+    headers = register(client)
+    client.get("/users/me", headers=headers)
+    r = client.post("/users/me/change-password", headers=headers, json={"current_password": "secret123", "new_password": "newsecret1"})
+    assert r.status_code == 200
+    # the hash is always read from the database, so the old password no longer verifies
+    r = client.post("/users/me/change-password", headers=headers, json={"current_password": "secret123", "new_password": "other123"})
+    assert r.status_code == 400
+
+
+def test_local_backend_entries_expire():
+    now = [0.0]
+    backend = LocalUserCacheBackend(ttl=5, clock=lambda: now[0])
+    backend.set(1, {"id": 1})
+    now[0] = 6
+    assert backend.get(1) is None
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+def test_redis_backend_round_trip(client):
+    register(client)
+    redis = FakeRedis()
+    cache = UserCache(RedisUserCacheBackend(redis))
+    db = conf.TestingSessionLocal()
+    try:
+        user = db.query(models.User).filter_by(username="cache_user").one()
+        cache.put(user)
+        uid = user.id
+        password_hash = user.password_hash
+    finally:
+        db.close()
+    assert all("password_hash" not in raw and password_hash not in raw for raw in redis.data.values())
+
+    db = conf.TestingSessionLocal()
+    try:
+        cached, statements = count_statements(lambda: cache.get(db, uid))
+        assert statements == []
+        assert cached.username == "cache_user"
+        cached.email = "changed@example.com"
+        db.commit()
+        assert db.get(models.User, uid).email == "changed@example.com"
+        cache.invalidate(uid)
+        assert cache.get(db, uid) is None
+    finally:
+        db.close()
+
+
+def test_cached_user_is_checked_against_the_stored_hash(client):
+    headers = register(client)
+    client.get("/users/me", headers=headers)
+    r = client.post("/users/me/change-password", headers=headers, json={"current_password": "wrong123", "new_password": "newsecret1"})
+    assert r.status_code == 400
+    r = client.post("/users/me/change-password", headers=headers, json={"current_password": "secret123", "new_password": "newsecret1"})
+    assert r.status_code == 200
@@ -108,3 +108,73 @@ def test_login_nonexistent_user(client):
     response = client.post("/users/login", json=login_payload)
     assert response.status_code == 401
     assert "Invalid username or password" in response.json()["detail"]
+
+
+def test_concurrent_registrations_with_colliding_names(client, monkeypatch):
+    """Only one of many simultaneous registrations for a username wins."""
+    from concurrent.futures import ThreadPoolExecutor
+    from starlette.testclient import TestClient
+    from app.hashing import hashing_executor
+    from app.main import app
+
+    monkeypatch.setattr(hashing_executor, "max_pending", 100)
+
+    def register(i):
+        payload = {"username": "contended", "email": f"contended{i}@example.com", "password": "securepass123"}
+        return TestClient(app).post("/users/register", json=payload)
+
+    with ThreadPoolExecutor(max_workers=12) as pool:
+        responses = list(pool.map(register, range(24)))
+
+    statuses = sorted(r.status_code for r in responses)
+    assert statuses == [201] + [400] * 23
+    assert {r.json()["detail"] for r in responses if r.status_code == 400} == {"Username already exists"}
+
+
+def test_update_profile_rejects_taken_username_and_email(client):
+    for name in ("first", "second"):
+        client.post("/users/register", json={"username": name, "email": f"{name}@example.com", "password": "securepass123"})
+    token = client.post("/users/login", json={"username": "second", "password": "securepass123"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.put("/users/me", json={"username": "first"}, headers=headers)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Username already exists"
+    response = client.put("/users/me", json={"email": "first@example.com"}, headers=headers)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Email already exists"
+
+    # keeping your own name is not a collision, and the failed attempts left the row intact
+    response = client.put("/users/me", json={"username": "second", "email": "renamed@example.com"}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["username"] == "second"
+    assert response.json()["email"] == "renamed@example.com"
+
+
+def test_duplicate_username_mentioning_email_is_a_username_collision(client):
+    for email in ("one@example.com", "two@example.com"):
+        response = client.post("/users/register", json={"username": "myemail", "email": email, "password": "securepass123"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Username already exists"
+
+
+def test_duplicate_user_errors_are_classified_by_constraint_name():
+    from sqlalchemy.exc import IntegrityError
+    from app import crud
+
+    class UniqueViolation(Exception):
+        """psycopg's error: the message quotes the colliding value, diag names the constraint."""
+
+        def __init__(self, constraint_name, message):
+            super().__init__(message)
+            self.diag = type("Diag", (), {"constraint_name": constraint_name})()
+
+    def classify(orig):
+        error = crud._duplicate_user_error(IntegrityError("INSERT", {}, orig))
+        return error and error.field
+
+    assert classify(UniqueViolation("users_username_key", "Key (username)=(myemail) already exists.")) == "username"
+    assert classify(UniqueViolation("ix_users_email", "Key (email)=(a@example.com) already exists.")) == "email"
+    assert classify(UniqueViolation("refresh_tokens_pkey", "Key (id)=(email) already exists.")) is None
+    assert classify(Exception("UNIQUE constraint failed: users.email")) == "email"
+    assert classify(Exception("NOT NULL constraint failed: users.email")) is None